@@ -26,4 +26,13 @@ from ravel.resolver.resolvers.loader import Loader, LoaderProperty
 from ravel.resolver.resolvers.relationship import Relationship
 from ravel.resolver.decorators import (
     resolver, relationship, view, nested, field
-)
\ No newline at end of file
+)
+
+
+def __getattr__(name):
+    # ColumnarBatch is backed by numpy, so it's only imported once used
+    if name == 'ColumnarBatch':
+        from ravel.columnar_batch import ColumnarBatch
+
+        return ColumnarBatch
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,3 +1,5 @@
+import weakref
+
 from random import randint
 from typing import Text, Tuple, List, Set, Dict, Type, Union, Callable
 from collections import defaultdict, deque
@@ -22,6 +24,7 @@ from ravel.util.loggers import console
 from ravel.util import is_batch, is_resource
 from ravel.entity import Entity
 from ravel.query.order_by import OrderBy
+from ravel.dumper import Dumper, DumpStyle
 
 
 class Batch(Entity):
@@ -212,6 +215,28 @@ class Batch(Entity):
             for _ in range(count)
         )
 
+    def link_siblings(self) -> 'Batch':
+        """
+        Make each resource in the batch remember this batch as the one it was
+        hydrated in. When a resolver is lazy loaded on one of them, it is then
+        resolved for all of its siblings at once, through resolve_batch,
+        instead of one store call per resource. The reference is weak, so that
+        a resource kept on its own doesn't keep its siblings alive.
+        """
+        batch_ref = weakref.ref(self)
+        for resource in self.internal.resources:
+            resource.internal.batch = batch_ref
+        return self
+
+    def to_columnar(self, fields: Set[Text] = None) -> 'ColumnarBatch':
+        """
+        Return a ColumnarBatch with the loaded state of the resources in the
+        batch, optionally limited to the given fields.
+        """
+        from ravel.columnar_batch import ColumnarBatch
+
+        return ColumnarBatch.from_batch(self, fields=fields)
+
     def foreach(self, callback: Callable) -> 'Batch':
         for i, x in enumerate(self.internal.resources):
             callback(i, x)
@@ -424,8 +449,15 @@ class Batch(Entity):
         """
         Return a list with the dump of each resource in the batch.
         """
+        # share one Dumper and key set across resources, so that the batch
+        # is dumped with the same compiled DumpPlan
+        dumper = Dumper.for_style(style or DumpStyle.nested)
+        keys = None
+        if resolvers is not None:
+            keys = frozenset(self.ravel.owner._normalize_selectors(resolvers))
+
         return [
-            resource.dump(resolvers=resolvers, style=style)
+            dumper.dump(resource, keys=keys)
             for resource in self.internal.resources
         ]
 
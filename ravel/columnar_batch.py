@@ -0,0 +1,358 @@
+import operator
+
+from typing import Text, Tuple, List, Set, Dict, Type, Union, Callable
+
+import numpy as np
+
+from ravel.util.misc_functions import (
+    get_class_name,
+    flatten_sequence,
+    normalize_to_tuple,
+)
+from ravel.query.predicate import (
+    Predicate,
+    ConditionalPredicate,
+    BooleanPredicate,
+)
+from ravel.constants import OP_CODE
+from ravel.schema import fields
+from ravel.entity import Entity
+
+
+# NumPy dtypes used to store the values of scalar fields. Columns of fields
+# of any other type, or containing None, are stored in object arrays.
+FIELD_TYPE_2_DTYPE = (
+    (fields.Bool, np.bool_),
+    (fields.Int, np.int64),
+    (fields.Float, np.float64),
+)
+
+OP_CODE_2_FUNC = {
+    OP_CODE.EQ: operator.eq,
+    OP_CODE.NEQ: operator.ne,
+    OP_CODE.GT: operator.gt,
+    OP_CODE.GEQ: operator.ge,
+    OP_CODE.LT: operator.lt,
+    OP_CODE.LEQ: operator.le,
+}
+
+
+def build_column(field: 'Field', values: List) -> np.ndarray:
+    """
+    Return a NumPy array of the given field values, using a typed dtype if
+    the field is scalar and no value is None.
+    """
+    dtype = None
+    if field is not None:
+        for field_type, field_dtype in FIELD_TYPE_2_DTYPE:
+            if isinstance(field, field_type):
+                dtype = field_dtype
+                break
+
+    if dtype is not None and not any(v is None for v in values):
+        try:
+            return np.array(values, dtype=dtype)
+        except (TypeError, ValueError, OverflowError):
+            pass
+
+    # assign values one by one so numpy doesn't turn nested lists into
+    # additional array dimensions
+    column = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        column[i] = value
+    return column
+
+
+def to_python(value):
+    """
+    Convert NumPy scalars back to the Python values they hold.
+    """
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class ColumnarBatch(Entity):
+    """
+    A read-optimized alternative to Batch, which stores the state of its
+    resources as columns, one NumPy array per field, rather than as a
+    collection of Resource objects. Scalar fields are stored in typed arrays.
+
+    Column access, filtering with "where", sorting and aggregates operate on
+    whole columns at once. Resource objects are only built on demand, when
+    indexing or iterating over the batch, as in `batch[0]`, and are detached
+    from the batch, i.e. changing them doesn't change the columns.
+
+    ```python
+    users = User.select(User.name, User.age).execute(columnar=True)
+    adults = users.where(User.age >= 18).sort(User.age.desc)
+    print(adults.age, adults.mean(User.age))
+    ```
+
+    Columns are accessed by field name, as in `users.age`, or through the
+    `columns` dict, if the name of the field conflicts with a method.
+    """
+
+    def __init__(self, owner: Type['Resource'], columns: Dict = None):
+        self.owner = owner
+        self.columns = columns or {}
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(next(iter(self.columns.values())))
+
+    def __bool__(self):
+        return bool(len(self))
+
+    def __iter__(self):
+        return (self.materialize(i) for i in range(len(self)))
+
+    def __getattr__(self, name):
+        columns = self.__dict__.get('columns')
+        if columns is not None and name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    def __getitem__(self, index):
+        """
+        Return a single Resource, for a positional index, or a new
+        ColumnarBatch, for a slice, a boolean mask or an array of indices.
+        """
+        if isinstance(index, (int, np.integer)):
+            return self.materialize(index)
+        return type(self)(self.owner, {
+            k: column[index] for k, column in self.columns.items()
+        })
+
+    def __repr__(self):
+        return (
+            f'{get_class_name(self.owner)}.ColumnarBatch('
+            f'size={len(self)}, columns={sorted(self.columns)})'
+        )
+
+    @classmethod
+    def from_records(
+        cls,
+        owner: Type['Resource'],
+        records: List[Dict],
+        fields: Set[Text] = None,
+    ) -> 'ColumnarBatch':
+        """
+        Build a ColumnarBatch from a list of record dicts, like those returned
+        by Store.query.
+        """
+        records = [rec for rec in records if rec is not None]
+        if fields is None:
+            fields = set()
+            for record in records:
+                fields.update(record.keys())
+
+        schema_fields = owner.ravel.schema.fields
+        return cls(owner, {
+            k: build_column(
+                schema_fields.get(k), [rec.get(k) for rec in records]
+            )
+            for k in fields
+        })
+
+    @classmethod
+    def from_batch(
+        cls,
+        batch: 'Batch',
+        fields: Set[Text] = None,
+    ) -> 'ColumnarBatch':
+        """
+        Build a ColumnarBatch from the loaded state of the resources in a
+        Batch.
+        """
+        return cls.from_records(
+            batch.ravel.owner,
+            [resource.internal.state for resource in batch],
+            fields=fields,
+        )
+
+    def materialize(self, index: int) -> 'Resource':
+        """
+        Build and return the Resource at the given position.
+        """
+        state = {
+            k: to_python(column[index]) for k, column in self.columns.items()
+        }
+        return self.owner(state=state).clean()
+
+    def to_batch(self) -> 'Batch':
+        """
+        Materialize all resources, returning them in a regular Batch.
+        """
+        return self.owner.Batch(self)
+
+    def dump(self) -> List[Dict]:
+        """
+        Return a list of record dicts.
+        """
+        keys = list(self.columns.keys())
+        return [
+            dict(zip(keys, (to_python(x) for x in row)))
+            for row in zip(*self.columns.values())
+        ]
+
+    def where(self, *predicates: Tuple['Predicate']) -> 'ColumnarBatch':
+        """
+        Return a new ColumnarBatch, containing the rows that match the given
+        predicates.
+        """
+        predicate = Predicate.reduce_and(flatten_sequence(predicates))
+        if predicate is None:
+            return self[:]
+        return self[self._eval_predicate(predicate)]
+
+    def sort(self, order_by) -> 'ColumnarBatch':
+        """
+        Sort the rows in place, by one or more OrderBy keys.
+        """
+        order_by = normalize_to_tuple(order_by)
+        indices = np.arange(len(self))
+
+        # a stable sort on each key, from the least to most significant
+        for x in reversed(order_by):
+            ranks = self._rank(self._get_column(x.key)[indices])
+            if x.desc:
+                ranks = -ranks
+            indices = indices[np.argsort(ranks, kind='stable')]
+
+        self.columns = {
+            k: column[indices] for k, column in self.columns.items()
+        }
+        return self
+
+    def count(self, key=None) -> int:
+        """
+        Return the number of rows or, given a field, of non-null values.
+        """
+        if key is None:
+            return len(self)
+        column = self._get_column(key)
+        if column.dtype != object:
+            return len(column)
+        return sum(1 for x in column if x is not None)
+
+    def sum(self, key):
+        return self._aggregate(key, np.sum)
+
+    def mean(self, key):
+        return self._aggregate(key, np.mean)
+
+    def min(self, key):
+        return self._aggregate(key, np.min)
+
+    def max(self, key):
+        return self._aggregate(key, np.max)
+
+    def _aggregate(self, key, func: Callable):
+        column = self._get_column(key)
+        if column.dtype == object:
+            values = [x for x in column if x is not None]
+            column = np.array(values)
+            if column.dtype.kind not in 'biuf':
+                column = build_column(None, values)
+        if not len(column):
+            return None
+        return to_python(func(column))
+
+    def _get_column(self, key) -> np.ndarray:
+        if not isinstance(key, str):
+            # a resolver property, like User.age
+            key = key.resolver.name
+        column = self.columns.get(key)
+        if column is None:
+            raise KeyError(f'{key} not loaded in {self}')
+        return column
+
+    @staticmethod
+    def _rank(column: np.ndarray) -> np.ndarray:
+        """
+        Return an array with the rank of each value in the column, with equal
+        values sharing the same rank and None ranked first.
+        """
+        if column.dtype != object:
+            return np.unique(column, return_inverse=True)[1].astype(np.int64)
+
+        order = sorted(
+            range(len(column)),
+            key=lambda i: (column[i] is not None, column[i])
+        )
+        ranks = np.empty(len(column), dtype=np.int64)
+        rank = -1
+        prev = object()
+        for i in order:
+            if column[i] is not prev and column[i] != prev:
+                rank += 1
+                prev = column[i]
+            ranks[i] = rank
+        return ranks
+
+    def _eval_predicate(self, predicate: 'Predicate') -> np.ndarray:
+        """
+        Return a boolean mask of the rows that satisfy the predicate.
+        """
+        op = predicate.op
+
+        if isinstance(predicate, BooleanPredicate):
+            lhs_mask = self._eval_predicate(predicate.lhs)
+            rhs_mask = self._eval_predicate(predicate.rhs)
+            if op == OP_CODE.AND:
+                return lhs_mask & rhs_mask
+            elif op == OP_CODE.OR:
+                return lhs_mask | rhs_mask
+            raise ValueError(f'unrecognized boolean predicate: {op}')
+
+        if not isinstance(predicate, ConditionalPredicate):
+            raise ValueError(f'unrecognized predicate: {predicate}')
+
+        column = self._get_column(predicate.field.name)
+        value = predicate.value
+        size = len(column)
+
+        if op in (OP_CODE.INCLUDING, OP_CODE.EXCLUDING):
+            values = value if isinstance(value, set) else set(value)
+            if column.dtype != object:
+                mask = np.isin(column, list(values))
+            else:
+                mask = np.fromiter(
+                    (x in values for x in column), dtype=bool, count=size
+                )
+            return mask if op == OP_CODE.INCLUDING else ~mask
+
+        if op in (OP_CODE.CONTAINS, OP_CODE.CONTAINS_ANY):
+            test = all if op == OP_CODE.CONTAINS else any
+            return np.fromiter(
+                (
+                    x is not None and test(v in x for v in value)
+                    for x in column
+                ),
+                dtype=bool, count=size
+            )
+
+        func = OP_CODE_2_FUNC.get(op)
+        if func is None:
+            raise ValueError(f'unrecognized op: {op}')
+
+        if column.dtype != object and value is not None:
+            mask = func(column, value)
+            if np.ndim(mask) == 0:
+                # the value isn't comparable with the column's dtype
+                mask = np.full(size, bool(mask))
+            return np.asarray(mask, dtype=bool)
+
+        if op in (OP_CODE.EQ, OP_CODE.NEQ):
+            return np.fromiter(
+                (bool(func(x, value)) for x in column),
+                dtype=bool, count=size
+            )
+
+        return np.fromiter(
+            (
+                x is not None and value is not None and bool(func(x, value))
+                for x in column
+            ),
+            dtype=bool, count=size
+        )
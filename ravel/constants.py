@@ -28,6 +28,17 @@ OP_CODE = Enum(
     LEQ='leq',
     INCLUDING='in',
     EXCLUDING='ex',
+    CONTAINS='contains-all',
+    CONTAINS_ANY='contains-any',
     AND='and',
     OR='or',
 )
+
+
+# types of index declared by the `index` meta of a Field, or, for inverted
+# indexes, implied by List and Set fields
+INDEX_TYPE = Enum(
+    BTREE='btree',
+    HASH='hash',
+    INVERTED='inverted',
+)
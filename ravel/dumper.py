@@ -1,4 +1,5 @@
-from typing import Text, Set, Dict
+from typing import Text, Set, Dict, Type, FrozenSet
+from weakref import WeakKeyDictionary
 
 from appyratus.enum import EnumValueStr
 
@@ -8,6 +9,7 @@ from ravel.constants import (
 )
 
 from ravel.util import is_batch, is_resource
+from ravel.resolver.resolver import Resolver
 
 
 class DumpStyle(EnumValueStr):
@@ -19,8 +21,45 @@ class DumpStyle(EnumValueStr):
         }
 
 
+class DumpPlan(object):
+    """
+    The steps taken to dump the state of a Resource type, for a fixed set of
+    keys, worked out once from its resolvers and cached by the Dumper, rather
+    than on every dump. Fields are split into those whose resolver dumps
+    values as-is, which are copied straight from the state dict, fields with
+    a custom Resolver.dump, and relationships.
+    """
+
+    def __init__(self, resource_type: Type['Resource'], keys: FrozenSet):
+        resolvers = resource_type.ravel.resolvers
+        relationships = resolvers.relationships
+
+        self.plain_fields = []
+        self.custom_fields = []
+        self.relationships = []
+
+        for k in keys:
+            resolver = resolvers.get(k)
+            assert resolver is not None
+
+            if resolver.private:
+                continue
+
+            dump_key = k[1:] if k in {ID, REV} else k
+
+            if k in relationships:
+                self.relationships.append((dump_key, k, resolver))
+            elif type(resolver).dump is Resolver.dump:
+                self.plain_fields.append((dump_key, k))
+            else:
+                self.custom_fields.append((dump_key, k, resolver))
+
+
 class Dumper(object):
 
+    # compiled DumpPlans, by resource type and then by dump style and keys
+    _plans = WeakKeyDictionary()
+
     @classmethod
     def get_style(cls) -> DumpStyle:
         raise NotImplementedError()
@@ -32,6 +71,32 @@ class Dumper(object):
         if style == DumpStyle.side_loaded:
             return SideLoadedDumper()
 
+    @classmethod
+    def get_plan(
+        cls, resource_type: Type['Resource'], keys: FrozenSet
+    ) -> DumpPlan:
+        """
+        Return the DumpPlan for the given resource type and keys, compiling
+        it on first use.
+        """
+        plans = cls._plans.get(resource_type)
+        if plans is None:
+            plans = cls._plans.setdefault(resource_type, {})
+
+        plan_key = (cls.get_style(), keys)
+        plan = plans.get(plan_key)
+        if plan is None:
+            plan = plans[plan_key] = DumpPlan(resource_type, keys)
+        return plan
+
+    @classmethod
+    def clear_plans(cls):
+        """
+        Discard compiled DumpPlans, e.g. after resolvers have been added to a
+        Resource type that was already dumped.
+        """
+        cls._plans.clear()
+
 
 class NestedDumper(Dumper):
 
@@ -40,49 +105,36 @@ class NestedDumper(Dumper):
         return DumpStyle.nested
 
     def dump(self, target: 'Resource', keys: Set = None) -> Dict:
-        return self._dump_recursive(target, keys)
-
-    def _dump_recursive(
-        self, parent_resource: 'Resource', keys: Set
-    ) -> Dict:
-
-        if parent_resource is None:
+        if target is None:
             return None
 
+        state = target.internal.state
         if keys:
-            keys_to_dump = keys if isinstance(keys, set) else set(keys)
+            keys = keys if isinstance(keys, frozenset) else frozenset(keys)
         else:
-            keys_to_dump = parent_resource.internal.state.keys()
-
-        record = {}
-        for k in keys_to_dump:
-            v = parent_resource.internal.state.get(k)
-            resolver = parent_resource.ravel.resolvers.get(k)
-            assert resolver is not None
+            keys = frozenset(state)
 
-            if resolver.private:
-                continue
+        plan = self.get_plan(type(target), keys)
+        get_value = state.get
 
-            if k in parent_resource.ravel.resolvers.relationships:
-                # handle the dumping of Relationships specially
-                rel = resolver
-                if rel.many:
-                    assert is_batch(v)
-                    child_batch = v
-                    record[k] = [
-                        self.dump(child_resource)
-                        for child_resource in child_batch
-                    ]
-                else:
-                    if v is not None:
-                        assert is_resource(v)
-                    child_resource = v
-                    record[k] = self.dump(child_resource)
+        record = {
+            dump_key: get_value(k) for dump_key, k in plan.plain_fields
+        }
+        for dump_key, k, resolver in plan.custom_fields:
+            record[dump_key] = resolver.dump(self, get_value(k))
+
+        # handle the dumping of Relationships specially
+        for dump_key, k, rel in plan.relationships:
+            v = get_value(k)
+            if rel.many:
+                assert is_batch(v)
+                record[dump_key] = [
+                    self.dump(child_resource) for child_resource in v
+                ]
             else:
-                # dump non-Relationship state
-                if k in {ID, REV}:
-                    k = k[1:]
-                record[k] = resolver.dump(self, v)
+                if v is not None:
+                    assert is_resource(v)
+                record[dump_key] = self.dump(v)
 
         return record
 
@@ -104,21 +156,17 @@ class SideLoadedDumper(Dumper):
         self, parent_resource: 'Resource', links: Dict = None
     ):
         links = links if links is not None else {}
-        relationships = parent_resource.ravel.resolvers.relationships
-
-        record = {}
-        for k, v in parent_resource.internal.state.items():
-            if k in {ID, REV}:
-                k = k[1:]
-
-            resolver = parent_resource.ravel.resolvers[k]
-            if resolver.name in relationships:
-                relationship = resolver
-                record[k] = getattr(v, ID)
-                if k in parent_resource.internal.state:
-                    self._recurse_on_entity(v, links)
-            else:
-                record[k] = resolver.dump(self, v)
+        state = parent_resource.internal.state
+        plan = self.get_plan(type(parent_resource), frozenset(state))
+
+        record = {dump_key: state[k] for dump_key, k in plan.plain_fields}
+        for dump_key, k, resolver in plan.custom_fields:
+            record[dump_key] = resolver.dump(self, state[k])
+
+        for dump_key, k, rel in plan.relationships:
+            v = state[k]
+            record[dump_key] = getattr(v, ID)
+            self._recurse_on_entity(v, links)
 
         parent_id = getattr(parent_resource, ID)
 
@@ -1 +1,2 @@
 from .store import RedisStore
+from .cache_invalidation import RedisInvalidationBus
@@ -0,0 +1,48 @@
+from ravel.store.cache_invalidation import InvalidationBus
+
+from .store.redis_types import RedisClient
+
+
+class RedisInvalidationBus(InvalidationBus):
+    """
+    An InvalidationBus over a Redis pub/sub channel, for peers on any host
+    sharing a Redis server.
+    """
+
+    # how often the listening thread checks whether the bus is closed
+    poll_interval = 1.0
+
+    def __init__(
+        self,
+        channel: str = 'ravel:cache-invalidation',
+        host: str = 'localhost',
+        port: int = 6379,
+        db: int = 0,
+        redis: RedisClient = None,
+    ):
+        super().__init__()
+        self.channel = channel
+        self.redis = redis or RedisClient(host=host, port=port, db=db)
+        self.pubsub = None
+        self.thread = None
+
+    def start(self):
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(**{self.channel: self._on_message})
+        self.thread = self.pubsub.run_in_thread(
+            sleep_time=self.poll_interval, daemon=True
+        )
+
+    def close(self):
+        if self.thread is not None:
+            self.thread.stop()
+            self.thread = None
+        if self.pubsub is not None:
+            self.pubsub.close()
+            self.pubsub = None
+
+    def send(self, message: bytes):
+        self.redis.publish(self.channel, message)
+
+    def _on_message(self, message):
+        self.receive(message['data'])
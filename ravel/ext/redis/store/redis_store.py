@@ -1,8 +1,11 @@
-from typing import Type, Dict, List, Set, Text
+import time
+
+from typing import Type, Dict, List, Set, Text, Callable
 from collections import defaultdict
 from copy import deepcopy
 
 from redis import StrictRedis
+from redis.exceptions import WatchError
 from appyratus.utils.string_utils import StringUtils
 
 from ravel.store import Store
@@ -26,6 +29,15 @@ class RedisStore(Store):
     port = 6379
     db = 0
 
+    # if set, batch writes are executed inside MULTI/EXEC, retried whenever
+    # the records or indexes they read change before they're applied
+    transactional = False
+
+    # how many times a transactional write is retried on conflict, waiting
+    # `watch_backoff * 2 ** attempt` seconds between attempts
+    max_watch_retries = 10
+    watch_backoff = 0.001
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.encoder = JsonEncoder()
@@ -40,13 +52,25 @@ class RedisStore(Store):
         }
 
     @classmethod
-    def on_bootstrap(cls, host=None, port=None, db=None):
+    def on_bootstrap(
+        cls, host=None, port=None, db=None, transactional=False, redis=None
+    ):
         cls.host = host or cls.env.REDIS_HOST or cls.host
         cls.port = port or cls.env.REDIS_PORT or cls.port
         cls.db = db if db is not None else (cls.env.REDIS_DB or cls.db)
-        cls.redis = RedisClient(host=cls.host, port=cls.port, db=cls.db)
-
-    def on_bind(self, resource_type: Type['Resource'], **kwargs):
+        cls.transactional = transactional
+        cls.redis = redis or RedisClient(
+            host=cls.host, port=cls.port, db=cls.db
+        )
+
+    def on_bind(
+        self,
+        resource_type: Type['Resource'],
+        transactional: bool = None,
+        **kwargs
+    ):
+        if transactional is not None:
+            self.transactional = transactional
         self.type_name = StringUtils.snake(resource_type.__name__).lower()
         self.records = HashSet(self.redis, self.type_name)
         self.revs = HashSet(self.redis, f'{self.type_name}_revisions')
@@ -75,115 +99,226 @@ class RedisStore(Store):
         return len(self.records)
 
     def fetch(self, _id, fields: Set[Text] = None) -> Dict:
-        fields = fields if isinstance(fields, set) else set(fields or [])
-
-        pipe = self.redis.pipeline()
-
-        self.records.get(_id)
-        self.revs.get(_id)
-
-        record_json, rev_str = pipe.execute()
-
-        if not record_json:
-            return None
-
-        full_record = JsonEncoder.decode(record_json)
-        full_record[REV] = int(rev_str) - 1
-
-        if fields:
-            return {k: full_record.get(k) for k in fields}
-        else:
-            return full_record
+        return self.fetch_many([_id], fields=fields).get(_id)
 
     def fetch_many(self, _ids: List, fields: Set[Text] = None) -> Dict:
+        _ids = list(_ids)
+
         pipe = self.redis.pipeline()
 
         self.records.get_many(_ids, pipe=pipe)
         self.revs.get_many(_ids, pipe=pipe)
 
-        json_records, rev_strs = pipe.execute()
+        json_records, rev_strs = pipe.execute() if _ids else ([], [])
 
         fields = fields if isinstance(fields, set) else set(fields or [])
         records = {}
 
-        if fields:
-            for record_json, _rev in zip(json_records, rev_strs):
-                record = JsonEncoder.decode(record_json)
+        for _id, record_json, _rev in zip(_ids, json_records, rev_strs):
+            if not record_json:
+                records[_id] = None
+                continue
+            record = JsonEncoder.decode(record_json)
+            if fields:
                 record = {k: record.get(k) for k in fields}
-                record[REV] = int(_rev) - 1
-                records[record[ID]] = record
-        else:
-            for record_json, _rev in zip(json_records, rev_strs):
-                record = JsonEncoder.decode(record_json)
-                record[REV] = int(_rev) - 1
-                records[record[ID]] = record
+                record[ID] = _id
+            record[REV] = int(_rev) - 1
+            records[_id] = record
 
         return records
 
     def fetch_all(self, fields: Set[Text] = None) -> Dict:
         return self.fetch_many(list(self.records.keys()), fields=fields)
 
-    def upsert(self, record: Dict, pipe=None) -> Dict:
-        is_creating = record.get(ID) is None
-        _id = self.create_id(record)
-
-        # prepare the record for upsert
-        upserted_record = record.copy()
-        upserted_record[ID] = _id
-
-        # json encode and store record JSON
-        self.records[_id] = self.encoder.encode(upserted_record)
-
-        # update indexes
-        for k, v in record.items():
-            self.indexes[k].upsert(_id, v)
-
-        # add rev to record AFTER insert to avoid storing _rev in records hset
-        if is_creating:
-            upserted_record[REV] = 0
-        else:
-            upserted_record[REV] = self.revs.increment(_id)
-
-        return upserted_record
+    def upsert_many(
+        self,
+        _ids: List,
+        records: List[Dict],
+        is_creating: bool = False
+    ) -> List[Dict]:
+        """
+        Insert or update records, reading whatever the writes need to know
+        about existing state, the records being updated and the index members
+        being replaced, before issuing all record, rev and index mutations
+        through one pipeline. See `_read_and_write`.
+        """
+        if not _ids:
+            return []
+
+        records = list(records)
+        indexes = {
+            k: index for k, index in self.indexes.items() if k != REV
+        }
+        index_names = []
+        upserted_records = []
+        rev_positions = {}
+
+        watched_keys = [] if is_creating else [self.records.name]
+        for index in indexes.values():
+            watched_keys.extend(index.get_read_key_names())
+
+        def read(pipe):
+            # read existing records and index keys
+            results = []
+            if not is_creating:
+                results.append(self.records.get_many(_ids, pipe=pipe))
+            index_names.clear()
+            for k, index in indexes.items():
+                keys = index.get_keys(_ids, pipe=pipe)
+                if keys is not None:
+                    index_names.append(k)
+                    results.append(keys)
+            return results
+
+        def write(pipe, results):
+            # write records, revs and indexes
+            results = list(results)
+            old_records = [None] * len(_ids)
+            if not is_creating:
+                old_records = [
+                    JsonEncoder.decode(x) if x else None
+                    for x in results.pop(0)
+                ]
+            old_keys = dict(zip(index_names, results))
+
+            upserted_records.clear()
+            rev_positions.clear()
+
+            for idx, (_id, record, old_record) in enumerate(
+                zip(_ids, records, old_records)
+            ):
+                changes = {k: v for k, v in record.items() if k != REV}
+                changes[ID] = _id
+
+                upserted_record = dict(old_record or {}, **changes)
+                self.records.set(
+                    _id, self.encoder.encode(upserted_record), pipe
+                )
+
+                for k, v in changes.items():
+                    index = indexes.get(k)
+                    if index is None:
+                        continue
+                    old_key = old_keys[k][idx] if k in old_keys else None
+                    if v is None:
+                        index.delete(_id, pipe=pipe, old_key=old_key)
+                    else:
+                        index.upsert(_id, v, pipe=pipe, old_key=old_key)
+
+                # _rev is not stored in the records hash. the revs hash holds
+                # the rev plus one, as a missing or zero rev means not found.
+                if is_creating:
+                    self.revs.set(_id, 1, pipe=pipe)
+                    upserted_record[REV] = 0
+                else:
+                    rev_positions[idx] = len(pipe)
+                    self.revs.increment(_id, pipe=pipe)
+
+                upserted_records.append(upserted_record)
+
+        results = self._read_and_write(read, write, watched_keys)
+
+        for idx, position in rev_positions.items():
+            upserted_records[idx][REV] = int(results[position]) - 1
+
+        return upserted_records
 
     def create(self, data: Dict) -> Dict:
-        pipe = self.redis.pipeline()
-        created_record = self.upsert(data)
-        pipe.execute()
-        return created_record
+        return self.create_many([data])[0]
 
     def update(self, _id, record: Dict) -> Dict:
-        pipe = self.redis.pipeline()
-        updated_record = self.upsert(record, pipe=pipe)
-        pipe.execute()
-        return updated_record
+        return self.update_many([_id], [record])[_id]
 
     def create_many(self, records: List[Dict]) -> Dict:
-        pipe = self.redis.pipeline()
-        created_records = [self.upsert(rec, pipe=pipe) for rec in records]
-        pipe.execute()
-        return created_records
+        _ids = [self.create_id(rec) for rec in records]
+        return self.upsert_many(_ids, records, is_creating=True)
 
     def update_many(self, _ids: List, data: Dict = None) -> Dict:
-        pipe = self.redis.pipeline()
-        updated_records = [self.upsert(rec, pipe=pipe) for rec in records]
-        pipe.execute()
-        return updated_records
+        upserted_records = self.upsert_many(list(_ids), data)
+        return {rec[ID]: rec for rec in upserted_records}
 
     def delete(self, _id) -> None:
-        pipe = self.redis.pipeline()
-        if self.records.delete(_id, pipe=pipe):
-            for index in self.indexes.values():
-                index.delete(_id, pipe=pipe)
-        pipe.execute()
+        self.delete_many([_id])
 
     def delete_many(self, _ids: List) -> None:
-        pipe = self.redis.pipeline()
-        if self.records.delete_many(_ids, pipe=pipe):
-            self.revs.delete_many(_ids)
-            for index in self.indexes.values():
-                index.delete_many(_ids, pipe=pipe)
-        pipe.execute()
+        """
+        Delete records, their revs and index entries, reading the index keys
+        to delete first. See `_read_and_write`.
+        """
+        _ids = list(_ids)
+        if not _ids:
+            return
+
+        index_names = []
+        watched_keys = []
+        for index in self.indexes.values():
+            watched_keys.extend(index.get_read_key_names())
+
+        def read(pipe):
+            results = []
+            index_names.clear()
+            for k, index in self.indexes.items():
+                keys = index.get_keys(_ids, pipe=pipe)
+                if keys is not None:
+                    index_names.append(k)
+                    results.append(keys)
+            return results
+
+        def write(pipe, results):
+            old_keys = dict(zip(index_names, results))
+            self.records.delete_many(_ids, pipe=pipe)
+            self.revs.delete_many(_ids, pipe=pipe)
+            for k, index in self.indexes.items():
+                index.delete_many(_ids, pipe=pipe, old_keys=old_keys.get(k))
+
+        self._read_and_write(read, write, watched_keys)
+
+    def _read_and_write(
+        self, read: Callable, write: Callable, watched_keys: List
+    ) -> List:
+        """
+        Call `read` with a pipeline to issue the reads that writes depend on,
+        then `write` with their results and a pipeline to queue the writes,
+        returning the results of the writes. Otherwise, both run in their own
+        pipeline, one round trip each.
+
+        In a transactional store, the keys that `read` reads are WATCHed
+        first, so the reads run one by one on the watching connection, and
+        the writes in MULTI/EXEC. If any of the keys changes in between, the
+        transaction is discarded and retried from the reads, after a backoff,
+        so that concurrent writers neither lose updates nor leave stale index
+        members. Rev increments and writes to sorted sets don't depend on
+        what's read, so their keys aren't watched. The records hash and the
+        lookup tables of string indexes still are, as a whole, as Redis can't
+        watch single hash fields, so that writes to any record of the type
+        conflict. An exception is raised after `max_watch_retries` retries.
+        """
+        if not self.transactional:
+            read_pipe = self.redis.pipeline(transaction=False)
+            read(read_pipe)
+            results = read_pipe.execute() if len(read_pipe) else []
+            pipe = self.redis.pipeline(transaction=False)
+            write(pipe, results)
+            return pipe.execute()
+
+        with self.redis.pipeline(transaction=True) as pipe:
+            for attempt in range(self.max_watch_retries + 1):
+                if attempt:
+                    time.sleep(self.watch_backoff * (2 ** (attempt - 1)))
+                try:
+                    if watched_keys:
+                        pipe.watch(*watched_keys)
+                    results = read(pipe)
+                    pipe.multi()
+                    write(pipe, results)
+                    return pipe.execute()
+                except WatchError:
+                    continue
+
+        # XXX: raise StoreError
+        raise Exception(
+            f'transactional write conflicted {attempt + 1} times in a row'
+        )
 
     def delete_all(self):
         if self.count():
@@ -195,16 +330,22 @@ class RedisStore(Store):
         else:
             _ids = self.query_ids(predicate)
 
+        fields = kwargs.get('fields')
+        fields = fields if isinstance(fields, set) else set(fields or [])
         records = []
 
         if _ids:
-            _id_field = self.resource_type.Schema.fields[ID]
-            json_records = self.records.get_many(_ids)
-            rev_strs = self.revs.get_many(_ids)
+            pipe = self.redis.pipeline()
+            self.records.get_many(_ids, pipe=pipe)
+            self.revs.get_many(_ids, pipe=pipe)
+            json_records, rev_strs = pipe.execute()
             for json_record, rev_str in zip(json_records, rev_strs):
-                record = JsonEncoder.decode(json_record)
-                record[REV] = int(rev_str.decode())
-                records.append(record)
+                if json_record:
+                    record = JsonEncoder.decode(json_record)
+                    if fields:
+                        record = {k: record.get(k) for k in fields | {ID}}
+                    record[REV] = int(rev_str) - 1
+                    records.append(record)
 
         return records
 
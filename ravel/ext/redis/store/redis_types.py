@@ -44,6 +44,10 @@ class HashSet(RedisObject):
     def __len__(self):
         return self.redis.hlen(self.name)
 
+    def set(self, key, value, pipe=None):
+        redis = pipe if pipe is not None else self.redis
+        return redis.hset(self.name, key, value)
+
     def increment(self, key, delta=1, pipe=None):
         redis = pipe if pipe is not None else self.redis
         return redis.hincrby(self.name, key, delta)
@@ -95,17 +99,36 @@ class HashSet(RedisObject):
 
 
 class RangeIndex(RedisObject):
+    """
+    A sorted set index. Writes never read from redis, so that they can be
+    queued in a pipeline. Indexes that need to know the member previously
+    indexed for an _id, in order to replace or delete it, take it through the
+    `old_key` and `old_keys` arguments, as returned by get_keys.
+    """
 
     DELIM = '\0\0'
     DELIM_BYTES = DELIM.encode()
 
-    def upsert(self, _id, value, pipe=None):
+    def get_keys(self, _ids, pipe=None):
+        """
+        Return the sorted set members indexed for the given _ids, if the
+        index needs them to replace or delete them.
+        """
+        return None
+
+    def get_read_key_names(self):
+        """
+        Return the names of the redis keys that get_keys reads.
+        """
+        return []
+
+    def upsert(self, _id, value, pipe=None, old_key=None):
         raise NotImplementedError('override in subclass')
 
-    def delete(self, _id, pipe=None):
+    def delete(self, _id, pipe=None, old_key=None):
         raise NotImplementedError('override in subclass')
 
-    def delete_many(self, _ids, pipe=None):
+    def delete_many(self, _ids, pipe=None, old_keys=None):
         raise NotImplementedError('override in subclass')
 
     def search(
@@ -128,19 +151,19 @@ class NumericIndex(RangeIndex):
         bool: lambda x: int(x),
     }
 
-    def upsert(self, _id, value, pipe=None):
+    def upsert(self, _id, value, pipe=None, old_key=None):
         redis = pipe if pipe is not None else self.redis
         ser = self.custom_serializers.get(value.__class__)
         value = ser(value) if ser else value
 
-        redis.zrem(self.name, _id)
+        # ZADD replaces the score of an existing member
         redis.zadd(self.name, {_id: value})
 
-    def delete(self, _id, pipe=None):
+    def delete(self, _id, pipe=None, old_key=None):
         redis = pipe if pipe is not None else self.redis
         redis.zrem(self.name, _id)
 
-    def delete_many(self, _ids, pipe=None):
+    def delete_many(self, _ids, pipe=None, old_keys=None):
         if isinstance(_ids, GeneratorType):
             _ids = tuple(_ids)
         if _ids:
@@ -185,30 +208,35 @@ class StringIndex(RangeIndex):
         super().__init__(*args, **kwargs)
         self.lutab = HashSet(self.redis, ':'.join([self.name, 'lutab']))
 
-    def upsert(self, _id, value, pipe=None):
+    def get_keys(self, _ids, pipe=None):
+        return self.lutab.get_many(_ids, pipe=pipe)
+
+    def get_read_key_names(self):
+        return [self.lutab.name]
+
+    def upsert(self, _id, value, pipe=None, old_key=None):
         redis = pipe if pipe is not None else self.redis
-        old_key = self.lutab.get(_id)
         new_key = '{}{}{}'.format(value, self.DELIM, _id)
 
         if old_key is not None:
             redis.zrem(self.name, old_key)
 
-        # TODO: Do this in a pipeline
         redis.zadd(self.name, {new_key: 0.0})
-        self.lutab[_id] = new_key
+        self.lutab.set(_id, new_key, pipe=pipe)
 
-    def delete(self, _id, pipe=None):
-        old_key = self.lutab.get(_id)
+    def delete(self, _id, pipe=None, old_key=None):
         if old_key is not None:
             redis = pipe if pipe is not None else self.redis
-            self.lutab.delete(old_key)
+            self.lutab.delete(_id, pipe=pipe)
             redis.zrem(self.name, old_key)
 
-    def delete_many(self, _ids, pipe=None):
-        old_keys = self.lutab.get_many(_ids)
+    def delete_many(self, _ids, pipe=None, old_keys=None):
+        if isinstance(_ids, GeneratorType):
+            _ids = tuple(_ids)
+        old_keys = [k for k in (old_keys or []) if k is not None]
         if old_keys:
             redis = pipe if pipe is not None else self.redis
-            self.lutab.delete_many(old_keys)
+            self.lutab.delete_many(_ids, pipe=pipe)
             redis.zrem(self.name, *old_keys)
 
     def search(
@@ -3,6 +3,8 @@ import traceback
 import sqlalchemy as sa
 
 from typing import List, Dict, Text, Type, Set, Tuple
+from collections import defaultdict
+from uuid import UUID
 from threading import RLock
 
 from geoalchemy2 import Geometry as GeoalchemyGeometry
@@ -11,7 +13,7 @@ from appyratus.env import Environment
 
 from ravel.query.predicate import (
     Predicate, ConditionalPredicate, BooleanPredicate,
-    OP_CODE,
+    OP_CODE, COLLECTION_OP_CODES,
 )
 from ravel.schema import fields, Field
 from ravel.util.loggers import console
@@ -56,6 +58,11 @@ class SqlalchemyStore(Store):
     # id_column_names is a mapping from table name to its _id column name
     _id_column_names = {}
 
+    # upper bound on the number of parameters bound in a single statement,
+    # used to chunk multi-row INSERT and UPDATE statements. this is the
+    # default limit in sqlite 3.32+; postgres allows up to 65535.
+    max_bind_params = 32766
+
     # only one thread needs to bootstrap the SqlalchemyStore. This lock is
     # used to ensure that this is what happens when the host app bootstraps.
     _bootstrap_lock = RLock()
@@ -200,6 +207,13 @@ class SqlalchemyStore(Store):
                 on_decode=lambda x: set(cls.ravel.app.json.decode(x))
             )
         )
+        adapters.append(
+            fields.Uuid.adapt(
+                on_adapt=lambda field: sa.Text,
+                on_encode=lambda x: x.hex if isinstance(x, UUID) else x,
+                on_decode=lambda x: UUID(x) if x else x,
+            )
+        )
         return adapters
 
     def __init__(self, adapters: List[Field.Adapter] = None):
@@ -461,11 +475,15 @@ class SqlalchemyStore(Store):
 
     def _prepare_predicate(self, table, pred, empty=set()):
         if isinstance(pred, ConditionalPredicate):
+            col = getattr(table.c, pred.field.source)
+            if pred.op in COLLECTION_OP_CODES:
+                # the values are elements of the column's collections, which
+                # field adapters don't encode
+                return self._prepare_contains(col, pred.op, list(pred.value))
             if not pred.ignore_field_adapter:
                 adapter = self._adapters.get(pred.field.source)
                 if adapter and adapter.on_encode:
                     pred.value = adapter.on_encode(pred.value)
-            col = getattr(table.c, pred.field.source)
             if pred.op == OP_CODE.EQ:
                 return col == pred.value
             elif pred.op == OP_CODE.NEQ:
@@ -520,6 +538,39 @@ class SqlalchemyStore(Store):
         else:
             raise Exception('unrecognized predicate type')
 
+    def _prepare_contains(self, col, op, values: List):
+        """
+        Build a CONTAINS or CONTAINS_ANY clause, matching rows whose List or
+        Set column contains all or any of the values. These are stored as
+        ARRAY or JSONB columns in postgres and as JSON elsewhere.
+        """
+        if self.dialect == Dialect.postgresql:
+            if isinstance(col.type, sa.dialects.postgresql.ARRAY):
+                if op == OP_CODE.CONTAINS:
+                    return col.contains(values)
+                return col.overlap(values)
+            clauses = [col.contains([v]) for v in values]
+        elif self.dialect == Dialect.mysql:
+            json = self.ravel.app.json
+            clauses = [
+                sa.func.json_contains(col, json.encode([v]))
+                for v in values
+            ]
+        else:
+            # sqlite stores collections as JSON text, so we match their
+            # elements in the rows of json_each.
+            def element_exists(v):
+                return sa.exists(
+                    sa.select([sa.literal_column('1')])
+                    .select_from(sa.func.json_each(col))
+                    .where(sa.literal_column('value') == v)
+                )
+            clauses = [element_exists(v) for v in values]
+
+        if op == OP_CODE.CONTAINS:
+            return sa.and_(sa.true(), *clauses)
+        return sa.or_(sa.false(), *clauses)
+
     def exists(self, _id) -> bool:
         columns = [sa.func.count(self._id_column)]
         query = (
@@ -555,6 +606,22 @@ class SqlalchemyStore(Store):
     def fetch_many(self, _ids: List, fields=None, as_list=False) -> Dict:
         prepared_ids = [self.adapt_id(_id, serialize=True) for _id in _ids]
 
+        columns = self._get_columns(self.table, self._get_field_names(fields))
+        select_stmt = sa.select(columns)
+
+        id_col = getattr(self.table.c, self.id_column_name)
+
+        if prepared_ids:
+            select_stmt = select_stmt.where(id_col.in_(prepared_ids))
+        cursor = self.conn.execute(select_stmt)
+
+        return self._fetch_records(cursor, as_list=as_list)
+
+    def _get_field_names(self, fields=None) -> Set[Text]:
+        """
+        Return the set of column names to select, always including _id and
+        _rev. All columns are selected if no fields are given.
+        """
         if fields:
             if not isinstance(fields, set):
                 fields = set(fields)
@@ -567,22 +634,26 @@ class SqlalchemyStore(Store):
             self.id_column_name,
             self.resource_type.Schema.fields[REV].source,
         })
+        return fields
 
+    def _get_columns(self, table, fields: Set[Text]) -> List:
+        """
+        Return the columns to select or return for the given field names.
+        """
         columns = []
         for k in fields:
-            col = getattr(self.table.c, k)
+            col = getattr(table.c, k)
             if isinstance(col.type, GeoalchemyGeometry):
                 columns.append(sa.func.ST_AsGeoJSON(col).label(k))
             else:
                 columns.append(col)
+        return columns
 
-        select_stmt = sa.select(columns)
-
-        id_col = getattr(self.table.c, self.id_column_name)
-
-        if prepared_ids:
-            select_stmt = select_stmt.where(id_col.in_(prepared_ids))
-        cursor = self.conn.execute(select_stmt)
+    def _fetch_records(self, cursor, as_list=False):
+        """
+        Read and decode all rows from a result cursor, returning a list or an
+        _id-keyed dict of records.
+        """
         records = {} if not as_list else []
 
         while True:
@@ -645,12 +716,6 @@ class SqlalchemyStore(Store):
                     prepared_record[nullable_field.name] = None
 
 
-        try:
-            self.conn.execute(self.table.insert(), prepared_records)
-        except Exception:
-            console.error(f'failed to insert records')
-            raise
-
         n = len(prepared_records)
         id_list_str = (
             ', '.join(str(x['_id'])[:7]
@@ -661,12 +726,61 @@ class SqlalchemyStore(Store):
             + (f'(count: {n})' if n > 1 else '')
         )
 
-        if self.supports_returning:
-            # TODO: use implicit returning if possible
-            pass
+        _ids = [rec[self.id_column_name] for rec in records]
+
+        try:
+            if self.supports_bulk_returning:
+                return self._create_many_returning(prepared_records, _ids)
+            # an executemany binds the columns of its first row for each row
+            for group in self._group_by_key_set(prepared_records):
+                self.conn.execute(self.table.insert(), group)
+        except Exception:
+            console.error(f'failed to insert records')
+            raise
+
+        # rows are selected in no particular order, but callers zip the
+        # returned records with the ones they passed in
+        records_by_id = self.fetch_many(_ids)
+        return [records_by_id.get(_id) for _id in _ids]
+
+    def _create_many_returning(
+        self, prepared_records: List[Dict], _ids: List
+    ) -> List:
+        """
+        Insert records with multi-row INSERT statements, reading back the
+        inserted rows through RETURNING instead of fetching them afterwards,
+        in the order of the given _ids.
+        """
+        columns = self._get_columns(self.table, self._get_field_names())
+
+        # each row in a multi-row VALUES clause must bind the same columns
+        records_by_id = {}
+        for group in self._group_by_key_set(prepared_records):
+            chunk_size = max(1, self.max_bind_params // len(group[0]))
+            for i in range(0, len(group), chunk_size):
+                insert_stmt = (
+                    self.table
+                        .insert()
+                        .values(group[i:i+chunk_size])
+                        .returning(*columns)
+                )
+                cursor = self.conn.execute(insert_stmt)
+                records_by_id.update(self._fetch_records(cursor))
+
+        # rows come back grouped by the columns they set
+        return [records_by_id.get(_id) for _id in _ids]
 
-        return self.fetch_many(
-            (rec[self.id_column_name] for rec in records), as_list=True)
+    @staticmethod
+    def _group_by_key_set(prepared_records: List[Dict]) -> List[List[Dict]]:
+        """
+        Group records by the set of columns they set, in order of appearance.
+        """
+        key_set_2_records = defaultdict(list)
+        for prepared_record in prepared_records:
+            key_set_2_records[frozenset(prepared_record)].append(
+                prepared_record
+            )
+        return list(key_set_2_records.values())
 
     def update(self, _id, data: Dict) -> Dict:
         prepared_id = self.adapt_id(_id)
@@ -696,6 +810,7 @@ class SqlalchemyStore(Store):
 
         prepared_ids = []
         prepared_records = []
+        unchanged_ids = []
 
         for _id, record in zip(_ids, data):
             prepared_id = self.adapt_id(_id)
@@ -704,32 +819,79 @@ class SqlalchemyStore(Store):
                 prepared_ids.append(prepared_id)
                 prepared_records.append(prepared_record)
                 prepared_record[ID] = prepared_id
+            else:
+                unchanged_ids.append(_id)
+
+        fetch_on_update = self._options.get('fetch_on_update', True)
 
         if prepared_records:
             n = len(prepared_records)
             console.debug(
                 f'SQL: UPDATE {self.table} '
-                + (f'({n}x)' if n > 1else '')
+                + (f'({n}x)' if n > 1 else '')
             )
-            values = {
-                k: bindparam(k) for k in prepared_records[0].keys()
-            }
-            update_stmt = (
-                self.table
-                    .update()
-                    .where(self._id_column == bindparam(self.id_column_name))
-                    .values(**values)
-            )
-            self.conn.execute(update_stmt, prepared_records)
+            if fetch_on_update and self.supports_bulk_returning:
+                records = self._update_many_returning(prepared_records)
+                if unchanged_ids:
+                    records.update(self.fetch_many(unchanged_ids))
+                return records
+
+            # each executemany binds the same columns for every row
+            for group in self._group_by_key_set(prepared_records):
+                values = {k: bindparam(k) for k in group[0]}
+                update_stmt = (
+                    self.table
+                        .update()
+                        .where(
+                            self._id_column == bindparam(self.id_column_name)
+                        )
+                        .values(**values)
+                )
+                self.conn.execute(update_stmt, group)
 
-        if self._options.get('fetch_on_update', True):
-            if self.supports_returning:
-                # TODO: use implicit returning if possible
-                return self.fetch_many(_ids)
-            else:
-                return self.fetch_many(_ids)
+        if fetch_on_update:
+            return self.fetch_many(_ids)
         return
 
+    def _update_many_returning(self, prepared_records: List[Dict]) -> Dict:
+        """
+        Update records setting the same columns with one UPDATE per chunk,
+        joining the table on a derived table of their new values, reading
+        back the updated rows through RETURNING instead of fetching them
+        afterwards.
+        """
+        columns = self._get_columns(self.table, self._get_field_names())
+        id_name = self.id_column_name
+
+        records_by_id = {}
+        for group in self._group_by_key_set(prepared_records):
+            keys = sorted(group[0])
+            chunk_size = max(1, self.max_bind_params // len(keys))
+            for i in range(0, len(group), chunk_size):
+                new_values = sa.union_all(*[
+                    sa.select([
+                        sa.cast(
+                            sa.literal(rec[k], type_=self.table.c[k].type),
+                            self.table.c[k].type
+                        ).label(k)
+                        for k in keys
+                    ])
+                    for rec in group[i:i+chunk_size]
+                ]).alias('new_values')
+                update_stmt = (
+                    self.table
+                        .update()
+                        .where(self._id_column == new_values.c[id_name])
+                        .values({
+                            k: new_values.c[k] for k in keys if k != id_name
+                        })
+                        .returning(*columns)
+                )
+                cursor = self.conn.execute(update_stmt)
+                records_by_id.update(self._fetch_records(cursor))
+
+        return records_by_id
+
     def delete(self, _id) -> None:
         prepared_id = self.adapt_id(_id)
         delete_stmt = self.table.delete().where(
@@ -767,6 +929,21 @@ class SqlalchemyStore(Store):
         metadata = self.get_metadata()
         return metadata.bind.dialect.implicit_returning
 
+    @property
+    def supports_bulk_returning(self) -> bool:
+        """
+        Can create_many and update_many read back the rows they write
+        through RETURNING? Of the dialects of the SQLAlchemy versions this
+        store runs on, only postgres compiles RETURNING for multi-row INSERTs
+        and for UPDATEs from a derived table.
+        """
+        if not self._options.get('bulk_returning', True):
+            return False
+        if not self.is_bootstrapped():
+            return False
+        dialect = self.conn.dialect
+        return (dialect.name == 'postgresql') and dialect.implicit_returning
+
     @classmethod
     def create_tables(cls, overwrite=False):
         """
@@ -1,15 +1,17 @@
-from typing import Text, Type
+from typing import Text, Type, Dict, List
 
 import sqlalchemy as sa
 
 from sqlalchemy import ForeignKey
 from appyratus.utils.string_utils import StringUtils
 
-from ravel.constants import REV, ID
+from ravel.constants import REV, ID, INDEX_TYPE
 from ravel.util.loggers import console
 from ravel.util.json_encoder import JsonEncoder
 from ravel.util.misc_functions import get_class_name
-from ravel.schema import fields, Id
+from ravel.schema import fields, Id, get_index_type, get_composite_indexes
+
+from .dialect import Dialect
 
 json_encoder = JsonEncoder()
 
@@ -44,6 +46,7 @@ class SqlalchemyTableBuilder(object):
         is_primary_key_set = False
         id_col = None
         columns = []
+        columns_by_name = {}
         for field in self._resource_type.Schema.fields.values():
             if field.meta.get('ravel_on_resolve'):
                 # if ravel_on_resolve is defined, it means that a custom
@@ -53,6 +56,7 @@ class SqlalchemyTableBuilder(object):
 
             col = self.build_column(field)
             columns.append(col)
+            columns_by_name[field.name] = col
 
             if field.name == ID:
                 id_col = col
@@ -74,9 +78,52 @@ class SqlalchemyTableBuilder(object):
             self._metadata.schema = schema
 
         # finally build and return the SQLAlchemy table object
-        table = sa.Table(table_name, self._metadata, *columns)
+        indexes = self.build_indexes(table_name, columns_by_name)
+        table = sa.Table(table_name, self._metadata, *columns, *indexes)
         return table
 
+    def build_indexes(
+        self, table_name: Text, columns: Dict[Text, sa.Column]
+    ) -> List[sa.Index]:
+        """
+        Derive the Sqlalchemy Index objects that can't be declared on a single
+        column, from the index declarations in the meta of fields. These are
+        hash and inverted (GIN) indexes, in postgres, and composite indexes.
+        """
+        indexes = []
+        schema = self._resource_type.Schema
+        if self.dialect == Dialect.postgresql:
+            for field_name, column in columns.items():
+                field = schema.fields[field_name]
+                index_type = get_index_type(field, None)
+                if index_type == INDEX_TYPE.HASH:
+                    indexes.append(sa.Index(
+                        f'ix_{table_name}_{column.name}',
+                        column,
+                        postgresql_using='hash',
+                    ))
+                elif index_type == INDEX_TYPE.INVERTED:
+                    indexes.append(sa.Index(
+                        f'ix_{table_name}_{column.name}',
+                        column,
+                        postgresql_using='gin',
+                    ))
+
+        for name, field_names in get_composite_indexes(schema).items():
+            missing_names = set(field_names) - columns.keys()
+            if missing_names:
+                console.warning(
+                    f'skipping composite index {name} on fields without '
+                    f'columns: {", ".join(sorted(missing_names))}'
+                )
+                continue
+            indexes.append(sa.Index(
+                f'ix_{table_name}_{name}',
+                *(columns[k] for k in field_names)
+            ))
+
+        return indexes
+
 
     @staticmethod
     def derive_table_name(resource_type: Type['Resource']) -> Text:
@@ -109,7 +156,13 @@ class SqlalchemyTableBuilder(object):
             indexed = True
             server_default = '0'
         else:
-            indexed = field.meta.get('index', False)
+            # hash indexes are built by build_indexes in postgres, which is
+            # the only dialect supporting them here, or else as BTREE indexes.
+            index_type = get_index_type(field, None)
+            indexed = index_type == INDEX_TYPE.BTREE or (
+                index_type == INDEX_TYPE.HASH and
+                self.dialect != Dialect.postgresql
+            )
             server_default = None
             if 'server_default' in field.meta:
                 server_default = field.meta['server_default']
@@ -19,6 +19,7 @@ from appyratus.env import Environment
 from ravel.exceptions import ManifestError
 from ravel.util.misc_functions import get_class_name
 from ravel.util.loggers import console
+from ravel.util.scanner import ScanIndex
 from ravel.schema import Schema, fields
 
 from .scanner import ManifestScanner
@@ -35,6 +36,7 @@ class Manifest:
         bindings = fields.List(Binding.Schema(), default=[])
         bootstraps = fields.List(Bootstrap.Schema(), default=[])
         values = fields.Dict(default={})
+        scan_cache = fields.Bool(default=False)
         logging = fields.Nested({
             'level': fields.Enum(fields.String(), {
                 'DEBUG', 'INFO', 'WARNING', 'CRITICAL', 'ERROR'
@@ -180,6 +182,26 @@ class Manifest:
     def package(self) -> Text:
         return self.data.get('package')
 
+    @property
+    def scan_cache(self) -> bool:
+        return bool(self.data.get('scan_cache'))
+
+    @property
+    def scan_cache_path(self) -> Text:
+        """
+        Path to the ScanIndex file used to skip importing unchanged modules
+        that contain no Resource or Store classes.
+        """
+        path = os.environ.get('RAVEL_SCAN_CACHE_PATH')
+        if not path:
+            cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+                os.path.expanduser('~'), '.cache'
+            )
+            path = os.path.join(
+                cache_dir, 'ravel', f'scan-{self.package or "ravel"}.json'
+            )
+        return path
+
     @property
     def logging(self) -> Dict:
         return self.data.get('logging', {
@@ -519,10 +541,14 @@ class Manifest:
         scanner = ManifestScanner(self)
         futures = []
 
+        # skip importing unchanged modules known not to define anything the
+        # scanner looks for.
+        index = ScanIndex(self.scan_cache_path) if self.scan_cache else None
+
         def scan(package, verbose=False):
             console.debug(f'manifest scanning {package}')
             try:
-                scanner.scan(package)
+                scanner.scan(package, index=index)
             except:
                 console.exception('scan failed')
 
@@ -562,6 +588,12 @@ class Manifest:
                 message='filesystem scan timed out',
             )
 
+        if index is not None:
+            try:
+                index.save()
+            except OSError:
+                console.exception(f'could not save scan index: {index.path}')
+
         t2 = datetime.now()
         secs = (t2 - t1).total_seconds()
         console.debug(f'scanned filesystem in {secs:.2f}s')
@@ -42,6 +42,15 @@ class ManifestScanner(Scanner):
             is_resource_or_store_class(value)
         )
 
+    def is_required_module(self, module) -> bool:
+        """
+        Modules that define actions register them with the app when imported,
+        so they must be imported even if they contain no Resource or Store.
+        """
+        from ravel.app.base.action import Action
+
+        return any(isinstance(v, Action) for v in vars(module).values())
+
     def on_match(self, name: Text, value, context):
         """
         Add the class object to the appripriate container.
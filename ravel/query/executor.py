@@ -27,6 +27,37 @@ class Executor(object):
         self._execute_requests(query, resources, info['requests'])
         return resources
 
+    def execute_columnar(self, query: 'Query') -> 'ColumnarBatch':
+        """
+        Fetch the selected fields into a ColumnarBatch. Only fields can be
+        selected, as other resolvers are resolved on Resource objects.
+        """
+        from ravel.columnar_batch import ColumnarBatch
+
+        info = self._analyze_query(query)
+        if info['requests']:
+            names = ', '.join(sorted(r.resolver.name for r in info['requests']))
+            raise ValueError(f'cannot select {names} in a columnar query')
+
+        resource_type = query.target
+        mode = resource_type.ravel.app.mode
+
+        if mode == 'normal' and (not self.simulate):
+            predicate = query.parameters.where
+            if predicate is None:
+                predicate = resource_type._id != None
+            kwargs = query.parameters.to_dict()
+            store = resource_type.ravel.local.store
+            records = store.dispatch(
+                'query', (predicate, ), dict(kwargs, fields=info['fields'])
+            )
+            return ColumnarBatch.from_records(
+                resource_type, records, fields=info['fields']
+            )
+
+        batch = self._fetch_resources(query, info['fields'])
+        return ColumnarBatch.from_batch(batch, fields=info['fields'])
+
     def _analyze_query(self, query) -> Dict:
         fields_to_fetch = {ID, REV}
         requests_to_execute = set()
@@ -62,11 +93,13 @@ class Executor(object):
 
         if mode == 'normal' and (not self.simulate):
             store = resource_type.ravel.local.store
-            records = store.query(predicate, fields=fields, **kwargs)
+            records = store.dispatch(
+                'query', (predicate, ), dict(kwargs, fields=fields)
+            )
             batch = resource_type.Batch(
                 resource_type(state=record).clean()
                 for record in records
-            )
+            ).link_siblings()
         else:
             values = predicate.satisfy() if predicate else None
             count = kwargs.get('limit') or randint(1, 10)
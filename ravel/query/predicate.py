@@ -39,6 +39,8 @@ OP_CODE_2_DISPLAY_STRING = {
     OP_CODE.LEQ: '<=',
     OP_CODE.INCLUDING: 'in',
     OP_CODE.EXCLUDING: 'not in',
+    OP_CODE.CONTAINS: 'contains',
+    OP_CODE.CONTAINS_ANY: 'contains any',
     OP_CODE.AND: '&&',
     OP_CODE.OR: '||',
 }
@@ -50,6 +52,14 @@ DISPLAY_STRING_2_OP_CODE = {
 NON_SCALAR_OP_CODES = {
     OP_CODE.INCLUDING,
     OP_CODE.EXCLUDING,
+    OP_CODE.CONTAINS,
+    OP_CODE.CONTAINS_ANY,
+}
+
+# ops matching the elements of List and Set fields
+COLLECTION_OP_CODES = {
+    OP_CODE.CONTAINS,
+    OP_CODE.CONTAINS_ANY,
 }
 
 # regular expressions
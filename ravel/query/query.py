@@ -148,9 +148,12 @@ class Query(object):
         self,
         first=None,
         simulate=False,
-    ) -> Union['Resource', 'Batch']:
+        columnar=False,
+    ) -> Union['Resource', 'Batch', 'ColumnarBatch']:
         """
-        Execute the query, returning a single Resource ora a Batch.
+        Execute the query, returning a single Resource ora a Batch. If
+        `columnar` is set, the selected fields are returned in a
+        ColumnarBatch, without building a Resource for each record.
         """
 
         if self.eager:
@@ -159,7 +162,10 @@ class Query(object):
             self.select(self.target.ravel.resolvers.fields.keys())
 
         executor = Executor(simulate=simulate)
-        batch = executor.execute(self, sources=self.sources)
+        if columnar:
+            batch = executor.execute_columnar(self)
+        else:
+            batch = executor.execute(self, sources=self.sources)
 
         if first:
             result = batch[0] if batch else None
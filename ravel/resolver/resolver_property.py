@@ -1,5 +1,6 @@
 from typing import Tuple, Text
 
+from ravel.constants import ID
 from ravel.util.loggers import console
 from ravel.util.misc_functions import get_class_name
 from ravel.util import is_resource, is_batch, is_sequence
@@ -75,49 +76,127 @@ class ResolverProperty(property):
         missing from the state dict, then we lazy load it through the resolver,
         memoizing it in the state dict. This method also runs the resolver's
         on_get callback.
+
+        If the resource remembers the Batch it was hydrated in, the value is
+        lazy loaded for all of its siblings in the batch at once.
         """
         resolver = self.resolver
 
         # if value not loaded, lazily resolve it
         if resolver.name not in resource.internal.state:
-            console.debug(f'lazy loading {resource}.{resolver.name}')
-            request = Request(resolver)
-            value = resolver.resolve(resource, request)
-
-            # if resolver is for a field, we know that the resolved
-            # field has been loaded ON the returned resource (value)
-            if resolver.name in resource.ravel.resolvers.fields:
-                value = resource.internal.state.get(resolver.name, DNE)
-                if value is DNE:
-                    console.debug(
-                        message=(
-                            f'no value returned for '
-                            f'{resource}.{resolver.name}'
-                        )
-                    )
-                    return
-
-            if (value is not None) or resolver.nullable:
-                resource.internal.state[resolver.name] = value
-            elif (value is None) and (not resolver.nullable):
-                if resource.internal.state.get(resolver.name) is None:
-                    resource.internal.state.pop(resolver.name, None)
-                console.warning(
-                    message=(
-                        f'resolver returned bad value'
-                    ),
-                    data={
-                        'resource': resource._id,
-                        'class': resource.class_name,
-                        'resolver': self.resolver.name,
-                        'reason': 'resolver not nullable',
-                    }
-                )
+            if (
+                (resource.internal.batch is not None) and
+                (resolver.name not in resource.ravel.virtual_fields)
+            ):
+                self._lazy_load_batch(resource)
+            else:
+                self._lazy_load(resource)
 
         value = resource.internal.state.get(resolver.name)
         resolver.on_get(resource, value)
         return value
 
+    def _lazy_load(self, resource: 'Resource'):
+        """
+        Resolve and memoize the value of a single resource.
+        """
+        resolver = self.resolver
+
+        console.debug(f'lazy loading {resource}.{resolver.name}')
+        request = Request(resolver)
+        value = resolver.resolve(resource, request)
+
+        # if resolver is for a field, we know that the resolved
+        # field has been loaded ON the returned resource (value)
+        if resolver.name in resource.ravel.resolvers.fields:
+            value = resource.internal.state.get(resolver.name, DNE)
+            if value is DNE:
+                console.debug(
+                    message=(
+                        f'no value returned for '
+                        f'{resource}.{resolver.name}'
+                    )
+                )
+                return
+
+        self._memoize(resource, value)
+
+    def _lazy_load_batch(self, resource: 'Resource'):
+        """
+        Resolve and memoize the value of every resource in the batch that
+        hasn't loaded it yet, through a single call to resolve_batch. If the
+        batch no longer exists or the resolver doesn't support batch
+        resolution, fall back on resolving the value for the given resource
+        only.
+        """
+        batch = resource.internal.batch()
+        if batch is None:
+            self._lazy_load(resource)
+            return
+
+        resolver = self.resolver
+        is_field = resolver.name in resource.ravel.resolvers.fields
+
+        # loading fields requires an _id to fetch them by
+        siblings = type(batch)((
+            res for res in batch
+            if resolver.name not in res.internal.state
+            and ((not is_field) or res.internal.state.get(ID) is not None)
+        ), indexed=False)
+
+        if len(siblings) < 2:
+            self._lazy_load(resource)
+            return
+
+        console.debug(
+            f'lazy loading {resolver.name} for {len(siblings)} '
+            f'resources in {batch}'
+        )
+        request = Request(resolver)
+        results = resolver.resolve_batch(siblings, request)
+
+        if not results:
+            self._lazy_load(resource)
+            return
+
+        for res in siblings:
+            # field loaders write what they fetch directly to state
+            if resolver.name not in res.internal.state:
+                if res in results:
+                    value = results[res]
+                    if resolver.many and value is None:
+                        value = resolver.target.Batch()
+                    elif (not resolver.many) and is_batch(value):
+                        value = None
+                    self._memoize(res, value)
+
+        if resolver.name not in resource.internal.state:
+            self._lazy_load(resource)
+
+    def _memoize(self, resource: 'Resource', value):
+        """
+        Write a lazy loaded value to resource state, unless it is None and the
+        resolver is not nullable.
+        """
+        resolver = self.resolver
+
+        if (value is not None) or resolver.nullable:
+            resource.internal.state[resolver.name] = value
+        elif (value is None) and (not resolver.nullable):
+            if resource.internal.state.get(resolver.name) is None:
+                resource.internal.state.pop(resolver.name, None)
+            console.warning(
+                message=(
+                    f'resolver returned bad value'
+                ),
+                data={
+                    'resource': resource._id,
+                    'class': resource.class_name,
+                    'resolver': self.resolver.name,
+                    'reason': 'resolver not nullable',
+                }
+            )
+
     def fset(self, resource: 'Resource', new_value):
         """
         Set resource state data, calling the resolver's on_set callbak.
@@ -1,4 +1,5 @@
 from typing import Text, Tuple, List, Set, Dict, Type, Union, Callable
+from collections import defaultdict
 from random import randint
 
 from ravel.util.loggers import console
@@ -115,26 +116,58 @@ class Loader(Resolver):
         return resource
 
     def on_resolve_batch(self, batch, request):
-        id_2_resource = {res._id: res for res in batch}
-        resource_ids = []
+        """
+        Fetch the field for every resource in the batch with a single call to
+        the store's fetch_many, loading any other unloaded fields along the
+        way, just as on_resolve does for a single resource.
+        """
+        # virtual fields are resolved by a function, one resource at a time
+        if self._field.meta.get('ravel_on_resolve') is not None:
+            return None
+
+        # group resources by _id, as a batch can hold copies of a resource
+        id_2_resources = defaultdict(list)
         for res in batch:
-            id_2_resource[res._id] = res
-            res_id = res.internal.state.get('_id')
+            res_id = res.internal.state.get(ID)
             if res_id is not None:
-                resource_ids.append(res_id)
+                id_2_resources[res_id].append(res)
 
-        # field names to fetch (fetch all eagerly)
-        field_names = set(self.target.ravel.schema.fields.keys())
-        state_dicts = self.owner.ravel.local.store.dispatch('fetch_many',
-            args=(resource_ids, ),
-            kwargs={'fields': field_names}
-        )
+        if not id_2_resources:
+            return None
 
-        for res_id, state in state_dicts.items():
-            if state:
-                id_2_resource[res_id].merge(state)
+        # fetch the union of all fields unloaded in any of the resources
+        all_field_names = {
+            f.name for f in self.owner.ravel.schema.fields.values()
+            if not f.meta.get('ravel_on_resolve')
+        }
+        unloaded_field_names = {self._field.name}
+        for res in batch:
+            unloaded_field_names.update(
+                all_field_names - res.internal.state.keys()
+            )
 
-        return batch
+        state_dicts = self.owner.ravel.local.store.dispatch(
+            'fetch_many',
+            args=(list(id_2_resources.keys()), ),
+            kwargs={'fields': unloaded_field_names.copy()}
+        ) or {}
+
+        # merge in new state to existing resources, not overwriting any
+        # fields that are dirty, i.e. have changes.
+        results = {}
+        for res_id, resources in id_2_resources.items():
+            state = state_dicts.get(res_id) or {}
+            for res in resources:
+                keys_to_clean = set()
+                for k, v in state.items():
+                    is_dirty = k in res.internal.state.dirty
+                    if not is_dirty or k not in res.internal.state:
+                        keys_to_clean.add(k)
+                        res[k] = v
+                res.clean(keys_to_clean)
+                results[res] = res.internal.state.get(self._field.name)
+
+        return results
 
     def on_simulate(self, resource, request):
         value = None
@@ -192,19 +225,7 @@ class LoaderProperty(ResolverProperty):
         return ConditionalPredicate(OP_CODE.GEQ, self, other)
 
     def including(self, *others) -> Predicate:
-        others = flatten_sequence(others)
-        visited = set()
-        deduplicated = []
-        for obj in others:
-            if is_resource(obj):
-                if obj._id not in visited:
-                    visited.add(obj._id)
-                    deduplicated.append(obj._id)
-            else:
-                if obj not in visited:
-                    visited.add(obj)
-                    deduplicated.append(obj)
-                
+        deduplicated = self._deduplicate(others)
         return ConditionalPredicate(OP_CODE.INCLUDING, self, deduplicated)
 
     def excluding(self, *others) -> Predicate:
@@ -212,6 +233,44 @@ class LoaderProperty(ResolverProperty):
         others = {obj._id if is_resource(obj) else obj for obj in others}
         return ConditionalPredicate(OP_CODE.EXCLUDING, self, others)
 
+    def contains(self, *others) -> Predicate:
+        """
+        Match records whose List or Set field contains all of the given
+        values, as in `Thing.tags.contains('a', 'b')`.
+        """
+        self._require_collection_field()
+        deduplicated = self._deduplicate(others)
+        return ConditionalPredicate(OP_CODE.CONTAINS, self, deduplicated)
+
+    def contains_any(self, *others) -> Predicate:
+        """
+        Match records whose List or Set field contains any of the given
+        values.
+        """
+        self._require_collection_field()
+        deduplicated = self._deduplicate(others)
+        return ConditionalPredicate(OP_CODE.CONTAINS_ANY, self, deduplicated)
+
+    def _require_collection_field(self):
+        if not isinstance(self.resolver.field, (fields.List, fields.Set)):
+            raise ValueError(f'{self} is not a List or Set field')
+
+    @staticmethod
+    def _deduplicate(others) -> List:
+        """
+        Flatten the given values, replacing resources with their _ids, and
+        drop duplicates, preserving order.
+        """
+        visited = set()
+        deduplicated = []
+        for obj in flatten_sequence(others):
+            if is_resource(obj):
+                obj = obj._id
+            if obj not in visited:
+                visited.add(obj)
+                deduplicated.append(obj)
+        return deduplicated
+
     def fset(self, owner: 'Resource', value):
         field = self.resolver.field
         if value is None:
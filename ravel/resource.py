@@ -207,6 +207,7 @@ class Resource(Entity, metaclass=ResourceMeta):
         # initialize internal state data dict
         self.internal = DictObject()
         self.internal.state = DirtyDict()
+        self.internal.batch = None
         self.merge(state, **more_state)
 
         # eagerly generate default ID if none provided
@@ -697,7 +698,7 @@ class Resource(Entity, metaclass=ResourceMeta):
             if isinstance(k, str):
                 keys.add(k)
             elif isinstance(k, ResolverProperty):
-                keys.add(k.name)
+                keys.add(k.resolver.name)
         return keys
 
     # CRUD Methods
@@ -804,7 +805,7 @@ class Resource(Entity, metaclass=ResourceMeta):
             batch = cls.Batch(
                 cls(state=state).clean() for state in states
                 if state is not None
-            )
+            ).link_siblings()
             cls.post_get_many(batch)
         else:
             query = cls.select(select).where(cls._id.including(_ids))
@@ -1,9 +1,10 @@
 import uuid
 
-from typing import Text, Tuple, Callable, Type
+from typing import Text, Tuple, Callable, Type, Dict
 
 from appyratus.schema import Schema, Field, fields
 
+from ravel.constants import INDEX_TYPE
 from ravel.util.misc_functions import get_class_name
 
 # TODO: in Resource meta class, recurse through nested schemas for Id fields
@@ -70,4 +71,54 @@ class Id(fields.Field):
 
 
 # for import convenience:
-fields.Id = Id
\ No newline at end of file
+fields.Id = Id
+
+
+def get_index_type(field: Field, default: Text = INDEX_TYPE.BTREE) -> Text:
+    """
+    Return the INDEX_TYPE declared by the `index` meta of a field, like
+    `String(index='hash')` or `List(String(), index='inverted')`, or None if
+    the field is declared unindexed with `index=False`. True selects a BTREE
+    index, and the default applies when nothing is declared.
+    """
+    index_type = field.meta.get('index')
+    if index_type is None:
+        return default
+    if index_type is True:
+        return INDEX_TYPE.BTREE
+    if index_type is False:
+        return None
+    if index_type not in (
+        INDEX_TYPE.BTREE, INDEX_TYPE.HASH, INDEX_TYPE.INVERTED
+    ):
+        raise ValueError(
+            f'unrecognized index type for field {field.name}: {index_type}'
+        )
+    return index_type
+
+
+def get_composite_indexes(schema: Schema) -> Dict[Text, Tuple[Text]]:
+    """
+    Return the field names of each composite index declared by the
+    `composite_index` meta of the fields in a schema, keyed by index name.
+    Each composite index is declared on its leading field, with a list of the
+    names of the fields that follow it, or a list of such lists to declare
+    several, as in `status = String(composite_index=['age'])`, for an index
+    named `status_age` on (status, age).
+    """
+    composite_indexes = {}
+    for k, field in schema.fields.items():
+        declared = field.meta.get('composite_index')
+        if not declared:
+            continue
+        if isinstance(declared[0], str):
+            declared = [declared]
+        for other_names in declared:
+            names = (k, ) + tuple(other_names)
+            for name in names:
+                if name not in schema.fields:
+                    raise ValueError(
+                        f'unrecognized field in composite index: {name}'
+                    )
+            composite_indexes['_'.join(names)] = names
+    return composite_indexes
\ No newline at end of file
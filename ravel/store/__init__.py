@@ -1,4 +1,10 @@
-from .base import Store
+from .base import (
+    Store,
+    StoreInterceptor,
+    MetricsInterceptor,
+    RetryInterceptor,
+    SlowCallInterceptor,
+)
 from .cache_store import CacheStore
 from .simulation_store import SimulationStore
 from .filesystem_store import FilesystemStore
@@ -1,2 +1,9 @@
 from .store import Store
 from .store_history import StoreHistory, StoreEvent
+from .store_interceptor import (
+    StoreCall,
+    StoreInterceptor,
+    MetricsInterceptor,
+    RetryInterceptor,
+    SlowCallInterceptor,
+)
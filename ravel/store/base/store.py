@@ -19,6 +19,11 @@ from ravel.exceptions import RavelError
 from ravel.constants import ID
 
 from .store_history import StoreHistory, StoreEvent
+from .store_interceptor import (
+    StoreCall,
+    StoreInterceptor,
+    build_interceptor_chain,
+)
 
 
 class StoreError(RavelError):
@@ -31,6 +36,7 @@ class StoreMeta(ABCMeta):
         cls.ravel = DictObject()
         cls.ravel.local = local()
         cls.ravel.local.is_bootstrapped = False
+        cls.ravel.interceptors = []
 
 
 class Store(object, metaclass=StoreMeta):
@@ -42,6 +48,8 @@ class Store(object, metaclass=StoreMeta):
         self._history = StoreHistory(store=self)
         self._is_bound = False
         self._resource_type = None
+        self._interceptors = []
+        self._dispatch_chain = None
 
     def __repr__(self):
         if self.is_bound:
@@ -62,29 +70,26 @@ class Store(object, metaclass=StoreMeta):
         Delegate a Store call to the named method, performing any side-effects,
         like creating a StoreHistory event if need be. This is used internally
         by Resource to call into store methods.
+
+        If any StoreInterceptors are installed, the call is passed through
+        their chain; otherwise, the method is called directly.
         """
         # call the requested Store method
         func = getattr(self, method_name)
-        exc = None
-        try:
-            result = func(*(args or tuple()), **(kwargs or {}))
-        except Exception as exc:
-            raise exc
+        args = args or tuple()
+        kwargs = kwargs or {}
+
+        chain = self._dispatch_chain
+        if chain is None:
+            result = func(*args, **kwargs)
+        else:
+            result = chain(StoreCall(self, method_name, args, kwargs, func))
 
         # create and store the Store call in a history event
         if self.history.is_recording_method(method_name):
-            event = StoreEvent(method_name, args, kwargs, result, exc)
+            event = StoreEvent(method_name, args, kwargs, result)
             self._history.append(event)
 
-        # finally faise the exception if one was generated
-        if exc is not None:
-            data = {'method': method_name, 'args': args, 'kwargs': kwargs}
-            if not isinstance(exc, RavelError):
-                raise RavelError(data=data, wrapped_exception=exc)
-            else:
-                exc.data.update(data)
-                raise exc
-
         return result
 
     @property
@@ -109,6 +114,23 @@ class Store(object, metaclass=StoreMeta):
     def history(self) -> 'StoreHistory':
         return self._history
 
+    @property
+    def interceptors(self) -> Tuple[StoreInterceptor]:
+        return tuple(self._interceptors)
+
+    def add_interceptor(self, interceptor: StoreInterceptor) -> 'Store':
+        """
+        Append an interceptor to the chain that wraps calls to dispatch.
+        """
+        self._interceptors.append(interceptor)
+        self._dispatch_chain = build_interceptor_chain(self._interceptors)
+        return self
+
+    def remove_interceptor(self, interceptor: StoreInterceptor) -> 'Store':
+        self._interceptors.remove(interceptor)
+        self._dispatch_chain = build_interceptor_chain(self._interceptors)
+        return self
+
     def replay(
         self,
         history: StoreHistory = None,
@@ -141,11 +163,21 @@ class Store(object, metaclass=StoreMeta):
 
         return results
 
-    def bind(self, resource_type: Type['Resource'], **kwargs):
+    def bind(
+        self,
+        resource_type: Type['Resource'],
+        interceptors: List[StoreInterceptor] = None,
+        **kwargs
+    ):
         t1 = datetime.now()
         self._resource_type = resource_type
         self.on_bind(resource_type, **kwargs)
 
+        # interceptors given to bootstrap come before those given to bind
+        for interceptor in self.ravel.interceptors + list(interceptors or []):
+            if interceptor not in self._interceptors:
+                self.add_interceptor(interceptor)
+
         t2 = datetime.now()
         secs = (t2 - t1).total_seconds()
         console.debug(
@@ -157,14 +189,21 @@ class Store(object, metaclass=StoreMeta):
         self._is_bound = True
 
     @classmethod
-    def bootstrap(cls, app: 'Application' = None, **kwargs):
+    def bootstrap(
+        cls,
+        app: 'Application' = None,
+        interceptors: List[StoreInterceptor] = None,
+        **kwargs
+    ):
         """
         Perform class-level initialization, like getting
-        a connectio pool, for example.
+        a connectio pool, for example. Interceptors are installed in each
+        instance of the Store class bound thereafter.
         """
         t1 = datetime.now()
 
         cls.ravel.app = app
+        cls.ravel.interceptors = list(interceptors or [])
         cls.on_bootstrap(**kwargs)
 
         cls.ravel.local.is_bootstrapped = True
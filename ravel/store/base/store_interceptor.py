@@ -0,0 +1,311 @@
+import time
+
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+from typing import Dict, List, Text, Tuple, Type, Callable
+
+from ravel.util.misc_functions import get_class_name
+from ravel.util.loggers import console
+
+from .store_history import READ_METHODS
+
+# upper bounds, in milliseconds, of the buckets in a LatencyHistogram
+LATENCY_BUCKETS_MS = (
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000, 10000, float('inf')
+)
+
+
+class StoreCall(object):
+    """
+    A call to a Store method made through Store.dispatch, as seen by each
+    StoreInterceptor in its chain.
+    """
+
+    __slots__ = ('store', 'method', 'args', 'kwargs', 'func')
+
+    def __init__(
+        self,
+        store: 'Store',
+        method: Text,
+        args: Tuple,
+        kwargs: Dict,
+        func: Callable,
+    ):
+        self.store = store
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.func = func
+
+    def __repr__(self):
+        return f'StoreCall({get_class_name(self.store)}.{self.method})'
+
+    @property
+    def resource_type(self) -> Type['Resource']:
+        return self.store.resource_type
+
+    def __call__(self):
+        return self.func(*self.args, **self.kwargs)
+
+
+class StoreInterceptor(object):
+    """
+    Wraps each Store.dispatch call. An interceptor does its work around the
+    call to `proceed(call)`, which invokes the next interceptor in the chain
+    or, for the last one, the Store method itself.
+    """
+
+    def intercept(self, call: StoreCall, proceed: Callable):
+        return proceed(call)
+
+
+def build_interceptor_chain(interceptors: List[StoreInterceptor]) -> Callable:
+    """
+    Compose interceptors into a single function of a StoreCall, with the
+    first interceptor outermost. Return None if there are no interceptors.
+    """
+    if not interceptors:
+        return None
+
+    def call_store(call):
+        return call()
+
+    def link(interceptor, proceed):
+        intercept = interceptor.intercept
+        return lambda call: intercept(call, proceed)
+
+    chain = call_store
+    for interceptor in reversed(interceptors):
+        chain = link(interceptor, chain)
+    return chain
+
+
+class LatencyHistogram(object):
+    """
+    Counts latencies in fixed buckets, so memory and cost per sample stay
+    constant however many calls are recorded.
+    """
+
+    def __init__(self, buckets_ms: Tuple[float] = LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * len(buckets_ms)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float):
+        self.counts[bisect_left(self.buckets_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    @property
+    def mean_ms(self) -> float:
+        return (self.total_ms / self.count) if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """
+        Return the upper bound of the bucket containing the p-th percentile,
+        capped by the largest latency seen.
+        """
+        if not self.count:
+            return 0.0
+        target = p / 100 * self.count
+        seen = 0
+        for upper_ms, count in zip(self.buckets_ms, self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(upper_ms, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean_ms': self.mean_ms,
+            'max_ms': self.max_ms,
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'buckets': {
+                str(upper_ms): count
+                for upper_ms, count in zip(self.buckets_ms, self.counts)
+                if count
+            },
+        }
+
+
+class MethodMetrics(object):
+    """
+    Metrics for one Store method, called on one Resource type.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.records_in = 0
+        self.records_out = 0
+        self.latency = LatencyHistogram()
+
+    def to_dict(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'records_in': self.records_in,
+            'records_out': self.records_out,
+            'latency': self.latency.to_dict(),
+        }
+
+
+def count_records(call: StoreCall, result) -> Tuple[int, int]:
+    """
+    Return the number of records passed into and returned by a Store call,
+    used as its payload size.
+    """
+    method = call.method
+    args = call.args
+    if method in {'create', 'update'}:
+        return (1, 1)
+    if method in {'create_many', 'update_many'}:
+        return (len(args[0]) if args else 0, len(result or ()))
+    if method == 'delete':
+        return (1, 0)
+    if method == 'delete_many':
+        return (len(args[0]) if args else 0, 0)
+    if method == 'fetch':
+        return (0, int(result is not None))
+    if method in {'fetch_many', 'fetch_all', 'query'}:
+        return (0, len(result or ()))
+    return (0, 0)
+
+
+class MetricsInterceptor(StoreInterceptor):
+    """
+    Records call counts, errors, latency histograms and payload sizes, in
+    records, per Resource type and Store method.
+
+    ```python
+    metrics = MetricsInterceptor()
+    SimulationStore.bootstrap(app, interceptors=[metrics])
+    ...
+    print(metrics.to_dict()['User']['fetch_many']['latency']['p99_ms'])
+    ```
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.metrics = defaultdict(lambda: defaultdict(MethodMetrics))
+
+    def intercept(self, call, proceed):
+        error = False
+        result = None
+        t1 = time.perf_counter()
+        try:
+            result = proceed(call)
+            return result
+        except Exception:
+            error = True
+            raise
+        finally:
+            ms = 1000 * (time.perf_counter() - t1)
+            type_name = get_class_name(call.resource_type)
+            with self.lock:
+                metrics = self.metrics[type_name][call.method]
+                metrics.calls += 1
+                metrics.latency.add(ms)
+                if error:
+                    metrics.errors += 1
+                else:
+                    records_in, records_out = count_records(call, result)
+                    metrics.records_in += records_in
+                    metrics.records_out += records_out
+
+    def get(self, resource_type, method: Text) -> MethodMetrics:
+        if not isinstance(resource_type, str):
+            resource_type = get_class_name(resource_type)
+        return self.metrics.get(resource_type, {}).get(method)
+
+    def reset(self):
+        with self.lock:
+            self.metrics.clear()
+
+    def to_dict(self) -> Dict:
+        with self.lock:
+            return {
+                type_name: {
+                    method: metrics.to_dict()
+                    for method, metrics in method_metrics.items()
+                }
+                for type_name, method_metrics in self.metrics.items()
+            }
+
+
+class RetryInterceptor(StoreInterceptor):
+    """
+    Retry failed calls, waiting `backoff * 2 ** attempt` seconds between
+    attempts. Only read methods are retried by default, as writes may not be
+    safe to repeat.
+    """
+
+    def __init__(
+        self,
+        retries: int = 2,
+        backoff: float = 0.05,
+        exceptions: Tuple[Type[Exception]] = (Exception, ),
+        methods: frozenset = READ_METHODS,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.exceptions = exceptions
+        self.methods = methods
+
+    def intercept(self, call, proceed):
+        if call.method not in self.methods:
+            return proceed(call)
+
+        attempt = 0
+        while True:
+            try:
+                return proceed(call)
+            except self.exceptions:
+                if attempt >= self.retries:
+                    raise
+                if self.backoff:
+                    time.sleep(self.backoff * (2 ** attempt))
+                attempt += 1
+
+
+class SlowCallInterceptor(StoreInterceptor):
+    """
+    Log a warning for calls that take longer than `threshold` seconds and
+    count them in `slow_calls`. Store methods run synchronously in the
+    calling thread and can't be preempted, so this is not a deadline: the
+    result of a slow call is returned as is. Bound latency with the timeout
+    options of the store's own client instead.
+    """
+
+    def __init__(self, threshold: float, methods: frozenset = READ_METHODS):
+        self.threshold = threshold
+        self.methods = methods
+        self.slow_calls = 0
+
+    def intercept(self, call, proceed):
+        if call.method not in self.methods:
+            return proceed(call)
+
+        t1 = time.perf_counter()
+        result = proceed(call)
+        secs = time.perf_counter() - t1
+        if secs > self.threshold:
+            self.slow_calls += 1
+            console.warning(
+                message=f'slow store call: {call}',
+                data={
+                    'method': call.method,
+                    'secs': secs,
+                    'threshold': self.threshold,
+                },
+            )
+        return result
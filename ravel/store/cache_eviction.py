@@ -0,0 +1,366 @@
+import sys
+import heapq
+import time
+
+from typing import Dict, List, Set
+from collections import OrderedDict, defaultdict
+from threading import RLock
+
+from appyratus.enum import EnumValueStr
+
+
+class EvictionPolicy(EnumValueStr):
+
+    @staticmethod
+    def values():
+        return {
+            'lru',
+            'lfu',
+        }
+
+
+def approximate_size(value) -> int:
+    """
+    Return the approximate number of bytes taken up by a record, counting the
+    nested containers and values it holds.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        # dict.items bypasses the copying done by CopyOnWriteDict.items
+        for k, v in dict.items(value):
+            size += approximate_size(k) + approximate_size(v)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for v in value:
+            size += approximate_size(v)
+    return size
+
+
+class CacheStats(object):
+    """
+    Counters kept by a CacheStore to help size its front-end cache.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.query_hits = 0
+        self.query_misses = 0
+        self.invalidations = 0
+
+    def __repr__(self):
+        return (
+            f'CacheStats(hits={self.hits}, misses={self.misses}, '
+            f'evictions={self.evictions}, expirations={self.expirations})'
+        )
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return (self.hits / total) if total else 0.0
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.query_hits = 0
+        self.query_misses = 0
+        self.invalidations = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hit_rate,
+            'query_hits': self.query_hits,
+            'query_misses': self.query_misses,
+            'invalidations': self.invalidations,
+        }
+
+
+class EvictionQueue(object):
+    """
+    Orders the _ids of cached records from first to last to be evicted.
+    """
+
+    def __len__(self):
+        raise NotImplementedError('override in subclass')
+
+    def __contains__(self, _id):
+        raise NotImplementedError('override in subclass')
+
+    def insert(self, _id):
+        raise NotImplementedError('override in subclass')
+
+    def touch(self, _id):
+        raise NotImplementedError('override in subclass')
+
+    def remove(self, _id):
+        raise NotImplementedError('override in subclass')
+
+    def pop(self):
+        """
+        Remove and return the _id of the next record to evict.
+        """
+        raise NotImplementedError('override in subclass')
+
+
+class LruQueue(EvictionQueue):
+    """
+    Evicts the least recently used record first.
+    """
+
+    def __init__(self):
+        self._ids = OrderedDict()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, _id):
+        return _id in self._ids
+
+    def insert(self, _id):
+        self._ids[_id] = None
+        self._ids.move_to_end(_id)
+
+    def touch(self, _id):
+        if _id in self._ids:
+            self._ids.move_to_end(_id)
+
+    def remove(self, _id):
+        self._ids.pop(_id, None)
+
+    def pop(self):
+        return self._ids.popitem(last=False)[0]
+
+
+class LfuQueue(EvictionQueue):
+    """
+    Evicts the least frequently used record first, breaking ties by evicting
+    the least recently used. Each access count maps to an ordered bucket of
+    _ids, so that all operations are O(1).
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._buckets = defaultdict(OrderedDict)
+        self._min_count = 0
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __contains__(self, _id):
+        return _id in self._counts
+
+    def insert(self, _id):
+        if _id in self._counts:
+            self.touch(_id)
+        else:
+            self._counts[_id] = 1
+            self._buckets[1][_id] = None
+            self._min_count = 1
+
+    def touch(self, _id):
+        count = self._counts.get(_id)
+        if count is None:
+            return
+        bucket = self._buckets[count]
+        del bucket[_id]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+        self._counts[_id] = count + 1
+        self._buckets[count + 1][_id] = None
+
+    def remove(self, _id):
+        count = self._counts.pop(_id, None)
+        if count is None:
+            return
+        bucket = self._buckets[count]
+        del bucket[_id]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count and self._counts:
+                self._min_count = min(self._buckets)
+
+    def pop(self):
+        bucket = self._buckets[self._min_count]
+        _id = bucket.popitem(last=False)[0]
+        del self._counts[_id]
+        if not bucket:
+            del self._buckets[self._min_count]
+            if self._counts:
+                self._min_count = min(self._buckets)
+        return _id
+
+
+class CacheLeases(object):
+    """
+    Tracks how long each cached record can be served without checking it
+    against the back-end, for bounded staleness. A lease of `duration`
+    seconds is granted whenever a record is cached or found up to date.
+    """
+
+    def __init__(self, duration: float):
+        self.duration = duration
+        self.expires_at = {}
+
+    def __len__(self):
+        return len(self.expires_at)
+
+    def grant(self, _ids):
+        expires_at = time.monotonic() + self.duration
+        for _id in _ids:
+            self.expires_at[_id] = expires_at
+
+    def revoke(self, _ids):
+        for _id in _ids:
+            self.expires_at.pop(_id, None)
+
+    def get_expired(self, _ids) -> Set:
+        """
+        Return those of the _ids with no unexpired lease.
+        """
+        now = time.monotonic()
+        get_expires_at = self.expires_at.get
+        return {_id for _id in _ids if get_expires_at(_id, 0) <= now}
+
+    def clear(self):
+        self.expires_at.clear()
+
+
+class CacheBudget(object):
+    """
+    Decides which records a CacheStore evicts from its front-end, according
+    to an eviction policy, a per-record TTL and a budget of records or of
+    approximate bytes. Unset limits are not enforced.
+    """
+
+    queue_types = {
+        EvictionPolicy.lru: LruQueue,
+        EvictionPolicy.lfu: LfuQueue,
+    }
+
+    def __init__(
+        self,
+        policy: EvictionPolicy = EvictionPolicy.lru,
+        max_records: int = None,
+        max_bytes: int = None,
+        ttl: float = None,
+    ):
+        if policy not in self.queue_types:
+            raise ValueError(f'unrecognized eviction policy: {policy}')
+
+        self.policy = policy
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = RLock()
+        self.queue = self.queue_types[policy]()
+        self.sizes = {}
+        self.total_bytes = 0
+        self.expires_at = {}
+        self.expiry_heap = []
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __contains__(self, _id):
+        return _id in self.queue
+
+    @property
+    def is_bounded(self) -> bool:
+        return (
+            self.max_records is not None or
+            self.max_bytes is not None or
+            self.ttl is not None
+        )
+
+    def insert(self, _id, record: Dict):
+        """
+        Start tracking a record added to or replaced in the cache.
+        """
+        with self.lock:
+            self.queue.insert(_id)
+            if self.max_bytes is not None:
+                size = approximate_size(record)
+                self.total_bytes += size - self.sizes.get(_id, 0)
+                self.sizes[_id] = size
+            if self.ttl is not None:
+                expires_at = time.monotonic() + self.ttl
+                self.expires_at[_id] = expires_at
+                heapq.heappush(self.expiry_heap, (expires_at, _id))
+
+    def touch(self, _id):
+        """
+        Register a cache hit on a record.
+        """
+        with self.lock:
+            self.queue.touch(_id)
+
+    def remove(self, _id):
+        """
+        Stop tracking a record removed from the cache.
+        """
+        with self.lock:
+            self.queue.remove(_id)
+            self.total_bytes -= self.sizes.pop(_id, 0)
+            self.expires_at.pop(_id, None)
+
+    def pop_expired(self) -> Set:
+        """
+        Stop tracking and return the _ids of all records whose TTL has run out.
+        """
+        expired_ids = set()
+        if self.ttl is None:
+            return expired_ids
+
+        with self.lock:
+            now = time.monotonic()
+            heap = self.expiry_heap
+            while heap and heap[0][0] <= now:
+                expires_at, _id = heapq.heappop(heap)
+                # skip heap entries left behind by re-inserts and removals
+                if self.expires_at.get(_id) == expires_at:
+                    expired_ids.add(_id)
+                    self.remove(_id)
+
+        return expired_ids
+
+    def pop_victims(self) -> List:
+        """
+        Stop tracking and return the _ids of the records to evict in order to
+        get back within budget.
+        """
+        victim_ids = []
+
+        with self.lock:
+            while len(self.queue) and self._is_over_budget():
+                _id = self.queue.pop()
+                self.total_bytes -= self.sizes.pop(_id, 0)
+                self.expires_at.pop(_id, None)
+                victim_ids.append(_id)
+
+        return victim_ids
+
+    def clear(self):
+        with self.lock:
+            self.queue = self.queue_types[self.policy]()
+            self.sizes.clear()
+            self.total_bytes = 0
+            self.expires_at.clear()
+            self.expiry_heap.clear()
+
+    def _is_over_budget(self) -> bool:
+        if self.max_records is not None:
+            if len(self.queue) > self.max_records:
+                return True
+        if self.max_bytes is not None:
+            if self.total_bytes > self.max_bytes:
+                return True
+        return False
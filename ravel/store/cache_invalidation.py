@@ -0,0 +1,276 @@
+import os
+import glob
+import json
+import socket
+
+from typing import Dict, List, Set, Tuple, Callable
+from collections import defaultdict
+from threading import RLock, Thread
+from uuid import uuid4
+
+from ravel.util.loggers import console
+from ravel.util.json_encoder import JsonEncoder
+
+
+class InvalidationStats(object):
+    """
+    Counters kept by an InvalidationBus.
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+
+    def __repr__(self):
+        return (
+            f'InvalidationStats(sent={self.sent}, '
+            f'received={self.received}, dropped={self.dropped})'
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            'sent': self.sent,
+            'received': self.received,
+            'dropped': self.dropped,
+        }
+
+
+class InvalidationBus(object):
+    """
+    Broadcasts the (resource type, _id, _rev) of the records written through
+    the CacheStores of one process to those of its peers, so that they can
+    evict their stale copies. The _rev of a record is None when it isn't
+    known, as after a write-behind flush, and deleted records are sent apart.
+
+    Subscribers register a callback per resource type, called from whichever
+    thread receives the message, with a dict of written _ids to _revs and a
+    set of deleted _ids. A bus never delivers its own messages. Delivery is
+    best-effort, so that peers relying on it alone may read stale records
+    when messages are dropped.
+
+    Subclasses move the encoded messages between processes, implementing
+    `send` and, to listen for messages from peers, `start` and `close`,
+    passing each message received to `receive`.
+    """
+
+    # the maximum number of _ids encoded in one message
+    max_ids = 1000
+
+    def __init__(self):
+        self.origin = uuid4().hex
+        self.encoder = JsonEncoder()
+        self.lock = RLock()
+        self.subscribers = defaultdict(list)
+        self.stats = InvalidationStats()
+        self.is_started = False
+
+    def __repr__(self):
+        return f'{type(self).__name__}(origin={self.origin})'
+
+    def subscribe(self, type_name: str, callback: Callable):
+        with self.lock:
+            self.subscribers[type_name].append(callback)
+            if not self.is_started:
+                self.start()
+                self.is_started = True
+
+    def unsubscribe(self, type_name: str, callback: Callable):
+        with self.lock:
+            callbacks = self.subscribers.get(type_name)
+            if callbacks and callback in callbacks:
+                callbacks.remove(callback)
+
+    def publish(
+        self, type_name: str, revs: Dict = None, deleted_ids: Set = None
+    ):
+        """
+        Broadcast the _revs of the written records, by _id, and the _ids of
+        the deleted ones.
+        """
+        for message in self.encode(type_name, revs or {}, deleted_ids or ()):
+            try:
+                self.send(message)
+            except Exception as exc:
+                self.stats.dropped += 1
+                console.error(
+                    message='failed to send cache invalidation',
+                    data={'bus': str(self), 'error': repr(exc)},
+                )
+            else:
+                self.stats.sent += 1
+
+    def receive(self, message: bytes):
+        """
+        Pass a message from a peer to the subscribers of its resource type.
+        """
+        try:
+            type_name, revs, deleted_ids = self.decode(message)
+        except (ValueError, KeyError, TypeError):
+            self.stats.dropped += 1
+            console.warning(
+                message='ignoring malformed cache invalidation',
+                data={'bus': str(self)},
+            )
+            return
+        if type_name is None:
+            return
+
+        self.stats.received += 1
+        with self.lock:
+            callbacks = list(self.subscribers.get(type_name, ()))
+        for callback in callbacks:
+            try:
+                callback(revs, deleted_ids)
+            except Exception as exc:
+                console.error(
+                    message='cache invalidation callback failed',
+                    data={'type': type_name, 'error': repr(exc)},
+                )
+
+    def encode(self, type_name: str, revs: Dict, deleted_ids) -> List[bytes]:
+        """
+        Return the messages, of up to `max_ids` _ids each, to send.
+        """
+        items = [[_id, rev, False] for _id, rev in revs.items()]
+        items.extend([_id, None, True] for _id in deleted_ids)
+        return [
+            self.encoder.encode({
+                'origin': self.origin,
+                'type': type_name,
+                'items': items[i:i + self.max_ids],
+            }).encode()
+            for i in range(0, len(items), self.max_ids)
+        ]
+
+    def decode(self, message: bytes) -> Tuple[str, Dict, Set]:
+        """
+        Return the resource type name, written _revs and deleted _ids of a
+        message, with a type name of None if it's from this bus.
+        """
+        data = json.loads(message)
+        if data['origin'] == self.origin:
+            return None, {}, set()
+        revs = {}
+        deleted_ids = set()
+        for _id, rev, is_deleted in data['items']:
+            if is_deleted:
+                deleted_ids.add(_id)
+            else:
+                revs[_id] = rev
+        return data['type'], revs, deleted_ids
+
+    def send(self, message: bytes):
+        raise NotImplementedError()
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class LocalInvalidationBus(InvalidationBus):
+    """
+    An InvalidationBus delivering messages to the buses created in this
+    process with the same channel, as when workers are threads, each with
+    its own CacheStore.
+    """
+
+    channels = defaultdict(list)
+    channels_lock = RLock()
+
+    def __init__(self, channel: str = 'default'):
+        super().__init__()
+        self.channel = channel
+
+    def send(self, message: bytes):
+        with self.channels_lock:
+            peers = list(self.channels[self.channel])
+        for peer in peers:
+            if peer is not self:
+                peer.receive(message)
+
+    def start(self):
+        with self.channels_lock:
+            self.channels[self.channel].append(self)
+
+    def close(self):
+        with self.channels_lock:
+            peers = self.channels[self.channel]
+            if self in peers:
+                peers.remove(self)
+
+
+class UnixSocketInvalidationBus(InvalidationBus):
+    """
+    An InvalidationBus for the processes of one host, each listening on a
+    Unix datagram socket of its own, in a directory shared by all of them.
+    Messages are sent to every socket in the directory, removing those left
+    behind by processes that have exited.
+    """
+
+    # large enough for a message of max_ids UUIDs and their _revs
+    buffer_size = 256 * 1024
+
+    # how often the listening thread checks whether the bus is closed
+    poll_interval = 1.0
+
+    def __init__(self, path: str = '/tmp/ravel-cache-invalidation'):
+        super().__init__()
+        self.path = path
+        self.socket_path = os.path.join(path, f'{self.origin}.sock')
+        self.sock = None
+        self.thread = None
+
+    def start(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, self.buffer_size
+        )
+        self.sock.bind(self.socket_path)
+        self.sock.settimeout(self.poll_interval)
+        self.thread = Thread(target=self._listen, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if self.sock is None:
+            return
+        sock, self.sock = self.sock, None
+        try:
+            os.remove(self.socket_path)
+        except FileNotFoundError:
+            pass
+        sock.close()
+
+    def send(self, message: bytes):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            for peer_path in glob.glob(os.path.join(self.path, '*.sock')):
+                if peer_path == self.socket_path:
+                    continue
+                try:
+                    sock.sendto(message, peer_path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # the peer has exited without removing its socket
+                    try:
+                        os.remove(peer_path)
+                    except OSError:
+                        pass
+                except BlockingIOError:
+                    # the peer isn't keeping up with its messages
+                    self.stats.dropped += 1
+
+    def _listen(self):
+        while True:
+            sock = self.sock
+            if sock is None:
+                return
+            try:
+                message = sock.recv(self.buffer_size)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            self.receive(message)
@@ -0,0 +1,197 @@
+from typing import Dict, List, Set, Tuple
+from collections import OrderedDict, defaultdict
+from threading import RLock
+
+from ravel.util.misc_functions import normalize_to_tuple
+from ravel.query.predicate import (
+    ConditionalPredicate,
+    BooleanPredicate,
+    NON_SCALAR_OP_CODES,
+)
+
+
+def freeze(value):
+    """
+    Return a hashable equivalent of a predicate value, raising TypeError if
+    it has none.
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze(v) for v in value)
+    if isinstance(value, dict):
+        return frozenset((k, freeze(v)) for k, v in value.items())
+    hash(value)
+    return value
+
+
+def normalize_predicate(predicate, field_names: Set):
+    """
+    Return a hashable key equal for predicates that differ only in the order
+    of the operands of their ANDs and ORs or of the values of their
+    non-scalar ops, adding the names of the fields they reference to the
+    given set.
+    """
+    if predicate is None:
+        return None
+
+    if isinstance(predicate, ConditionalPredicate):
+        name = predicate.field.source
+        field_names.add(name)
+        value = predicate.value
+        if predicate.op in NON_SCALAR_OP_CODES:
+            value = frozenset(freeze(v) for v in value)
+        else:
+            value = freeze(value)
+        return (name, predicate.op, value)
+
+    if isinstance(predicate, BooleanPredicate):
+        operands = []
+        stack = [predicate]
+        while stack:
+            p = stack.pop()
+            if isinstance(p, BooleanPredicate) and p.op == predicate.op:
+                stack.extend(x for x in (p.lhs, p.rhs) if x is not None)
+            else:
+                operands.append(normalize_predicate(p, field_names))
+        return (predicate.op, frozenset(operands))
+
+    raise TypeError(f'unrecognized predicate: {predicate}')
+
+
+def make_query_key(
+    predicate, order_by=None, limit: int = None, offset: int = None
+) -> Tuple[Tuple, Set]:
+    """
+    Return the key under which the _ids returned by a query are cached,
+    along with the names of the fields referenced by its predicate and
+    ordering, raising TypeError if the predicate has unhashable values.
+    """
+    field_names = set()
+    predicate_key = normalize_predicate(predicate, field_names)
+    order_by_key = tuple(
+        (x.key, x.desc) for x in normalize_to_tuple(order_by or ())
+    )
+    field_names.update(key for key, desc in order_by_key)
+    return (predicate_key, order_by_key, limit, offset or 0), field_names
+
+
+class CachedQuery(object):
+
+    __slots__ = ('ids', 'field_names', 'offset')
+
+    def __init__(self, ids: List, field_names: Set, offset: int):
+        self.ids = ids
+        self.field_names = field_names
+        self.offset = offset
+
+
+class QueryCache(object):
+    """
+    Caches the _ids returned by the queries of a CacheStore, up to
+    `max_size` queries, evicting the least recently used first.
+
+    A cached query is invalidated by updates to the fields referenced by its
+    predicate or ordering and by the deletion of any of its records, or of
+    any record at all if it has an offset, which deletes may shift. Creates
+    invalidate all cached queries, as new records can match any of them.
+    """
+
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self.lock = RLock()
+        self.queries = OrderedDict()
+        self.keys_by_field = defaultdict(set)
+        self.keys_by_id = defaultdict(set)
+        self.offset_keys = set()
+        self.version = 0
+
+    def __len__(self):
+        return len(self.queries)
+
+    def __contains__(self, key):
+        return key in self.queries
+
+    def get(self, key) -> List:
+        """
+        Return the _ids cached for the query key, or None.
+        """
+        with self.lock:
+            query = self.queries.get(key)
+            if query is None:
+                return None
+            self.queries.move_to_end(key)
+            return query.ids
+
+    def put(self, key, field_names: Set, ids: List, version: int = None):
+        """
+        Cache the _ids returned by a query, unless queries were invalidated
+        since the given version, read before it ran.
+        """
+        with self.lock:
+            if version is not None and version != self.version:
+                return
+            self._remove(key)
+
+            offset = key[-1]
+            self.queries[key] = CachedQuery(ids, field_names, offset)
+            for name in field_names:
+                self.keys_by_field[name].add(key)
+            for _id in ids:
+                self.keys_by_id[_id].add(key)
+            if offset:
+                self.offset_keys.add(key)
+
+            while len(self.queries) > self.max_size:
+                self._remove(next(iter(self.queries)))
+
+    def invalidate_fields(self, field_names: Set):
+        """
+        Invalidate the queries referencing any of the fields.
+        """
+        with self.lock:
+            keys = set()
+            for name in field_names:
+                keys.update(self.keys_by_field.get(name, ()))
+            self._invalidate(keys)
+
+    def invalidate_ids(self, _ids):
+        """
+        Invalidate the queries affected by the deletion of the records.
+        """
+        with self.lock:
+            keys = set(self.offset_keys)
+            for _id in _ids:
+                keys.update(self.keys_by_id.get(_id, ()))
+            self._invalidate(keys)
+
+    def clear(self):
+        with self.lock:
+            self.queries.clear()
+            self.keys_by_field.clear()
+            self.keys_by_id.clear()
+            self.offset_keys.clear()
+            self.version += 1
+
+    def _invalidate(self, keys: Set):
+        for key in keys:
+            self._remove(key)
+        self.version += 1
+
+    def _remove(self, key):
+        query = self.queries.pop(key, None)
+        if query is None:
+            return
+        for name in query.field_names:
+            self._discard(self.keys_by_field, name, key)
+        for _id in query.ids:
+            self._discard(self.keys_by_id, _id, key)
+        self.offset_keys.discard(key)
+
+    @staticmethod
+    def _discard(keys_by_value: Dict, value, key):
+        keys = keys_by_value.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del keys_by_value[value]
@@ -2,16 +2,27 @@ import os
 import multiprocessing as mp
 
 from typing import Text, Type, List, Set, Dict, Tuple
+from collections import deque
 from copy import deepcopy
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
 
 from appyratus.enum import EnumValueStr
 
 from ravel.util.misc_functions import remove_keys, import_object
+from ravel.util.bloom_filter import BloomFilter
 from ravel.constants import ID, REV
 
-from .base import Store, StoreEvent
+from .base import Store
+from .cache_eviction import (
+    EvictionPolicy,
+    CacheBudget,
+    CacheLeases,
+    CacheStats,
+)
+from .cache_writeback import WriteBehindQueue, CREATE, UPDATE, DELETE
+from .cache_queries import QueryCache, make_query_key
+from .negative_cache import NegativeCache
+from .cache_invalidation import InvalidationBus
 
 
 class CacheMode(EnumValueStr):
@@ -25,29 +36,77 @@ class CacheMode(EnumValueStr):
         }
 
 
-class CacheStoreExecutor(ThreadPoolExecutor):
+class Consistency(EnumValueStr):
+    """
+    How a CacheStore checks cached records against the BE on reads: on every
+    read (strict), once their lease has run out (bounded) or never, relying
+    on writes to replace or remove them (invalidate).
+    """
 
-    def __init__(self, store: 'CacheStore'):
-        super().__init__(max_workers=1, initializer=self.initializer)
-        self.store = store
-
-    def initializer(self):
-        self.store.be.bootstrap(self.store.be.app)
-        self.store.be.bind(self.store.be.resource_type)
-
-    def enqueue(self, method: Text, args=None, kwargs=None):
-
-        def task(store, event):
-            store.play([event])
-
-        event = StoreEvent(method=method, args=args, kwargs=kwargs)
-        return self.submit(task, store=self.store.be, event=event)
+    @staticmethod
+    def values():
+        return {
+            'strict',
+            'bounded',
+            'invalidate',
+        }
 
 
 class CacheStore(Store):
+    """
+    A Store that caches records from a back-end (BE) store in a front-end
+    (FE) store. By default, the FE keeps every record it has seen. Its size
+    can be bounded by a budget of records (max_records) or of approximate
+    bytes (max_bytes), with records evicted according to an eviction policy,
+    LRU or LFU, and records can be expired a given number of seconds (ttl)
+    after they were cached. Hit, miss, eviction and expiration counts are kept
+    in the `stats` attribute.
+
+    Reads check cached records against their revs in the BE according to a
+    consistency level, set per store or passed to fetch_many and query. With
+    `bounded` consistency, each record holds a lease of `lease` seconds,
+    renewed whenever it's cached or checked, and a hit on a record with an
+    unexpired lease costs no BE call. With `invalidate`, it never does.
+
+    Given `max_queries`, the _ids returned by that many distinct queries are
+    cached in a QueryCache, keyed by their normalized predicate, order_by,
+    limit and offset, and invalidated by the writes that can change them.
+    Queries with `strict` consistency always reach the BE, bypassing it.
+
+    Given `negative_cache_size`, the _ids found missing are remembered in a
+    NegativeCache, for `negative_ttl` seconds if set, so that probing them
+    again doesn't reach the BE. With `bloom_capacity`, it also holds a
+    BloomFilter of the _ids in the BE, which answers for any missing _id,
+    provided that records are only created through this store.
+
+    In writeback mode, writes reach the BE through a WriteBehindQueue, which
+    coalesces the writes to each record and flushes them in batches of up to
+    `batch_size` records, at least every `flush_interval` seconds. Reads
+    account for the writes still queued, and `flush` applies them all.
+
+    Given an `invalidation_bus`, an InvalidationBus or the dotted path of one
+    with its params, the _ids and _revs of the records written through the
+    store are broadcast to its peers in other processes once they reach the
+    BE, and those written by its peers are evicted from the FE, along with
+    the cached queries and negative entries they affect, before the next
+    read. This lets peers read with `invalidate` or `bounded` consistency.
+    """
 
     prefetch = False
     mode = CacheMode.writethru
+    consistency = Consistency.strict
+    lease = 1.0
+    max_queries = None
+    negative_cache_size = None
+    negative_ttl = None
+    bloom_capacity = None
+    invalidation_bus = None
+    policy = EvictionPolicy.lru
+    max_records = None
+    max_bytes = None
+    ttl = None
+    batch_size = 1000
+    flush_interval = 1.0
     fe = None
     be = None
     fe_params = None
@@ -55,14 +114,52 @@ class CacheStore(Store):
 
     def __init__(self):
         super().__init__()
-        self.executor = None
+        self.write_queue = None
+        self.budget = None
+        self.leases = None
+        self.query_cache = None
+        self.negative_cache = None
+        self.invalidations = deque()
+        self.stats = CacheStats()
 
     @classmethod
-    def on_bootstrap(cls, prefetch=False, mode=None, front=None, back=None):
+    def on_bootstrap(
+        cls,
+        prefetch=False,
+        mode=None,
+        front=None,
+        back=None,
+        policy=None,
+        max_records=None,
+        max_bytes=None,
+        ttl=None,
+        batch_size=None,
+        flush_interval=None,
+        consistency=None,
+        lease=None,
+        max_queries=None,
+        negative_cache_size=None,
+        negative_ttl=None,
+        bloom_capacity=None,
+        invalidation_bus=None,
+    ):
         from .simulation_store import SimulationStore
 
         cls.prefetch = prefetch if prefetch is not None else cls.prefetch
         cls.mode = mode or cls.mode
+        cls.policy = policy or cls.policy
+        cls.max_records = max_records
+        cls.max_bytes = max_bytes
+        cls.ttl = ttl
+        cls.batch_size = batch_size or cls.batch_size
+        cls.flush_interval = flush_interval or cls.flush_interval
+        cls.consistency = consistency or cls.consistency
+        cls.lease = lease if lease is not None else cls.lease
+        cls.max_queries = max_queries
+        cls.negative_cache_size = negative_cache_size
+        cls.negative_ttl = negative_ttl
+        cls.bloom_capacity = bloom_capacity
+        cls.invalidation_bus = cls._build_invalidation_bus(invalidation_bus)
         cls.fe = SimulationStore()
         cls.fe_params = front
         cls.be_params = back
@@ -74,14 +171,43 @@ class CacheStore(Store):
         mode: CacheMode = None,
         front: Dict = None,
         back: Dict = None,
+        policy: EvictionPolicy = None,
+        max_records: int = None,
+        max_bytes: int = None,
+        ttl: float = None,
+        batch_size: int = None,
+        flush_interval: float = None,
+        consistency: Consistency = None,
+        lease: float = None,
+        max_queries: int = None,
+        negative_cache_size: int = None,
+        negative_ttl: float = None,
+        bloom_capacity: int = None,
+        invalidation_bus: InvalidationBus = None,
     ):
         if prefetch is not None:
             self.prefetch = prefetch
 
         self.mode = mode or self.mode
+        self.consistency = consistency or self.consistency
+        if self.consistency not in Consistency.values():
+            raise ValueError(f'unrecognized consistency: {self.consistency}')
+        self.leases = CacheLeases(lease if lease is not None else self.lease)
+
+        max_queries = max_queries or self.max_queries
+        if max_queries:
+            self.query_cache = QueryCache(max_queries)
         front = front or self.fe_params
         back = back or self.be_params
 
+        self.budget = CacheBudget(
+            policy=policy or self.policy,
+            max_records=max_records if max_records is not None
+                else self.max_records,
+            max_bytes=max_bytes if max_bytes is not None else self.max_bytes,
+            ttl=ttl if ttl is not None else self.ttl,
+        )
+
         self.fe = self._setup_inner_store(
             resource_type,
             front['store'],
@@ -93,11 +219,83 @@ class CacheStore(Store):
             back.get('params', {}),
         )
 
+        negative_cache_size = negative_cache_size or self.negative_cache_size
+        if negative_cache_size:
+            bloom_capacity = bloom_capacity or self.bloom_capacity
+            bloom_filter = None
+            if bloom_capacity:
+                bloom_filter = BloomFilter(bloom_capacity)
+                bloom_filter.update(
+                    rec[ID]
+                    for rec in self.be.fetch_all(fields={ID}).values()
+                    if rec is not None
+                )
+            self.negative_cache = NegativeCache(
+                negative_cache_size,
+                ttl=negative_ttl or self.negative_ttl,
+                bloom_filter=bloom_filter,
+            )
+
+        if invalidation_bus is not None:
+            self.invalidation_bus = self._build_invalidation_bus(
+                invalidation_bus
+            )
+        if self.invalidation_bus is not None:
+            self.invalidation_bus.subscribe(
+                resource_type.__name__, self._on_invalidation
+            )
+
         if self.prefetch:
             self.fetch_all()
 
         if self.mode == CacheMode.writeback:
-            self.executor = CacheStoreExecutor(self)
+            self.write_queue = WriteBehindQueue(
+                self.be,
+                batch_size=batch_size or self.batch_size,
+                flush_interval=flush_interval or self.flush_interval,
+                initializer=self._bind_writeback_thread,
+                on_flush=self._on_writeback_flush,
+            )
+
+    @staticmethod
+    def _build_invalidation_bus(bus) -> InvalidationBus:
+        """
+        Return the InvalidationBus given as such, as the dotted path of its
+        class or as a dict of it and its params.
+        """
+        if bus is None or isinstance(bus, InvalidationBus):
+            return bus
+        if isinstance(bus, str):
+            bus = {'class': bus}
+        bus_class = import_object(bus['class'])
+        if not issubclass(bus_class, InvalidationBus):
+            raise ValueError(f'not an InvalidationBus: {bus["class"]}')
+        return bus_class(**bus.get('params', {}))
+
+    def _bind_writeback_thread(self):
+        self.be.bootstrap(self.be.app)
+        self.be.bind(self.be.resource_type)
+
+    def flush(self, timeout: float = None):
+        """
+        Apply the writes queued in writeback mode to the BE, returning once
+        they are.
+        """
+        if self.write_queue is not None:
+            self.write_queue.flush(timeout=timeout)
+
+    def get_writeback_stats(self) -> Dict:
+        """
+        Return the depth of the write-behind queue, the number of records
+        with writes not yet applied to the BE, along with its counters and
+        the latency of its flushes.
+        """
+        if self.write_queue is None:
+            return None
+        return dict(
+            self.write_queue.stats.to_dict(),
+            depth=self.write_queue.depth,
+        )
 
     def _setup_inner_store(
         self, resource_type: Type['BizType'], store_class_name: Text, bind_params: Dict = None
@@ -120,12 +318,18 @@ class CacheStore(Store):
         raise NotImplementedError()
 
     def count(self) -> int:
+        self.flush()
         return self.be.count()
 
-    def fetch(self, _id, fields: Dict = None) -> Dict:
-        return self.fetch_many({_id}, fields=fields).get(_id)
+    def fetch(
+        self, _id, fields: Dict = None, consistency: Consistency = None
+    ) -> Dict:
+        return self.fetch_many(
+            {_id}, fields=fields, consistency=consistency
+        ).get(_id)
 
     def fetch_all(self, fields: Set[Text] = None) -> Dict:
+        self.flush()
         be_ids = {
             rec[ID]
             for rec in self.be.fetch_all(fields={ID}).values()
@@ -133,34 +337,74 @@ class CacheStore(Store):
         }
         return self.fetch_many(be_ids, fields=fields)
 
-    def fetch_many(self, _ids, fields: Dict = None) -> Dict:
-        fe_records = self.fe.fetch_many(_ids, fields=fields)
-        be_revs = self.be.fetch_many(fe_records.keys(), fields={REV})
+    def fetch_many(
+        self, _ids, fields: Dict = None, consistency: Consistency = None
+    ) -> Dict:
+        self._apply_invalidations()
+        self._expire()
+        return self._fetch_many(_ids, fields, consistency)[0]
 
+    def _fetch_many(
+        self, _ids, fields: Dict = None, consistency: Consistency = None
+    ) -> Tuple[Dict, Set]:
+        """
+        Return the records, by _id, along with the _ids of those found
+        updated or deleted in the BE since they were cached.
+        """
         ids = set(_ids) if not isinstance(_ids, set) else _ids
-        ids_fe = set(fe_records.keys())    # ids in FE
-        ids_missing = ids - ids_fe    # ids not in FE
-        ids_to_delete = ids_fe - be_revs.keys()    # ids to delete in FE
-        ids_to_update = set()    # ids to update in FE
+        ids_known_missing = self._get_known_missing(ids)
+        if ids_known_missing:
+            ids = ids - ids_known_missing
+
+        pending = self._get_pending_writes(ids)
+        fe_records = self.fe.fetch_many(ids, fields=fields)
+        ids_to_update, ids_to_delete = self._check_revs(
+            fe_records, consistency, pending.keys()
+        )
 
+        ids_missing = ids - fe_records.keys()    # ids not in FE
         for _id, fe_rec in fe_records.items():
             if fe_rec is None:
                 ids_missing.add(_id)
-            elif be_revs.get(_id, {}).get(REV, 0) > fe_rec.get(REV, 0):
-                ids_to_update.add(_id)
+            elif _id in ids_to_delete:
+                fe_records[_id] = None
+            elif _id not in ids_to_update:
+                self.budget.touch(_id)
+
+        self.stats.misses += (
+            len(ids_missing) + len(ids_to_update) + len(ids_to_delete)
+        )
+        self.stats.hits += (
+            len(ids) - len(ids_missing) - len(ids_to_update) -
+            len(ids_to_delete)
+        )
 
-        # records in BE ONLY
-        ids_to_fetch_from_be = ids_missing | ids_to_update
+        # records in BE ONLY, or in the write-behind queue if evicted from
+        # the FE before their writes were flushed
+        ids_pending = ids_missing & pending.keys()
+        ids_to_fetch_from_be = (ids_missing | ids_to_update) - ids_pending
         if ids_to_fetch_from_be:
             be_records = self.be.fetch_many(ids_to_fetch_from_be)
         else:
             be_records = {}
+        for _id in ids_pending:
+            be_records[_id] = deepcopy(pending[_id].record)
+        if self.negative_cache is not None:
+            # stores may return None for missing _ids or leave them out
+            self.negative_cache.add_many(
+                (ids_to_delete | ids_to_fetch_from_be | ids_pending) - {
+                    _id for _id, be_rec in be_records.items()
+                    if be_rec is not None
+                }
+            )
 
         # partition fe_records into separate lists for
         # performing batch insert and update
         records_to_update = []
         records_to_create = []
         for _id, be_rec in be_records.items():
+            if be_rec is None:
+                continue
             if _id in ids_missing:
                 records_to_create.append(be_rec)
             elif _id in ids_to_update:
@@ -168,13 +412,15 @@ class CacheStore(Store):
 
         # perform batch operations in FE
         if ids_to_delete:
-            self.fe.delete_many(ids_to_delete)
+            self._fe_delete_many(ids_to_delete)
         if records_to_create:
-            self.fe.create_many(records_to_create)
+            self._cache_records(self.fe.create_many(records_to_create))
         if records_to_update:
-            self.fe.update_many(
-                (rec[ID] for rec in records_to_update), records_to_update
-            )
+            self._cache_records(self.fe.update_many(
+                [rec[ID] for rec in records_to_update], records_to_update
+            ).values())
+
+        self._evict()
 
         # merge fresh BE records to return into FE records
         if be_records:
@@ -190,21 +436,96 @@ class CacheStore(Store):
             else:
                 fe_records.update(be_records)
 
-        return fe_records
+        for _id in ids_known_missing:
+            fe_records[_id] = None
 
-    def query(self, predicate, **kwargs):
+        return fe_records, ids_to_update | ids_to_delete
+
+    def query(self, predicate, consistency: Consistency = None, **kwargs):
         """
+        Return the records matching the predicate in the FE, after checking
+        their revs as per the consistency level, along with those matching
+        in the BE but missing from the FE. With a query cache, the _ids
+        returned are cached, and a cached query only fetches its records,
+        unless any of them is found changed in the BE, which may change the
+        results, in which case the query runs again. Strict queries bypass
+        the query cache, as records created or updated in the BE by others
+        may match them.
         """
+        self._apply_invalidations()
+        self._expire()
+
+        consistency = consistency or self.consistency
+        if self.query_cache is None or consistency == Consistency.strict:
+            return self._query(predicate, consistency, **kwargs)
+
+        try:
+            key, field_names = make_query_key(
+                predicate,
+                kwargs.get('order_by'),
+                kwargs.get('limit'),
+                kwargs.get('offset'),
+            )
+        except TypeError:
+            # the predicate has unhashable values
+            return self._query(predicate, consistency, **kwargs)
+
+        ids = self.query_cache.get(key)
+        if ids is not None:
+            records, ids_stale = self._fetch_many(
+                ids, fields=kwargs.get('fields'), consistency=consistency
+            )
+            if not ids_stale:
+                self.stats.query_hits += 1
+                return [records[_id] for _id in ids if records.get(_id)]
+            self.query_cache.invalidate_ids(ids_stale)
+
+        self.stats.query_misses += 1
+        version = self.query_cache.version
+        records = self._query(predicate, consistency, **kwargs)
+        self.query_cache.put(
+            key, field_names, [rec[ID] for rec in records], version
+        )
+        return records
+
+    def _query(self, predicate, consistency: Consistency = None, **kwargs):
         fe_records = self.fe.query(predicate=predicate, **kwargs)
+        ids_to_update, ids_to_delete = self._check_revs(
+            {rec[ID]: rec for rec in fe_records}, consistency
+        )
+        if ids_to_delete:
+            self._fe_delete_many(ids_to_delete)
+        if ids_to_update or ids_to_delete:
+            # stale records are queried from the BE, as they may no longer
+            # match the predicate
+            ids_stale = ids_to_update | ids_to_delete
+            fe_records = [
+                rec for rec in fe_records if rec[ID] not in ids_stale
+            ]
+
         ids_fe = {rec[ID] for rec in fe_records}
+        for _id in ids_fe:
+            self.budget.touch(_id)
 
         # TODO: update predicate to fetch records with stale revs too
-        predicate = self.resource_type._id.excluding(ids_fe) & predicate
+        ids_excluded = ids_fe
+        if self.write_queue is not None:
+            ids_excluded = ids_fe | self.write_queue.get_deleted_ids()
+        predicate = self.resource_type._id.excluding(ids_excluded) & predicate
         be_records = self.be.query(predicate=predicate, **kwargs)
 
+        self.stats.hits += len(ids_fe)
+        self.stats.misses += len(be_records)
+
         # do batch FE operations
         # merge BE records into FE records to return
-        fe_records.extend(self.fe.create_many(be_records))
+        if be_records:
+            if self.negative_cache is not None:
+                self.negative_cache.discard_many(rec[ID] for rec in be_records)
+            fe_records.extend(self._cache_records(
+                self.fe.create_many(be_records)
+            ))
+            self._evict()
 
         return fe_records
 
@@ -212,10 +533,24 @@ class CacheStore(Store):
         """
         Return True if the record with the given _id exists.
         """
-        return self.be.exists(_id)
+        return self.exists_many([_id])[_id]
 
     def exists_many(self, _ids: Set) -> Dict[object, bool]:
-        return self.be.exists_many(_ids)
+        self._apply_invalidations()
+        ids = set(_ids)
+        ids_known_missing = self._get_known_missing(ids)
+        pending = self._get_pending_writes(ids - ids_known_missing)
+        ids_to_check = ids - ids_known_missing - pending.keys()
+        exists = self.be.exists_many(ids_to_check) if ids_to_check else {}
+        if self.negative_cache is not None:
+            self.negative_cache.add_many(
+                _id for _id, is_found in exists.items() if not is_found
+            )
+        for _id, write in pending.items():
+            exists[_id] = write.op != DELETE
+        for _id in ids_known_missing:
+            exists[_id] = False
+        return exists
 
     def create(self, data: Dict) -> Dict:
         """
@@ -224,6 +559,10 @@ class CacheStore(Store):
         responsibility of the Store class to generate the _id.
         """
         fe_record = self.fe.create(data)
+        self._cache_records([fe_record])
+        self._invalidate_queries()
+        if self.negative_cache is not None:
+            self.negative_cache.discard(fe_record[ID])
 
         # remove _rev from a copy of fe_record so that the BE store doesn't
         # increment it from what was set by the FE store.
@@ -232,9 +571,11 @@ class CacheStore(Store):
 
         if self.mode == CacheMode.writethru:
             self.be.create(fe_record_no_rev)
+            self._publish(revs={fe_record[ID]: fe_record[REV]})
         if self.mode == CacheMode.writeback:
-            self.executor.enqueue('create', args=(fe_record_no_rev, ))
+            self.write_queue.put(CREATE, fe_record[ID], fe_record_no_rev)
 
+        self._evict()
         return fe_record
 
     def create_many(self, records: List[Dict]) -> None:
@@ -242,19 +583,26 @@ class CacheStore(Store):
         Create a new record.  It is the responsibility of the Store class to
         generate the _id.
         """
-        fe_records = self.fe.create_many(records)
+        fe_records = self._cache_records(self.fe.create_many(records))
+        self._invalidate_queries()
+        if self.negative_cache is not None:
+            self.negative_cache.discard_many(rec[ID] for rec in fe_records)
 
         fe_records_no_rev = []
-        for rec in fe_records.values():
+        for rec in fe_records:
             rec = rec.copy()
             del rec[REV]
             fe_records_no_rev.append(rec)
 
-        if self.mode == CaheMode.writethru:
+        if self.mode == CacheMode.writethru:
             be_records = self.be.create_many(fe_records_no_rev)
+            self._publish(revs={rec[ID]: rec[REV] for rec in fe_records})
         elif self.mode == CacheMode.writeback:
-            self.executor.enqueue('create_many', args=(fe_records_no_rev, ))
+            self.write_queue.put_many(
+                CREATE, [rec[ID] for rec in fe_records], fe_records_no_rev
+            )
 
+        self._evict()
         return fe_records
 
     def update(self, _id, record: Dict) -> Dict:
@@ -264,63 +612,289 @@ class CacheStore(Store):
         """
         record.setdefault(ID, _id)
 
+        # an evicted record must be cached again before it's updated, as the
+        # FE would otherwise only hold the updated fields.
         if not self.fe.exists(_id):
-            return self.create(record)
+            self.fetch_many({_id})
+            if not self.fe.exists(_id):
+                return self.create(record)
 
         fe_record = self.fe.update(_id, record)
+        self._cache_records([fe_record])
+        self._invalidate_queries(field_names=(record.keys() - {ID}) | {REV})
         fe_record_no_rev = fe_record.copy()
         del fe_record_no_rev[REV]
 
         if self.mode == CacheMode.writethru:
             self.be.update(_id, fe_record_no_rev)
+            self._publish(revs={_id: fe_record[REV]})
         elif self.mode == CacheMode.writeback:
-            self.executor.enqueue(
-                'update', args=(
-                    _id,
-                    fe_record_no_rev,
-                )
-            )
+            self.write_queue.put(UPDATE, _id, fe_record_no_rev)
 
+        self._evict()
         return fe_record
 
-    def update_many(self, _ids: List, data: Dict = None) -> None:
+    def update_many(self, _ids: List, data: List[Dict] = None) -> None:
         """
         Update multiple records. If a single data dict is passed in, then try to
         apply the same update to all records; otherwise, if a list of data dicts
         is passed in, try to zip the _ids with the data dicts and apply each
         unique update or each group of identical updates individually.
         """
-        fe_records = self.fe.update_many(records)
+        _ids = list(_ids)
+        if isinstance(data, dict):
+            data = [data.copy() for _ in _ids]
+
+        # evicted records must be cached again before they're updated, as the
+        # FE would otherwise only hold the updated fields.
+        ids_missing = [
+            _id for _id, exists in self.fe.exists_many(_ids).items()
+            if not exists
+        ]
+        if ids_missing:
+            self.fetch_many(ids_missing)
+
+        fe_records = {}
+        ids_to_update = []
+        records_to_update = []
+        for _id, record in zip(_ids, data):
+            record.setdefault(ID, _id)
+            if self.fe.exists(_id):
+                ids_to_update.append(_id)
+                records_to_update.append(record)
+            else:
+                fe_records[_id] = self.create(record)
+
+        if not ids_to_update:
+            return fe_records
+
+        updated_records = self.fe.update_many(ids_to_update, records_to_update)
+        self._cache_records(updated_records.values())
+        self._invalidate_queries(field_names=(
+            set().union(*(rec.keys() for rec in records_to_update)) - {ID}
+        ) | {REV})
+        fe_records.update(updated_records)
+
+        fe_records_no_rev = []
+        for _id in ids_to_update:
+            rec = updated_records[_id].copy()
+            del rec[REV]
+            fe_records_no_rev.append(rec)
 
-        if self.mode == CaheMode.writethru:
-            be_records = self.be.update_many(_ids, records)
+        if self.mode == CacheMode.writethru:
+            self.be.update_many(ids_to_update, fe_records_no_rev)
+            self._publish(revs={
+                _id: updated_records[_id][REV] for _id in ids_to_update
+            })
         elif self.mode == CacheMode.writeback:
-            self.executor.enqueue(
-                'create_many', args=(_ids, ), kwargs={'data': data}
+            self.write_queue.put_many(
+                UPDATE, ids_to_update, fe_records_no_rev
             )
+
+        self._evict()
         return fe_records
 
     def delete(self, _id) -> None:
         """
         Delete a single record.
         """
-        self.fe.delete(_id)
+        self._fe_delete_many([_id])
+        self._invalidate_queries(_ids=[_id])
+        if self.negative_cache is not None:
+            self.negative_cache.add(_id)
 
         if self.mode == CacheMode.writethru:
             self.be.delete(_id)
+            self._publish(deleted_ids={_id})
         elif self.mode == CacheMode.writeback:
-            self.executor.enqueue('delete', args=(_id, ))
+            self.write_queue.put(DELETE, _id)
 
     def delete_many(self, _ids: List) -> None:
         """
         Delete multiple records.
         """
-        self.fe.delete_many(_ids)
+        _ids = list(_ids)
+        self._fe_delete_many(_ids)
+        self._invalidate_queries(_ids=_ids)
+        if self.negative_cache is not None:
+            self.negative_cache.add_many(_ids)
 
         if self.mode == CacheMode.writethru:
             self.be.delete_many(_ids)
+            self._publish(deleted_ids=set(_ids))
         elif self.mode == CacheMode.writeback:
-            self.executor.enqueue('delete_many', args=(_ids, ))
+            self.write_queue.put_many(DELETE, _ids)
 
     def delete_all(self) -> None:
         raise NotImplementedError()
+
+    def _check_revs(
+        self,
+        fe_records: Dict,
+        consistency: Consistency = None,
+        ids_pending: Set = None,
+    ) -> Tuple[Set, Set]:
+        """
+        Compare the revs of the given FE records with those in the BE, as
+        required by the consistency level, returning the _ids of the records
+        updated and of those deleted in the BE since they were cached. The
+        leases of those found up to date are renewed.
+        """
+        consistency = consistency or self.consistency
+        if consistency not in Consistency.values():
+            raise ValueError(f'unrecognized consistency: {consistency}')
+        if consistency == Consistency.invalidate:
+            return set(), set()
+
+        # records with writes queued for the BE are newer in the FE
+        ids_to_check = {
+            _id for _id, rec in fe_records.items() if rec is not None
+        }
+        if ids_pending is None:
+            ids_pending = self._get_pending_writes(ids_to_check).keys()
+        ids_to_check -= ids_pending
+        if consistency == Consistency.bounded:
+            ids_to_check = self.leases.get_expired(ids_to_check)
+        if not ids_to_check:
+            return set(), set()
+
+        be_revs = self.be.fetch_many(ids_to_check, fields={REV})
+
+        ids_updated = set()
+        ids_deleted = set()
+        for _id in ids_to_check:
+            be_rec = be_revs.get(_id)
+            if be_rec is None:
+                ids_deleted.add(_id)
+            elif be_rec.get(REV, 0) > fe_records[_id].get(REV, 0):
+                ids_updated.add(_id)
+
+        self.leases.grant(ids_to_check - ids_updated - ids_deleted)
+        if ids_deleted:
+            self._invalidate_queries(_ids=ids_deleted)
+        return ids_updated, ids_deleted
+
+    def _invalidate_queries(self, field_names: Set = None, _ids=None):
+        """
+        Invalidate the cached queries affected by writes to the fields or by
+        the deletion of the records, or all of them if neither is given, as
+        after creates.
+        """
+        if self.query_cache is None:
+            return
+        if field_names is not None:
+            self.query_cache.invalidate_fields(field_names)
+        elif _ids is not None:
+            self.query_cache.invalidate_ids(_ids)
+        else:
+            self.query_cache.clear()
+
+    def _publish(self, revs: Dict = None, deleted_ids: Set = None):
+        if self.invalidation_bus is not None:
+            self.invalidation_bus.publish(
+                self.resource_type.__name__, revs, deleted_ids
+            )
+
+    def _on_writeback_flush(self, batch: Dict):
+        """
+        Publish the writes of a batch applied to the BE, without their
+        _revs, which the BE sets.
+        """
+        self._publish(
+            revs={
+                _id: None for _id, write in batch.items()
+                if write.op != DELETE
+            },
+            deleted_ids={
+                _id for _id, write in batch.items() if write.op == DELETE
+            },
+        )
+
+    def _on_invalidation(self, revs: Dict, deleted_ids: Set):
+        # called from the bus's thread, so the FE is left to the next read
+        self.invalidations.append((revs, deleted_ids))
+
+    def _apply_invalidations(self):
+        """
+        Evict the records written by peers since the last read from the FE,
+        and invalidate the cached queries and negative entries they affect.
+        Every message evicts, as the _revs of different processes aren't
+        ordered, being derived from the clocks of their hosts.
+        """
+        if not self.invalidations:
+            return
+
+        revs = {}
+        deleted_ids = set()
+        while self.invalidations:
+            peer_revs, peer_deleted_ids = self.invalidations.popleft()
+            for _id in peer_deleted_ids:
+                revs.pop(_id, None)
+            deleted_ids.update(peer_deleted_ids)
+            deleted_ids.difference_update(peer_revs.keys())
+            revs.update(peer_revs)
+
+        fe_records = self.fe.fetch_many(
+            revs.keys() | deleted_ids, fields={REV}
+        )
+        ids_stale = {
+            _id for _id, fe_rec in fe_records.items() if fe_rec is not None
+        }
+
+        if ids_stale:
+            self._fe_delete_many(ids_stale)
+            self.stats.invalidations += len(ids_stale)
+        if self.negative_cache is not None:
+            self.negative_cache.add_many(deleted_ids)
+            self.negative_cache.discard_many(revs.keys())
+        if revs:
+            self._invalidate_queries()
+        elif deleted_ids:
+            self._invalidate_queries(_ids=deleted_ids)
+
+    def _get_known_missing(self, _ids) -> Set:
+        if self.negative_cache is None:
+            return set()
+        return self.negative_cache.get_missing(_ids)
+
+    def _get_pending_writes(self, _ids) -> Dict:
+        if self.write_queue is None:
+            return {}
+        return self.write_queue.get_pending(_ids)
+
+    def _cache_records(self, records: List[Dict]) -> List[Dict]:
+        """
+        Track records just written to the FE in the cache budget.
+        """
+        records = list(records)
+        for record in records:
+            if record is not None:
+                self.budget.insert(record[ID], record)
+        self.leases.grant(rec[ID] for rec in records if rec is not None)
+        return records
+
+    def _fe_delete_many(self, _ids):
+        for _id in _ids:
+            self.budget.remove(_id)
+        self.leases.revoke(_ids)
+        self.fe.delete_many(_ids)
+
+    def _expire(self):
+        """
+        Delete records whose TTL has run out from the FE.
+        """
+        expired_ids = self.budget.pop_expired()
+        if expired_ids:
+            self.leases.revoke(expired_ids)
+            self.fe.delete_many(expired_ids)
+            self.stats.expirations += len(expired_ids)
+
+    def _evict(self):
+        """
+        Evict records from the FE until it is back within budget.
+        """
+        victim_ids = self.budget.pop_victims()
+        if victim_ids:
+            self.leases.revoke(victim_ids)
+            self.fe.delete_many(victim_ids)
+            self.stats.evictions += len(victim_ids)
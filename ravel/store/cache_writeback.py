@@ -0,0 +1,384 @@
+import time
+
+from typing import Dict, List, Set, Callable
+from threading import Thread, Condition
+
+from ravel.util.loggers import console
+
+from .base.store_interceptor import LatencyHistogram
+
+# ops of pending writes
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+
+
+class PendingWrite(object):
+    """
+    The net effect of the writes made to one record since the last flush,
+    where `replaces` means that a CREATE must delete the record from the
+    back-end first, as it was deleted and created again.
+    """
+
+    __slots__ = ('op', 'record', 'replaces')
+
+    def __init__(self, op, record: Dict = None, replaces=False):
+        self.op = op
+        self.record = record
+        self.replaces = replaces
+
+    def __repr__(self):
+        return f'PendingWrite(op={self.op}, replaces={self.replaces})'
+
+
+def coalesce(pending: PendingWrite, op, record: Dict = None) -> PendingWrite:
+    """
+    Return the PendingWrite equivalent to applying a write after the pending
+    one, or None if they cancel out. Records are always whole, so that the
+    last one written supersedes those before it.
+    """
+    if pending is None:
+        return PendingWrite(op, record)
+    if op == DELETE:
+        if pending.op == CREATE and not pending.replaces:
+            # the back-end never had the record
+            return None
+        return PendingWrite(DELETE)
+    if pending.op == UPDATE:
+        if op == UPDATE:
+            return PendingWrite(UPDATE, record)
+        return PendingWrite(CREATE, record, replaces=True)
+    if pending.op == DELETE:
+        return PendingWrite(CREATE, record, replaces=True)
+    return PendingWrite(CREATE, record, replaces=pending.replaces)
+
+
+class WriteBehindStats(object):
+    """
+    Counters kept by a WriteBehindQueue, along with the latency of flushes.
+    """
+
+    def __init__(self):
+        self.writes = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.records_flushed = 0
+        self.failures = 0
+        self.latency = LatencyHistogram()
+
+    def __repr__(self):
+        return (
+            f'WriteBehindStats(writes={self.writes}, '
+            f'flushes={self.flushes}, failures={self.failures})'
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            'writes': self.writes,
+            'coalesced': self.coalesced,
+            'flushes': self.flushes,
+            'records_flushed': self.records_flushed,
+            'failures': self.failures,
+            'latency': self.latency.to_dict(),
+        }
+
+
+class WriteBehindQueue(object):
+    """
+    Collects the writes a CacheStore makes in writeback mode and applies them
+    to its back-end store in batches, from a background thread. Writes to the
+    same record are coalesced while pending, so that only their net effect
+    reaches the back-end, as one create_many, update_many and delete_many
+    per batch.
+
+    A batch is flushed when `batch_size` records are pending or when the
+    oldest pending write is `flush_interval` seconds old, or on demand with
+    `flush`. When a batch fails, the writes it didn't get to apply are put
+    back in the queue, under any writes made since, and retried after
+    `flush_interval` seconds. The writes applied are passed to `on_flush`, if
+    given, from the background thread, whether or not the batch failed.
+    """
+
+    def __init__(
+        self,
+        store: 'Store',
+        batch_size: int = 1000,
+        flush_interval: float = 1.0,
+        initializer: Callable = None,
+        on_flush: Callable = None,
+    ):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.initializer = initializer
+        self.on_flush = on_flush
+        self.stats = WriteBehindStats()
+        self.cond = Condition()
+        self.pending = {}
+        self.in_flight = {}
+        self.first_write_at = None
+        self.retry_at = None
+        self.error = None
+        self.is_flush_requested = False
+        self.is_closed = False
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        """
+        Return the number of records with pending writes.
+        """
+        return len(self.pending)
+
+    def __repr__(self):
+        return f'WriteBehindQueue(depth={len(self)})'
+
+    @property
+    def depth(self) -> int:
+        """
+        The number of records with writes not yet applied to the back-end,
+        including those of the batch being flushed.
+        """
+        with self.cond:
+            return len(self.pending.keys() | self.in_flight.keys())
+
+    def get_pending(self, _ids) -> Dict[object, PendingWrite]:
+        """
+        Return the PendingWrite of each of the given _ids whose writes are not
+        yet applied to the back-end, newest first.
+        """
+        with self.cond:
+            if not (self.pending or self.in_flight):
+                return {}
+            pending = {}
+            for _id in _ids:
+                write = self.pending.get(_id) or self.in_flight.get(_id)
+                if write is not None:
+                    pending[_id] = write
+            return pending
+
+    def get_deleted_ids(self) -> Set:
+        """
+        Return the _ids of records deleted but not yet from the back-end.
+        """
+        with self.cond:
+            deleted_ids = {
+                _id for _id, write in self.in_flight.items()
+                if write.op == DELETE
+            }
+            deleted_ids.update(
+                _id for _id, write in self.pending.items()
+                if write.op == DELETE
+            )
+            deleted_ids.difference_update(
+                _id for _id, write in self.pending.items()
+                if write.op != DELETE
+            )
+            return deleted_ids
+
+    def put(self, op, _id, record: Dict = None):
+        """
+        Queue a write of the record with the _id, or its deletion.
+        """
+        self.put_many(op, [_id], [record])
+
+    def put_many(self, op, _ids: List, records: List[Dict] = None):
+        if records is None:
+            records = [None] * len(_ids)
+
+        with self.cond:
+            if self.is_closed:
+                # XXX: raise StoreError
+                raise Exception('write-behind queue is closed')
+            if not self.pending:
+                self.first_write_at = time.monotonic()
+            for _id, record in zip(_ids, records):
+                if _id in self.pending:
+                    self.stats.coalesced += 1
+                write = coalesce(self.pending.get(_id), op, record)
+                if write is None:
+                    del self.pending[_id]
+                else:
+                    self.pending[_id] = write
+            self.stats.writes += len(_ids)
+            if len(self.pending) >= self.batch_size:
+                self.cond.notify_all()
+
+    def flush(self, timeout: float = None):
+        """
+        Apply all pending writes to the back-end, returning once they are,
+        and raise the exception of the batch if it fails.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            self.error = None
+            self.is_flush_requested = True
+            self.cond.notify_all()
+            try:
+                while self.pending or self.in_flight:
+                    if self.error is not None:
+                        raise self.error
+                    if not self.thread.is_alive():
+                        # XXX: raise StoreError
+                        raise Exception('write-behind thread is not running')
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            # XXX: raise StoreError
+                            raise Exception('timed out flushing writes')
+                    self.cond.wait(remaining)
+            finally:
+                self.is_flush_requested = False
+
+    def close(self, timeout: float = None):
+        """
+        Flush pending writes and stop the background thread.
+        """
+        try:
+            self.flush(timeout=timeout)
+        finally:
+            with self.cond:
+                self.is_closed = True
+                self.cond.notify_all()
+            self.thread.join(timeout)
+
+    def _run(self):
+        if self.initializer is not None:
+            self.initializer()
+
+        while True:
+            with self.cond:
+                while not self._is_due():
+                    if self.is_closed:
+                        return
+                    self.cond.wait(self._get_wait_time())
+                batch = self.in_flight = self.pending
+                self.pending = {}
+                self.first_write_at = None
+
+            # writes are dropped from here as they are applied
+            unapplied = dict(batch)
+            try:
+                self._apply(unapplied)
+            except Exception as exc:
+                console.error(
+                    message='failed to flush writes to back-end store',
+                    data={'store': str(self.store), 'error': repr(exc)},
+                )
+                with self.cond:
+                    self._restore(unapplied)
+                    self.stats.failures += 1
+                    self.error = exc
+                    self.retry_at = time.monotonic() + self.flush_interval
+                self._notify_flush({
+                    _id: write for _id, write in batch.items()
+                    if unapplied.get(_id) is not write
+                })
+            else:
+                self.retry_at = None
+                self._notify_flush(batch)
+
+            with self.cond:
+                self.in_flight = {}
+                self.cond.notify_all()
+
+    def _is_due(self) -> bool:
+        if not self.pending:
+            return False
+        if self.is_flush_requested or self.is_closed:
+            # a flush is retried only once it's requested again
+            return self.error is None
+        now = time.monotonic()
+        if self.retry_at is not None and now < self.retry_at:
+            return False
+        return (
+            len(self.pending) >= self.batch_size or
+            now - self.first_write_at >= self.flush_interval
+        )
+
+    def _get_wait_time(self) -> float:
+        if not self.pending:
+            return None
+        due_at = self.first_write_at + self.flush_interval
+        if self.retry_at is not None:
+            due_at = max(due_at, self.retry_at)
+        return max(due_at - time.monotonic(), 0)
+
+    def _notify_flush(self, batch: Dict[object, PendingWrite]):
+        if self.on_flush is None or not batch:
+            return
+        try:
+            self.on_flush(batch)
+        except Exception as exc:
+            console.error(
+                message='write-behind flush callback failed',
+                data={'error': repr(exc)},
+            )
+
+    def _apply(self, batch: Dict[object, PendingWrite]):
+        """
+        Apply the writes of a batch to the back-end, removing those of each
+        step from the batch once it succeeds, so that only the rest are
+        retried if a later step fails, as creating a record twice would.
+        """
+        ids_to_delete = []
+        records_to_create = []
+        ids_to_update = []
+        records_to_update = []
+        for _id, write in batch.items():
+            if write.op == DELETE or write.replaces:
+                ids_to_delete.append(_id)
+            if write.op == CREATE:
+                records_to_create.append(write.record)
+            elif write.op == UPDATE:
+                ids_to_update.append(_id)
+                records_to_update.append(write.record)
+
+        count = len(batch)
+
+        t1 = time.perf_counter()
+        if ids_to_delete:
+            self.store.delete_many(ids_to_delete)
+            for _id in ids_to_delete:
+                write = batch.pop(_id)
+                if write.op == CREATE:
+                    # what remains is to create the record
+                    batch[_id] = PendingWrite(CREATE, write.record)
+        if records_to_create:
+            self.store.create_many(records_to_create)
+            for _id, write in list(batch.items()):
+                if write.op == CREATE:
+                    del batch[_id]
+        if ids_to_update:
+            self.store.update_many(ids_to_update, records_to_update)
+            batch.clear()
+        t2 = time.perf_counter()
+
+        with self.cond:
+            self.stats.flushes += 1
+            self.stats.records_flushed += count
+            self.stats.latency.add((t2 - t1) * 1000)
+
+    def _restore(self, batch: Dict[object, PendingWrite]):
+        """
+        Put the writes of a failed batch back in the queue, before those
+        made since it was taken.
+        """
+        pending = self.pending
+        self.pending = batch
+        for _id, write in pending.items():
+            if _id in self.pending:
+                # replay the newer write, deleting first if it replaces
+                newer = write
+                write = self.pending[_id]
+                if newer.op == DELETE or newer.replaces:
+                    write = coalesce(write, DELETE)
+                if newer.op != DELETE:
+                    write = coalesce(write, newer.op, newer.record)
+            if write is None:
+                self.pending.pop(_id, None)
+            else:
+                self.pending[_id] = write
+        if self.pending and self.first_write_at is None:
+            self.first_write_at = time.monotonic()
@@ -15,12 +15,14 @@ from appyratus.utils.dict_utils import DictObject, DictUtils
 from appyratus.utils.string_utils import StringUtils
 
 from ravel.util.misc_functions import import_object
+from ravel.util.bloom_filter import BloomFilter
 from ravel.util.loggers import console
 from ravel.constants import ID, REV
 from ravel.exceptions import RavelError
 
 from .base import Store
 from .simulation_store import SimulationStore
+from .negative_cache import NegativeCache
 
 
 class StoreError(RavelError):
@@ -38,6 +40,9 @@ class FilesystemStore(Store):
     env = Environment()
     root = None
     paths = None
+    negative_cache_size = None
+    negative_ttl = None
+    bloom_capacity = None
 
     def __init__(
         self,
@@ -48,6 +53,7 @@ class FilesystemStore(Store):
 
         self._paths = DictObject()
         self._cache_store = SimulationStore()
+        self._negative_cache = None
 
         # convert the ftype string arg into a File class ref
         if not ftype:
@@ -83,13 +89,19 @@ class FilesystemStore(Store):
         use_recursive_merge=True,
         store_primitives=False,
         prefetch: bool = True,
-        yaml_loader_class: Text = 'FullLoader'
+        yaml_loader_class: Text = 'FullLoader',
+        negative_cache_size: int = None,
+        negative_ttl: float = None,
+        bloom_capacity: int = None,
     ):
         cls.ftype = import_object(ftype) if ftype else Yaml
         cls.root = root or cls.root
         cls.use_recursive_merge = use_recursive_merge
         cls.store_primitives = store_primitives
         cls.do_prefetch = prefetch
+        cls.negative_cache_size = negative_cache_size
+        cls.negative_ttl = negative_ttl
+        cls.bloom_capacity = bloom_capacity
 
         if 'yaml' in cls.ftype.extensions():
             cls.yaml_loader_class = getattr(yaml, yaml_loader_class, None)
@@ -107,9 +119,14 @@ class FilesystemStore(Store):
         store_primitives=None,
         prefetch: bool = None,
         yaml_loader_class: Text = None,
+        negative_cache_size: int = None,
+        negative_ttl: float = None,
+        bloom_capacity: int = None,
     ):
         """
-        Ensure the data dir exists for this Resource type.
+        Ensure the data dir exists for this Resource type. Given a
+        `negative_cache_size`, the _ids of missing files are remembered, so
+        that looking them up again doesn't touch the filesystem.
         """
         if isinstance(ftype, str):
             self.ftype = import_object(ftype)
@@ -135,6 +152,19 @@ class FilesystemStore(Store):
 
         os.makedirs(self.paths.records, exist_ok=True)
 
+        negative_cache_size = negative_cache_size or self.negative_cache_size
+        if negative_cache_size:
+            bloom_capacity = bloom_capacity or self.bloom_capacity
+            bloom_filter = None
+            if bloom_capacity:
+                bloom_filter = BloomFilter(bloom_capacity)
+                bloom_filter.update(self._fetch_all_ids())
+            self._negative_cache = NegativeCache(
+                negative_cache_size,
+                ttl=negative_ttl or self.negative_ttl,
+                bloom_filter=bloom_filter,
+            )
+
         # bootstrap, bind, and backfill the in-memory cache
         if self.do_prefetch:
             self.bust_cache(self.do_prefetch)
@@ -173,7 +203,14 @@ class FilesystemStore(Store):
         return record.get(ID, UuidString.next_id())
 
     def exists(self, _id: Text) -> bool:
-        return BaseFile.exists(self.mkpath(_id))
+        if self._negative_cache is None:
+            return BaseFile.exists(self.mkpath(_id))
+        if _id in self._negative_cache:
+            return False
+        if not BaseFile.exists(self.mkpath(_id)):
+            self._negative_cache.add(_id)
+            return False
+        return True
 
     def exists_many(self, _ids: Set) -> Dict[object, bool]:
         return {_id: self.exists(_id) for _id in _ids}
@@ -219,6 +256,10 @@ class FilesystemStore(Store):
             all_ids = _ids
 
         ids_to_fetch_from_fs = set()
+        ids_known_missing = set()
+        if self._negative_cache is not None and not ignore_cache:
+            ids_known_missing = self._negative_cache.get_missing(all_ids)
+            all_ids = all_ids - ids_known_missing
 
         # we do not want to ignore the cache here
         if not ignore_cache:
@@ -252,6 +293,8 @@ class FilesystemStore(Store):
                     )
                 except FileNotFoundError:
                     records[_id] = None
+                    if self._negative_cache is not None:
+                        self._negative_cache.add(_id)
                     console.debug(
                         message='file not found by filesystem store',
                         data={'filepath': fpath}
@@ -281,6 +324,9 @@ class FilesystemStore(Store):
             self._cache_store.create_many(non_null_records)
             cached_records.update(records)
 
+        for _id in ids_known_missing:
+            cached_records[_id] = None
+
         return cached_records
 
     def fetch_all(self, fields: Set[Text] = None, ignore_cache=False) -> Dict:
@@ -318,6 +364,9 @@ class FilesystemStore(Store):
         else:
             self.ftype.write(path=fpath, data=record)
 
+        if self._negative_cache is not None:
+            self._negative_cache.discard(_id)
+
         self._cache_store.update(_id, record)
         return record
 
@@ -331,6 +380,8 @@ class FilesystemStore(Store):
         self._cache_store.delete(_id)
         fpath = self.mkpath(_id)
         os.remove(fpath)
+        if self._negative_cache is not None:
+            self._negative_cache.add(_id)
 
     def delete_many(self, _ids: List) -> None:
         for _id in _ids:
@@ -0,0 +1,106 @@
+import time
+
+from typing import Set
+from collections import OrderedDict
+from threading import RLock
+
+from ravel.util.bloom_filter import BloomFilter
+
+
+class NegativeCache(object):
+    """
+    Remembers the _ids a store has found missing, so that fetching them
+    again or checking whether they exist doesn't reach its storage. Up to
+    `max_size` _ids are kept, dropping the least recently added first, each
+    for `ttl` seconds, if set, in case another process creates it.
+
+    Given a BloomFilter of all existing _ids, an _id is also known missing
+    when it's definitely absent from the filter, however many _ids are
+    probed. The filter can't forget _ids, so it's only complete, and
+    correct, if records are created through the store using it.
+
+    Owners call `discard` when creating records and `add` when deleting
+    them or finding them missing.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl: float = None,
+        bloom_filter: BloomFilter = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.bloom_filter = bloom_filter
+        self.lock = RLock()
+        self.expires_at = OrderedDict()
+        self.hits = 0
+
+    def __len__(self):
+        return len(self.expires_at)
+
+    def __repr__(self):
+        return (
+            f'NegativeCache(size={len(self)}, hits={self.hits}, '
+            f'bloom_filter={self.bloom_filter})'
+        )
+
+    def __contains__(self, _id) -> bool:
+        return bool(self.get_missing([_id]))
+
+    def get_missing(self, _ids) -> Set:
+        """
+        Return those of the _ids known to be missing.
+        """
+        missing_ids = set()
+        with self.lock:
+            now = time.monotonic()
+            for _id in _ids:
+                if self.bloom_filter is not None:
+                    if _id not in self.bloom_filter:
+                        missing_ids.add(_id)
+                        continue
+                expires_at = self.expires_at.get(_id)
+                if expires_at is not None:
+                    if expires_at > now:
+                        missing_ids.add(_id)
+                    else:
+                        del self.expires_at[_id]
+            self.hits += len(missing_ids)
+        return missing_ids
+
+    def add(self, _id):
+        self.add_many([_id])
+
+    def add_many(self, _ids):
+        """
+        Remember the _ids as missing.
+        """
+        expires_at = float('inf')
+        if self.ttl is not None:
+            expires_at = time.monotonic() + self.ttl
+        with self.lock:
+            for _id in _ids:
+                self.expires_at[_id] = expires_at
+                self.expires_at.move_to_end(_id)
+            while len(self.expires_at) > self.max_size:
+                self.expires_at.popitem(last=False)
+
+    def discard(self, _id):
+        self.discard_many([_id])
+
+    def discard_many(self, _ids):
+        """
+        Forget the _ids as missing, as they were created.
+        """
+        with self.lock:
+            for _id in _ids:
+                self.expires_at.pop(_id, None)
+                if self.bloom_filter is not None:
+                    self.bloom_filter.add(_id)
+
+    def clear(self):
+        with self.lock:
+            self.expires_at.clear()
+            if self.bloom_filter is not None:
+                self.bloom_filter.clear()
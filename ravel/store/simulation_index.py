@@ -0,0 +1,632 @@
+from collections import defaultdict
+from typing import Text, Set, Dict, List, Tuple
+
+from BTrees.OOBTree import BTree
+
+from ravel.constants import OP_CODE, INDEX_TYPE
+
+RANGE_OP_CODES = frozenset({
+    OP_CODE.GT,
+    OP_CODE.GEQ,
+    OP_CODE.LT,
+    OP_CODE.LEQ,
+})
+
+# ops evaluated as the complement of the _ids with the given values
+COMPLEMENT_OP_CODES = frozenset({
+    OP_CODE.NEQ,
+    OP_CODE.EXCLUDING,
+})
+
+# ops matching the elements of List and Set fields, evaluated by InvertedIndex
+CONTAINS_OP_CODES = frozenset({
+    OP_CODE.CONTAINS,
+    OP_CODE.CONTAINS_ANY,
+})
+
+# fractions of an index assumed to match a range predicate bounded on one or
+# both sides, in the absence of a histogram of its values
+RANGE_SELECTIVITY = 1 / 3
+BOUNDED_RANGE_SELECTIVITY = 1 / 4
+
+
+def union(id_sets) -> Set:
+    """
+    Return a new set with the union of the given sets.
+    """
+    computed_ids = set()
+    for id_set in id_sets:
+        computed_ids |= id_set
+    return computed_ids
+
+
+class FieldRange(object):
+    """
+    The interval of values matched by one or more range predicates on the
+    same field, like `x > a & x <= b`. None bounds are unbounded, and None
+    values are never in range.
+    """
+
+    def __init__(self, name: Text):
+        self.name = name
+        self.lower = None
+        self.upper = None
+        self.include_lower = True
+        self.include_upper = True
+
+    def __repr__(self):
+        lower = '[' if self.include_lower else '('
+        upper = ']' if self.include_upper else ')'
+        return (
+            f'FieldRange({self.name} in '
+            f'{lower}{self.lower}, {self.upper}{upper})'
+        )
+
+    @classmethod
+    def from_predicate(cls, name: Text, op, value) -> 'FieldRange':
+        return cls(name).intersect(op, value)
+
+    @property
+    def is_bounded(self) -> bool:
+        return self.lower is not None and self.upper is not None
+
+    def intersect(self, op, value) -> 'FieldRange':
+        """
+        Narrow the range to the values that also satisfy the given range
+        predicate.
+        """
+        if op in (OP_CODE.GT, OP_CODE.GEQ):
+            include = (op == OP_CODE.GEQ)
+            if self.lower is None or value > self.lower:
+                self.lower = value
+                self.include_lower = include
+            elif value == self.lower:
+                self.include_lower = self.include_lower and include
+        elif op in (OP_CODE.LT, OP_CODE.LEQ):
+            include = (op == OP_CODE.LEQ)
+            if self.upper is None or value < self.upper:
+                self.upper = value
+                self.include_upper = include
+            elif value == self.upper:
+                self.include_upper = self.include_upper and include
+        else:
+            # XXX: raise StoreError
+            raise Exception(f'unrecognized range op: {op}')
+        return self
+
+    def contains(self, value) -> bool:
+        if value is None:
+            return False
+        try:
+            if self.lower is not None:
+                if value < self.lower:
+                    return False
+                if value == self.lower and not self.include_lower:
+                    return False
+            if self.upper is not None:
+                if value > self.upper:
+                    return False
+                if value == self.upper and not self.include_upper:
+                    return False
+        except TypeError:
+            return False
+        return True
+
+
+class FieldIndex(object):
+    """
+    A BTree index from the values of a field to the set of _ids of the records
+    with each value, used by SimulationStore.
+
+    The index keeps track of its size, i.e. the number of indexed _ids, and
+    cardinality, i.e. the number of distinct values, from which it estimates
+    how many records match a predicate without evaluating it. It also keeps
+    the _ids of records without the field, which don't match any predicate.
+    """
+
+    index_type = INDEX_TYPE.BTREE
+    ordered = True
+
+    def __init__(self, name: Text):
+        self.name = name
+        self.tree = self.build_tree()
+        self.size = 0
+        self.cardinality = 0
+        self.unset_ids = set()
+
+    def __repr__(self):
+        return (
+            f'FieldIndex(name={self.name}, size={self.size}, '
+            f'cardinality={self.cardinality})'
+        )
+
+    def __contains__(self, value):
+        return value in self.tree
+
+    def __getstate__(self):
+        # BTrees pickle their buckets recursively, which overflows the stack
+        # for large indexes, so we pickle a flat list of items instead.
+        state = self.__dict__.copy()
+        state['tree'] = list(self.tree.items())
+        return state
+
+    def __setstate__(self, state):
+        tree = self.build_tree()
+        tree.update(state.pop('tree'))
+        self.__dict__.update(state)
+        self.tree = tree
+
+    def build_tree(self):
+        return BTree()
+
+    def supports(self, op) -> bool:
+        """
+        Can the index evaluate predicates with the given op?
+        """
+        return op not in CONTAINS_OP_CODES
+
+    def insert(self, value, _id):
+        bucket = self.tree.get(value)
+        if bucket is None:
+            bucket = self.tree[value] = set()
+            self.cardinality += 1
+        if _id not in bucket:
+            bucket.add(_id)
+            self.size += 1
+
+    def insert_many(self, records: Dict[object, Dict]):
+        """
+        Index records in bulk, grouping their _ids by value so that each value
+        is looked up only once, and building the tree in one pass when empty.
+        """
+        groups = defaultdict(set)
+        try:
+            for _id, value in self.iter_values(records):
+                groups[value].add(_id)
+        except TypeError:
+            # some values are unhashable, so they can't be grouped. we insert
+            # them into buckets with FieldIndex.insert, as subclasses may
+            # override insert to take other than the values iter_values yields
+            for _id, value in self.iter_values(records):
+                FieldIndex.insert(self, value, _id)
+            return
+
+        tree = self.tree
+        if not tree:
+            tree.update(groups)
+            self.cardinality = len(groups)
+            self.size = sum(len(ids) for ids in groups.values())
+            return
+
+        for value, ids in groups.items():
+            bucket = tree.get(value)
+            if bucket is None:
+                tree[value] = ids
+                self.cardinality += 1
+                self.size += len(ids)
+            else:
+                size = len(bucket)
+                bucket |= ids
+                self.size += len(bucket) - size
+
+    def iter_values(self, records: Dict[object, Dict]):
+        """
+        Yield the _id and indexed value of each record, adding those without
+        the field to the unset _ids.
+        """
+        k = self.name
+        unset_ids = self.unset_ids
+        for _id, record in records.items():
+            if k in record:
+                yield _id, record[k]
+            else:
+                unset_ids.add(_id)
+
+    def remove(self, value, _id):
+        bucket = self.tree.get(value)
+        if bucket is not None and _id in bucket:
+            bucket.remove(_id)
+            self.size -= 1
+            if not bucket:
+                del self.tree[value]
+                self.cardinality -= 1
+
+    def get(self, value) -> Set:
+        """
+        Return a copy of the set of _ids with the given value.
+        """
+        bucket = self.get_bucket(value)
+        return set(bucket) if bucket else set()
+
+    def get_bucket(self, value) -> Set:
+        """
+        Return the set of _ids with the given value, held by the index, or
+        None if there are none.
+        """
+        try:
+            return self.tree.get(value)
+        except TypeError:
+            # the value isn't comparable with the indexed values
+            return None
+
+    def count(self, value) -> int:
+        bucket = self.get_bucket(value)
+        return len(bucket) if bucket else 0
+
+    def walk(self, ids: Set, desc=False, limit: int = None) -> List:
+        """
+        Return the given _ids in the order of their values, visiting the
+        BTree in order and stopping once `limit` _ids have been found. _ids
+        whose value is None, or unset, come first in ascending order.
+        """
+        ordered_ids = []
+        unset_ids = [_id for _id in self.unset_ids if _id in ids]
+        if not desc:
+            ordered_ids.extend(unset_ids)
+
+        items = reversed(self.tree.items()) if desc else self.tree.items()
+        for value, bucket in items:
+            if limit is not None and len(ordered_ids) >= limit:
+                break
+            ordered_ids.extend(_id for _id in bucket if _id in ids)
+
+        if desc:
+            ordered_ids.extend(unset_ids)
+
+        return ordered_ids if limit is None else ordered_ids[:limit]
+
+    def clear(self):
+        self.tree.clear()
+        self.size = 0
+        self.cardinality = 0
+        self.unset_ids.clear()
+
+    def to_dict(self):
+        return {
+            'type': self.index_type,
+            'size': self.size,
+            'cardinality': self.cardinality,
+        }
+
+    def estimate(self, op, value) -> int:
+        """
+        Return the estimated number of _ids matching a predicate on this
+        index. Equality and containment are counted exactly from the size of
+        their buckets.
+        """
+        if op == OP_CODE.EQ:
+            return self.count(value)
+        if op == OP_CODE.NEQ:
+            return self.size - self.count(value)
+        if op == OP_CODE.INCLUDING:
+            return sum(self.count(v) for v in set(value))
+        if op == OP_CODE.EXCLUDING:
+            return self.size - sum(self.count(v) for v in set(value))
+        return int(self.size * RANGE_SELECTIVITY)
+
+    def estimate_range(self, bounds: FieldRange) -> int:
+        if bounds.is_bounded:
+            return int(self.size * BOUNDED_RANGE_SELECTIVITY)
+        return int(self.size * RANGE_SELECTIVITY)
+
+    def scan(self, bounds: FieldRange) -> Set:
+        """
+        Return the set of _ids with values in the given range, visiting only
+        the BTree buckets within its bounds.
+        """
+        kwargs = {}
+        if bounds.lower is not None:
+            kwargs['min'] = bounds.lower
+            kwargs['excludemin'] = not bounds.include_lower
+        if bounds.upper is not None:
+            kwargs['max'] = bounds.upper
+            kwargs['excludemax'] = not bounds.include_upper
+
+        try:
+            items = self.tree.items(**kwargs)
+        except TypeError:
+            # the bounds aren't comparable with the indexed values
+            return set()
+
+        # None sorts before all other keys but is never in range
+        return union(id_set for k, id_set in items if k is not None)
+
+    def exclude(self, ids, values) -> Set:
+        """
+        Return a new set of the given _ids, less those of records with any of
+        the given values or without the field. This evaluates NEQ and
+        EXCLUDING in time proportional to the number of _ids and excluded
+        values, however many distinct values the index holds.
+        """
+        computed_ids = ids - self.unset_ids
+        for value in values:
+            bucket = self.get_bucket(value)
+            if bucket:
+                computed_ids = computed_ids - bucket
+        return computed_ids
+
+    def search(self, op, value) -> Set:
+        """
+        Return the set of _ids matching an EQ, INCLUDING or range predicate
+        on this index. NEQ and EXCLUDING are evaluated by `exclude`.
+        """
+        if op == OP_CODE.EQ:
+            return self.get(value)
+
+        if op == OP_CODE.INCLUDING:
+            # containment - we compute the union of all sets of ids whose
+            # corresponding records have the given values in the index
+            value = value if isinstance(value, set) else set(value)
+            buckets = (self.get_bucket(v) for v in value)
+            return union(bucket for bucket in buckets if bucket)
+
+        if op in RANGE_OP_CODES:
+            return self.scan(FieldRange.from_predicate(self.name, op, value))
+
+        # XXX: raise StoreError
+        raise Exception('unrecognized op')
+
+
+class HashIndex(FieldIndex):
+    """
+    A FieldIndex that hashes values into a dict instead of ordering them in a
+    BTree, for fields that are only ever matched by equality or containment.
+    It's cheaper to update and search, but it can neither scan ranges of
+    values nor order _ids.
+    """
+
+    index_type = INDEX_TYPE.HASH
+    ordered = False
+
+    def build_tree(self):
+        return {}
+
+    def supports(self, op) -> bool:
+        return op not in RANGE_OP_CODES and op not in CONTAINS_OP_CODES
+
+    def walk(self, ids: Set, desc=False, limit: int = None) -> List:
+        # XXX: raise StoreError
+        raise Exception(f'hash index {self.name} is unordered')
+
+    def scan(self, bounds: FieldRange) -> Set:
+        # XXX: raise StoreError
+        raise Exception(f'hash index {self.name} is unordered')
+
+
+class InvertedIndex(HashIndex):
+    """
+    A HashIndex from each element of the values of a List or Set field to the
+    set of _ids of the records containing it, which evaluates CONTAINS and
+    CONTAINS_ANY predicates. Records whose value is None are unset, and its
+    size is the number of indexed elements, counting each record's once.
+    """
+
+    index_type = INDEX_TYPE.INVERTED
+
+    def __init__(self, name: Text):
+        super().__init__(name)
+        self.indexed_ids = set()
+
+    def supports(self, op) -> bool:
+        return op in CONTAINS_OP_CODES
+
+    def insert(self, value, _id):
+        if value is None:
+            self.unset_ids.add(_id)
+            return
+        self.indexed_ids.add(_id)
+        for element in value:
+            super().insert(element, _id)
+
+    def remove(self, value, _id):
+        if value is None:
+            self.unset_ids.discard(_id)
+            return
+        self.indexed_ids.discard(_id)
+        for element in value:
+            super().remove(element, _id)
+
+    def iter_values(self, records: Dict[object, Dict]):
+        for _id, value in super().iter_values(records):
+            if value is None:
+                self.unset_ids.add(_id)
+            else:
+                self.indexed_ids.add(_id)
+                for element in value:
+                    yield _id, element
+
+    def clear(self):
+        super().clear()
+        self.indexed_ids.clear()
+
+    def estimate(self, op, value) -> int:
+        counts = [self.count(v) for v in value]
+        if op == OP_CODE.CONTAINS:
+            return min(counts, default=len(self.indexed_ids))
+        return min(sum(counts), len(self.indexed_ids))
+
+    def search(self, op, value) -> Set:
+        """
+        Return the set of _ids of records containing all, for CONTAINS, or
+        any, for CONTAINS_ANY, of the given values.
+        """
+        buckets = [self.get_bucket(v) for v in value]
+        if op == OP_CODE.CONTAINS:
+            if not buckets:
+                return set(self.indexed_ids)
+            if not all(buckets):
+                return set()
+            # intersect from the smallest bucket up
+            buckets.sort(key=len)
+            return buckets[0].intersection(*buckets[1:])
+        if op == OP_CODE.CONTAINS_ANY:
+            return union(bucket for bucket in buckets if bucket)
+
+        # XXX: raise StoreError
+        raise Exception('unrecognized op')
+
+
+class CompositeIndex(FieldIndex):
+    """
+    A BTree index from the tuples of values of several fields, in order, to
+    the set of _ids of the records with each tuple. It searches records by
+    equality on all of its fields or on a prefix of them.
+
+    Values are encoded so that keys stay comparable when records have None
+    for a field or lack it altogether, which sort first, in that order.
+    """
+
+    # encoded values, of which the upper bound exceeds any other
+    UNSET = ()
+    NULL = (0, )
+    UPPER_BOUND = (2, )
+
+    def __init__(self, name: Text, names: Tuple[Text]):
+        super().__init__(name)
+        self.names = tuple(names)
+
+    def __repr__(self):
+        return (
+            f'CompositeIndex(name={self.name}, names={self.names}, '
+            f'size={self.size}, cardinality={self.cardinality})'
+        )
+
+    @classmethod
+    def encode(cls, value) -> Tuple:
+        return cls.NULL if value is None else (1, value)
+
+    def encode_record(self, record: Dict) -> Tuple:
+        return tuple([
+            self.UNSET if k not in record else
+            self.NULL if record[k] is None else
+            (1, record[k])
+            for k in self.names
+        ])
+
+    def insert_record(self, record: Dict, _id):
+        self.insert(self.encode_record(record), _id)
+
+    def remove_record(self, record: Dict, _id):
+        self.remove(self.encode_record(record), _id)
+
+    def iter_values(self, records: Dict[object, Dict]):
+        encode_record = self.encode_record
+        for _id, record in records.items():
+            yield _id, encode_record(record)
+
+    def supports(self, op) -> bool:
+        return False
+
+    def to_dict(self):
+        return dict(super().to_dict(), fields=list(self.names))
+
+    def search_prefix(self, values: Tuple) -> Set:
+        """
+        Return the set of _ids of records whose values for the leading fields
+        of the index equal the given values.
+        """
+        prefix = tuple(self.encode(v) for v in values)
+        if len(prefix) == len(self.names):
+            return self.get(prefix)
+        try:
+            items = self.tree.items(
+                min=prefix, max=prefix + (self.UPPER_BOUND, )
+            )
+            return union(id_set for k, id_set in items)
+        except TypeError:
+            # the values aren't comparable with the indexed values
+            return set()
+
+
+class CompositeKey(object):
+    """
+    The equality predicates on the leading fields of a CompositeIndex in a
+    conjunction, evaluated together by a single search of the index.
+    """
+
+    def __init__(self, index: CompositeIndex, predicates: List):
+        self.index = index
+        self.predicates = predicates
+        self.values = tuple(p.value for p in predicates)
+
+    def __repr__(self):
+        names = self.index.names[:len(self.values)]
+        values = dict(zip(names, self.values))
+        return f'CompositeKey(index={self.index.name}, values={values})'
+
+    @property
+    def is_complete(self) -> bool:
+        return len(self.values) == len(self.index.names)
+
+    def count(self) -> int:
+        """
+        Return the number of _ids matching a complete key.
+        """
+        key = tuple(self.index.encode(v) for v in self.values)
+        return self.index.count(key)
+
+    def search(self) -> Set:
+        return self.index.search_prefix(self.values)
+
+
+class SortKey(object):
+    """
+    The sort key of a record, ordered by one or more OrderBy keys, which
+    places None values first, as they are in FieldIndex BTrees.
+    """
+
+    __slots__ = ('values', 'order_by')
+
+    def __init__(self, record: Dict, order_by: Tuple['OrderBy']):
+        self.values = tuple(record.get(x.key) for x in order_by)
+        self.order_by = order_by
+
+    def __lt__(self, other: 'SortKey') -> bool:
+        for x, a, b in zip(self.order_by, self.values, other.values):
+            if a == b:
+                continue
+            if a is None:
+                is_less = True
+            elif b is None:
+                is_less = False
+            else:
+                is_less = a < b
+            return (not is_less) if x.desc else is_less
+        return False
+
+
+def match(op, record_value, value) -> bool:
+    """
+    Return True if a record's value satisfies a predicate, with the same
+    semantics as FieldIndex.search, used to filter candidate records instead
+    of searching an index.
+    """
+    if op == OP_CODE.EQ:
+        return record_value == value
+    if op == OP_CODE.NEQ:
+        return record_value != value
+    if op == OP_CODE.INCLUDING:
+        return record_value in value
+    if op == OP_CODE.EXCLUDING:
+        return record_value not in value
+    if record_value is None:
+        return False
+
+    try:
+        if op == OP_CODE.CONTAINS:
+            return all(v in record_value for v in value)
+        if op == OP_CODE.CONTAINS_ANY:
+            return any(v in record_value for v in value)
+        if op == OP_CODE.GEQ:
+            return record_value >= value
+        if op == OP_CODE.GT:
+            return record_value > value
+        if op == OP_CODE.LT:
+            return record_value < value
+        if op == OP_CODE.LEQ:
+            return record_value <= value
+    except TypeError:
+        return False
+
+    # XXX: raise StoreError
+    raise Exception('unrecognized op')
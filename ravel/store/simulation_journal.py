@@ -0,0 +1,156 @@
+import os
+import pickle
+import tempfile
+
+from typing import Text, Dict, List, Tuple
+
+from ravel.util.misc_functions import suspend_gc
+
+# journal entry ops
+PUT = 'put'
+DELETE = 'del'
+
+
+class SimulationJournal(object):
+    """
+    Durable storage for the records and indexes of a SimulationStore. Each
+    write is appended to a journal file, and a snapshot of all records and
+    indexes is written periodically, after which the journal is truncated.
+    On load, the snapshot is read back in one pass, and only the journal
+    entries written since are replayed.
+
+    Snapshots are replaced atomically. Entries are numbered, so that those
+    already in a snapshot are skipped if the process dies before truncating
+    the journal, and a partially written entry at the end of the journal is
+    discarded.
+    """
+
+    FORMAT = 1
+
+    def __init__(self, root: Text, name: Text, fsync=False):
+        self.root = root
+        self.snapshot_path = os.path.join(root, f'{name}.snapshot')
+        self.journal_path = os.path.join(root, f'{name}.journal')
+        self.fsync = fsync
+        self.seq = 0
+        self.entry_count = 0
+        self.journal_file = None
+
+    def __repr__(self):
+        return (
+            f'SimulationJournal(path={self.journal_path}, '
+            f'seq={self.seq}, entries={self.entry_count})'
+        )
+
+    def load(self) -> Tuple[Dict, Dict, List[Tuple]]:
+        """
+        Return the records and indexes in the snapshot, if any, along with the
+        journal entries written after it, and open the journal for appending.
+        """
+        os.makedirs(self.root, exist_ok=True)
+
+        records, indexes = {}, None
+        snapshot = self._read_snapshot()
+        if snapshot is not None:
+            self.seq = snapshot['seq']
+            records = snapshot['records']
+            indexes = snapshot['indexes']
+
+        entries = self._read_journal()
+        self.entry_count = len(entries)
+        if entries:
+            self.seq = entries[-1][0]
+
+        self.journal_file = open(self.journal_path, 'ab')
+        return records, indexes, [(op, value) for seq, op, value in entries]
+
+    def append(self, op: Text, value):
+        self.append_many(op, [value])
+
+    def append_many(self, op: Text, values: List):
+        """
+        Append an entry for each value, flushing the journal once.
+        """
+        for value in values:
+            self.seq += 1
+            pickle.dump(
+                (self.seq, op, value),
+                self.journal_file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        self.journal_file.flush()
+        if self.fsync:
+            os.fsync(self.journal_file.fileno())
+        self.entry_count += len(values)
+
+    def snapshot(self, records: Dict, indexes: Dict):
+        """
+        Write a snapshot of the given records and indexes, replacing the
+        existing one atomically, and truncate the journal.
+        """
+        data = {
+            'format': self.FORMAT,
+            'seq': self.seq,
+            'records': records,
+            'indexes': indexes,
+        }
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                pickle.dump(data, temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+                temp_file.flush()
+                if self.fsync:
+                    os.fsync(temp_file.fileno())
+            os.replace(temp_path, self.snapshot_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.journal_file.seek(0)
+        self.journal_file.truncate()
+        self.entry_count = 0
+
+    def close(self):
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+
+    def _read_snapshot(self) -> Dict:
+        try:
+            with open(self.snapshot_path, 'rb') as snapshot_file:
+                with suspend_gc():
+                    data = pickle.load(snapshot_file)
+        except FileNotFoundError:
+            return None
+        if data.get('format') != self.FORMAT:
+            # XXX: raise StoreError
+            raise Exception(
+                f'unrecognized snapshot format: {self.snapshot_path}'
+            )
+        return data
+
+    def _read_journal(self) -> List[Tuple]:
+        entries = []
+        try:
+            journal_file = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return entries
+
+        with journal_file:
+            offset = 0
+            while True:
+                try:
+                    seq, op, value = pickle.load(journal_file)
+                except Exception:
+                    break
+                offset = journal_file.tell()
+                if seq > self.seq:
+                    entries.append((seq, op, value))
+
+        # anything after the last complete entry was left by a process that
+        # died while writing it, so we truncate it before appending.
+        if os.path.getsize(self.journal_path) > offset:
+            os.truncate(self.journal_path, offset)
+
+        return entries
@@ -1,22 +1,29 @@
-import bisect
 import time
-
-import numpy as np
-import BTrees.OOBTree
+import heapq
 
 from copy import deepcopy
 from collections import defaultdict, Counter
-from threading import RLock
+from itertools import islice
 from functools import reduce
 from typing import Text, Dict, List, Set, Tuple, Type
 
-from BTrees.OOBTree import BTree
-
 from appyratus.utils.dict_utils import DictUtils
 
-from ravel.schema import Schema, Field, fields
-from ravel.constants import ID, REV
-from ravel.util import union
+from ravel.schema import (
+    Schema,
+    Field,
+    fields,
+    get_index_type,
+    get_composite_indexes,
+)
+from ravel.constants import ID, REV, INDEX_TYPE
+from ravel.util.cow import CopyOnWriteDict, copy_value
+from ravel.util.misc_functions import (
+    normalize_to_tuple,
+    get_class_name,
+    suspend_gc,
+)
+from ravel.util.rwlock import ReadWriteLock
 from ravel.query.order_by import OrderBy
 from ravel.query.predicate import (
     Predicate,
@@ -26,39 +33,113 @@ from ravel.query.predicate import (
 )
 
 from .base import Store
+from .simulation_index import (
+    FieldIndex,
+    HashIndex,
+    InvertedIndex,
+    CompositeIndex,
+    CompositeKey,
+    FieldRange,
+    RANGE_OP_CODES,
+    COMPLEMENT_OP_CODES,
+    SortKey,
+    match,
+)
+from .simulation_journal import SimulationJournal, PUT, DELETE
 
 
 class SimulationStore(Store):
     """
     An in-memory Store that stores data in Python dicts with BTrees indexes.
+
+    Queries evaluate the conjuncts of each AND from the most to the least
+    selective, as estimated from the cardinality statistics of each index,
+    filtering the records that match the first conjuncts directly once they
+    are fewer than the records an index search would return. Range conjuncts
+    on the same field, like `x > a & x < b`, are fused into a single scan
+    of the BTree between their bounds. NEQ and EXCLUDING are evaluated by
+    subtracting the _ids of the excluded values from the candidates.
+
+    Each scalar field has a BTree index unless declared otherwise in its meta,
+    with `index='hash'` for a HashIndex, when the field is only matched by
+    equality, or `index=False` for none. Fields can also declare composite
+    indexes, as in `status = String(composite_index=['age'])`, which evaluate
+    equality conjuncts on their leading fields, like `status == x & age == y`,
+    in a single search. List and Set fields of scalars have an InvertedIndex
+    from each of their elements to the records containing it, which evaluates
+    CONTAINS and CONTAINS_ANY predicates, like `Thing.colors.contains(x)`.
+
+    Reads hold a ReadWriteLock as readers, so that they run concurrently
+    with each other and block only while a write is in progress.
+
+    Stored records are never modified in place. Writes replace them with new
+    dicts, which lets reads return CopyOnWriteDicts that share their values
+    with the stored records instead of deep copies.
+
+    When bound with a `journal_root` directory, records and indexes persist
+    across restarts in a SimulationJournal, which appends each write to a
+    journal and takes a snapshot every `snapshot_interval` writes.
     """
 
     def __init__(self):
         super().__init__()
+        self.journal = None
+        self.snapshot_interval = None
         self.reset()
 
-    def on_bind(self, resource_type: Type['Resource'], **kwargs):
-        for k, field in resource_type.ravel.schema.fields.items():
+    def on_bind(
+        self,
+        resource_type: Type['Resource'],
+        journal_root: Text = None,
+        journal_fsync: bool = False,
+        snapshot_interval: int = 10000,
+        **kwargs
+    ):
+        schema = resource_type.ravel.schema
+        for k, field in schema.fields.items():
             if field.scalar and (type(field) is not Field):
-                self.indexes[k] = BTree()
+                index_type = get_index_type(field)
+                if index_type == INDEX_TYPE.BTREE:
+                    self.indexes[k] = FieldIndex(k)
+                elif index_type == INDEX_TYPE.HASH:
+                    self.indexes[k] = HashIndex(k)
+            elif (
+                isinstance(field, (fields.List, fields.Set)) and
+                field.nested.scalar and
+                get_index_type(field, INDEX_TYPE.INVERTED) is not None
+            ):
+                self.indexes[k] = InvertedIndex(k)
+
+        for name, names in get_composite_indexes(schema).items():
+            self.composite_indexes[name] = CompositeIndex(name, names)
+
+        if journal_root:
+            self.journal = SimulationJournal(
+                journal_root,
+                get_class_name(resource_type),
+                fsync=journal_fsync,
+            )
+            self.snapshot_interval = snapshot_interval
+            self._load_journal()
 
     def reset(self):
         """
         Reset all internal data structures.
         """
-        self.lock = RLock()
+        self.lock = ReadWriteLock()
         self.indexes = {}
+        self.composite_indexes = {}
         self.records = {}
 
     def exists(self, _id) -> bool:
         """
         Does the _id exist in the store?
         """
-        with self.lock:
+        with self.lock.read:
             return _id in self.records
 
     def exists_many(self, _ids: List) -> Dict[object, bool]:
-        with self.lock:
+        with self.lock.read:
             return {
                 _id: (_id in self.records)
                 for _id in _ids
@@ -68,7 +149,7 @@ class SimulationStore(Store):
         """
         Return the total number of objects in the store.
         """
-        with self.lock:
+        with self.lock.read:
             return len(self.records)
 
     def fetch(self, _id, fields: Set[Text] = None) -> Dict:
@@ -81,33 +162,34 @@ class SimulationStore(Store):
         """
         Return multiple records in a _id-keyed dict.
         """
-        if not fields:
-            fields = set(self.resource_type.ravel.schema.fields)
-        elif not isinstance(fields, set):
+        if fields and not isinstance(fields, set):
             fields = set(fields)
+        if fields and fields >= self.resource_type.ravel.schema.fields.keys():
+            # no need to filter out unselected keys
+            fields = None
 
-        with self.lock:
+        with self.lock.read:
             records = {}
 
             for _id in _ids:
-                # return a *copy* so as not to mutate dict in store
-                record = deepcopy(self.records.get(_id))
+                # return a copy-on-write view of the stored record so as not
+                # to pay for a deep copy nor let callers mutate the store.
+                record = self.records.get(_id)
+                if record is not None:
+                    record = CopyOnWriteDict(record, fields)
                 records[_id] = record
 
-                # remove keys not specified in "fields" argument
-                if fields and (record is not None):
-                    record_keys = set(record.keys())
-                    for k in record_keys - fields:
-                        del record[k]
-
             return records
 
     def fetch_all(self, fields=None) -> Dict:
         """
         Return all records in a _id-keyed dict.
         """
-        with self.lock:
-            return deepcopy(self.records)
+        with self.lock.read:
+            return {
+                _id: CopyOnWriteDict(record)
+                for _id, record in self.records.items()
+            }
 
     def create(self, record: Dict = None) -> Dict:
         """
@@ -115,93 +197,135 @@ class SimulationStore(Store):
         """
         schema = self.resource_type.ravel.schema
 
-        with self.lock:
+        with self.lock.write:
             record[ID] = self.create_id(record)
             record[REV] = self.increment_rev()
 
             _id = record[ID]
 
-            # insert the record and update indexes for its fields
+            # insert a private copy of the record, so that the caller can't
+            # mutate it through the dict it passed in, and update indexes.
+            record = copy_value(record)
             self.records[_id] = record
             self._index_upsert(_id, record)
+            self._journal(PUT, record)
 
-        return deepcopy(record)
+        return CopyOnWriteDict(record)
 
     def create_many(self, records: List[Dict] = None) -> List[Dict]:
         """
         Insert multiple records into the store, indexing their indexable
-        fields.
+        fields. Unlike looping over `create`, this indexes the records in
+        bulk, grouping their _ids by value, once per index.
         """
-        results = []
-        with self.lock:
+        created_records = {}
+        with self.lock.write, suspend_gc():
+            # new records all start at the same revision
+            rev = self.increment_rev()
             for record in records:
                 record[ID] = self.create_id(record)
-                result = self.create(record)
-                results.append(result)
-        return results
+                record[REV] = rev
+                created_records[record[ID]] = copy_value(record)
 
-    def update(self, _id=None, data: Dict = None) -> Dict:
-        """
-        Submit changes to an object in the store.
-        """
-        with self.lock:
-            old_record = self.records.get(_id, {})
-            old_rev = old_record.get(REV)
-
-            # remove the old copy of the object from the store, and then replace
-            # it. we use `internal` in the call to delete to indicate that we
-            # are only deleting for the purpose of re-inserting during this
-            # update. this prevents the _rev index from being cleared.
-            if old_record:
-                self.delete(
-                    old_record[ID],
-                    index_names=set(data.keys()),
-                    internal=True,
-                )
+            # records are replaced if their _ids already exist
+            for _id in created_records.keys() & self.records.keys():
+                self._index_remove(_id, self.records[_id])
 
-            merged_record = DictUtils.merge(old_record, data)
-            merged_record[REV] = self.increment_rev(old_rev)
+            self.records.update(created_records)
+            self._index_upsert_many(created_records)
+            self._journal_many(PUT, list(created_records.values()))
 
-            # "re-insert" the new copy of the record
-            record = self.create(merged_record)
-            return record
+            return [
+                CopyOnWriteDict(created_records[record[ID]])
+                for record in records
+            ]
+
+    def update(self, _id=None, data: Dict = None) -> Dict:
+        """
+        Submit changes to an object in the store. Only the indexes of fields
+        whose values change are updated.
+        """
+        with self.lock.write:
+            record = self._apply_update(_id, data)
+            self._journal(PUT, record)
+            return CopyOnWriteDict(record)
 
     def update_many(self, _ids: Set, data: Dict = None) -> Dict:
         """
-        Submit changes to multiple objects in the store.
+        Submit changes to multiple objects in the store, in a single pass
+        under the write lock.
         """
-        with self.lock:
-            return {
-                _id: self.update(_id=_id, data=x)
+        with self.lock.write:
+            records = {
+                _id: self._apply_update(_id, x)
                 for _id, x in zip(_ids, data)
             }
+            self._journal_many(PUT, list(records.values()))
+            return {
+                _id: CopyOnWriteDict(record)
+                for _id, record in records.items()
+            }
 
-    def delete(self, _id, index_names: Set[Text] = None, internal=False):
+    def _apply_update(self, _id, data: Dict) -> Dict:
+        """
+        Replace a record with a new one, with the given changes merged into
+        it, and update the indexes of the changed fields. A record is created
+        if none exists with the _id.
+        """
+        old_record = self.records.get(_id)
+        if old_record is None:
+            record = copy_value(data)
+            record[ID] = _id
+            record[REV] = self.increment_rev()
+            self.records[_id] = record
+            self._index_upsert(_id, record)
+            return record
+
+        # copy only the values being changed, sharing the rest with the old
+        # record, which is never modified in place.
+        record = dict(old_record)
+        for k, v in data.items():
+            old_value = old_record.get(k)
+            if isinstance(v, dict) and isinstance(old_value, dict):
+                v = DictUtils.merge(copy_value(old_value), v)
+            record[k] = copy_value(v)
+        record[REV] = self.increment_rev(old_record.get(REV))
+
+        changed_names = {
+            k for k in data
+            if k not in old_record or old_record[k] != record[k]
+        }
+        changed_names.add(REV)
+
+        self._index_remove(_id, old_record, changed_names)
+        self.records[_id] = record
+        self._index_upsert(_id, record, changed_names)
+        return record
+
+    def delete(self, _id):
         """
         Delete one record along with its field indexes.
         """
-        with self.lock:
+        with self.lock.write:
             record = self.records.get(_id)
             if record:
-                index_names = set(index_names or record.keys())
-                if internal:
-                    index_names.discard(REV)
-                self._index_remove(_id, record, index_names)
+                self._index_remove(_id, record)
                 del self.records[_id]
+                self._journal(DELETE, _id)
 
-    def delete_many(self, _ids: List, internal=False):
+    def delete_many(self, _ids: List):
         """
         Delete multiple records along with their field indexes.
         """
-        with self.lock:
+        with self.lock.write:
             for _id in _ids:
-                self.delete(_id, internal=internal)
+                self.delete(_id)
 
     def delete_all(self):
         """
         Delete all records along with their field indexes.
         """
-        self.delete_many(self.records.keys())
+        self.delete_many(list(self.records.keys()))
 
     def query(
         self,
@@ -213,127 +337,394 @@ class SimulationStore(Store):
         **kwargs
     ) -> List:
         """
+        Return the records that satisfy the predicate. Only the records in
+        the requested page are fetched. When ordering, with a limit, only the
+        first `offset + limit` _ids are ordered, either by walking the index
+        of the order_by field or by a partial heap sort.
         """
-        with self.lock:
+        offset = offset or 0
+
+        with self.lock.read:
             # compute set of ID's of records whose fields satisfy
             # the given "where" predicate of the query
             computed_ids = self._eval_predicate(predicate)
-            records = list(self.fetch_many(computed_ids, fields).values())
 
-            # order the records
+            # order and paginate _ids before fetching records
             if order_by:
-                records = OrderBy.sort(records, order_by)
+                order_by = normalize_to_tuple(order_by)
+                end = None if limit is None else offset + limit
+                page_ids = self._sort_ids(computed_ids, order_by, end)
+                page_ids = page_ids[offset:]
+            else:
+                end = None if limit is None else offset + limit
+                page_ids = list(islice(computed_ids, offset, end))
 
-            # paginate after ordering
-            if offset is not None:
-                if limit is not None:
-                    records = records[offset:offset+limit]
-                else:
-                    records = records[offset:]
-            elif limit is not None:
-                records = records[:limit]
+            return list(self.fetch_many(page_ids, fields).values())
 
-            return records
+    def _sort_ids(
+        self, ids: Set, order_by: Tuple[OrderBy], limit: int = None
+    ) -> List:
+        """
+        Return the first `limit` _ids, or all, ordered by the given keys.
+        """
+        if limit is not None and len(order_by) == 1:
+            # walking the index in order visits about limit * size / len(ids)
+            # _ids before finding the first `limit`, which beats a heap sort
+            # of all _ids unless they're a small fraction of the index.
+            index = self.indexes.get(order_by[0].key)
+            if (
+                index is not None and index.ordered and
+                limit * index.size < len(ids) ** 2
+            ):
+                return index.walk(ids, desc=order_by[0].desc, limit=limit)
+
+        records = self.records
+        get_key = lambda _id: SortKey(records[_id], order_by)
+        if limit is not None:
+            return heapq.nsmallest(limit, ids, key=get_key)
+        return sorted(ids, key=get_key)
+
+    def get_index_stats(self) -> Dict[Text, Dict]:
+        """
+        Return the type, size and cardinality of each index, by field name,
+        or by name for composite indexes.
+        """
+        with self.lock.read:
+            return {
+                k: index.to_dict() for k, index in
+                dict(self.indexes, **self.composite_indexes).items()
+            }
 
-    def _index_upsert(self, _id, record):
-        for k, v in record.items():
-            index = self.indexes.get(k)
-            if index is not None:
-                if v not in index:
-                    index[v] = set()
-                index[v].add(_id)
+    def snapshot(self):
+        """
+        Write a snapshot of all records and indexes to the journal, if any,
+        after which only subsequent writes need to be replayed on load.
+        """
+        if self.journal is not None:
+            with self.lock.write:
+                self.journal.snapshot(self.records, {
+                    'fields': self.indexes,
+                    'composite': self.composite_indexes,
+                })
+
+    def _journal(self, op, value):
+        self._journal_many(op, [value])
+
+    def _journal_many(self, op, values: List):
+        if self.journal is not None:
+            self.journal.append_many(op, values)
+            if (
+                self.snapshot_interval and
+                self.journal.entry_count >= self.snapshot_interval
+            ):
+                self.snapshot()
+
+    def _load_journal(self):
+        """
+        Load records and indexes from the latest snapshot and replay the
+        writes journaled after it. Indexes are rebuilt from the records if the
+        snapshot's indexes don't match those declared by the bound resource
+        type.
+        """
+        with self.lock.write:
+            records, indexes, entries = self.journal.load()
+            self.records = records
+            if indexes is not None and (
+                self._describe_indexes(indexes['fields']) ==
+                self._describe_indexes(self.indexes) and
+                self._describe_indexes(indexes['composite']) ==
+                self._describe_indexes(self.composite_indexes)
+            ):
+                self.indexes = indexes['fields']
+                self.composite_indexes = indexes['composite']
+            else:
+                for _id, record in records.items():
+                    self._index_upsert(_id, record)
+
+            for op, value in entries:
+                if op == PUT:
+                    _id = value[ID]
+                    old_record = self.records.get(_id)
+                    if old_record is not None:
+                        self._index_remove(_id, old_record)
+                    self.records[_id] = value
+                    self._index_upsert(_id, value)
+                elif op == DELETE:
+                    old_record = self.records.pop(value, None)
+                    if old_record is not None:
+                        self._index_remove(value, old_record)
+
+    @staticmethod
+    def _describe_indexes(indexes: Dict) -> Dict:
+        return {
+            k: (type(index), getattr(index, 'names', None))
+            for k, index in indexes.items()
+        }
+
+    def _index_upsert(self, _id, record, index_names=None):
+        """
+        Add a record to the indexes of the given fields, and to the composite
+        indexes including any of them, or to all indexes.
+        """
+        indexes, composite_indexes = self._select_indexes(index_names)
+        for k, index in indexes:
+            if k in record:
+                index.insert(record[k], _id)
+            else:
+                index.unset_ids.add(_id)
+        for index in composite_indexes:
+            index.insert_record(record, _id)
+
+    def _index_upsert_many(self, records: Dict):
+        """
+        Index new records in bulk, by index rather than by record.
+        """
+        for index in self.indexes.values():
+            index.insert_many(records)
+        for index in self.composite_indexes.values():
+            index.insert_many(records)
 
     def _index_remove(self, _id, record, index_names=None):
-        index_names = set(index_names or record.keys())
-        for k in index_names:
-            index = self.indexes.get(k)
-            if index is not None and k in record:
-                if k in record:
-                    v = record[k]
-                    if v in index:
-                        index[v].remove(_id)
-
-    def _eval_predicate(self, predicate):
+        """
+        Remove a record from the indexes of the given fields, and from the
+        composite indexes including any of them, or from all indexes.
+        """
+        indexes, composite_indexes = self._select_indexes(index_names)
+        for k, index in indexes:
+            if k in record:
+                index.remove(record[k], _id)
+            else:
+                index.unset_ids.discard(_id)
+        for index in composite_indexes:
+            index.remove_record(record, _id)
+
+    def _select_indexes(self, index_names: Set[Text] = None) -> Tuple:
+        """
+        Return the (name, index) pairs of the indexes of the given fields, and
+        the composite indexes including any of them, or all indexes.
+        """
+        if index_names is None:
+            return (
+                self.indexes.items(),
+                self.composite_indexes.values(),
+            )
+        index_names = set(index_names)
+        return (
+            [
+                (k, self.indexes[k]) for k in index_names
+                if k in self.indexes
+            ],
+            [
+                index for index in self.composite_indexes.values()
+                if index_names.intersection(index.names)
+            ],
+        )
+
+    def _eval_predicate(self, predicate, candidates: Set = None) -> Set:
+        """
+        Return the set of _ids of the records that satisfy the predicate,
+        restricted to the given candidate _ids, if any.
+        """
         if predicate is None:
-            return self.records.keys()
+            return set(self.records) if candidates is None else candidates
+
+        if isinstance(predicate, FieldRange):
+            index = self.indexes[predicate.name]
+            if candidates is not None:
+                if len(candidates) <= index.estimate_range(predicate):
+                    return self._filter(candidates, predicate)
+                return index.scan(predicate) & candidates
+            return index.scan(predicate)
+
+        if isinstance(predicate, CompositeKey):
+            if candidates is not None:
+                if len(candidates) <= self._estimate(predicate):
+                    return self._filter(candidates, predicate)
+                return predicate.search() & candidates
+            return predicate.search()
 
         op = predicate.op
-        empty = set()
-        computed_ids = set()
 
         if isinstance(predicate, ConditionalPredicate):
-            k = predicate.field.source
-            v = predicate.value
-            index = self.indexes[k]
-
-            if op == OP_CODE.EQ:
-                computed_ids = index.get(v, empty)
-            elif op == OP_CODE.NEQ:
-                computed_ids = union([
-                    id_set for v_idx, id_set in index.items()
-                    if v_idx != v
-                ])
-            elif op == OP_CODE.INCLUDING:
-                # containment - we compute the union of all sets of ids whose
-                # corresponding records have the given values in the index
-                v = v if isinstance(v, set) else set(v)
-                computed_ids = union([index.get(k_idx, empty) for k_idx in v])
-
-            elif op == OP_CODE.EXCLUDING:
-                # the inverse of containment...
-                v = v if isinstance(v, set) else set(v)
-                computed_ids = union([
-                    id_set for v_idx, id_set in index.items()
-                    if v_idx not in v
-                ])
-            else:
-                # handle inequalities, computing limit and offset to form an
-                # interval with which we index the actual BTree
-
-                keys = np.array(index.keys(), dtype=object)
+            index = self.indexes.get(predicate.field.source)
+            if index is None or not index.supports(op):
+                # unindexed fields are evaluated by scanning records
+                return self._filter(candidates, predicate)
+            if op in COMPLEMENT_OP_CODES:
+                # subtract the excluded values' _ids from the candidates, or
+                # from all _ids, rather than unioning all other values' _ids
+                values = predicate.value
+                if op == OP_CODE.NEQ:
+                    values = (values, )
+                if candidates is None:
+                    candidates = self.records.keys()
+                return index.exclude(candidates, values)
+            if candidates is not None:
+                if len(candidates) <= self._estimate(predicate):
+                    return self._filter(candidates, predicate)
+                return index.search(op, predicate.value) & candidates
+            return index.search(op, predicate.value)
 
-                if op == OP_CODE.GEQ:
-                    offset = bisect.bisect_left(keys, v)
-                    interval = slice(offset, None, 1)
-
-                elif op == OP_CODE.GT:
-                    offset = bisect.bisect(keys, v)
-                    interval = slice(offset, None, 1)
-
-                elif op == OP_CODE.LT:
-                    offset = bisect.bisect_left(keys, v)
-                    interval = slice(0, offset, 1)
+        elif isinstance(predicate, BooleanPredicate):
+            if op == OP_CODE.AND:
+                return self._eval_conjunction(
+                    self._flatten(predicate, op), candidates
+                )
+            elif op == OP_CODE.OR:
+                computed_ids = set()
+                for disjunct in self._flatten(predicate, op):
+                    computed_ids |= self._eval_predicate(disjunct, candidates)
+                return computed_ids
 
-                elif op == OP_CODE.LEQ:
-                    offset = bisect.bisect(keys, v)
-                    interval = slice(0, offset, 1)
-                else:
-                    # XXX: raise StoreError
-                    raise Exception('unrecognized op')
+        # XXX: raise StoreError
+        raise Exception(f'unrecognized predicate operator: {op}')
 
-                computed_ids = union([
-                    index[k] for k in keys[interval] if k is not None
-                ])
+    def _eval_conjunction(
+        self, conjuncts: List[Predicate], candidates: Set = None
+    ) -> Set:
+        """
+        Evaluate conjuncts from the most to the least selective, narrowing the
+        set of candidate _ids as we go and stopping as soon as it's empty.
+        """
+        conjuncts = self._fuse_composite_keys(self._fuse_ranges(conjuncts))
+        for conjunct in sorted(conjuncts, key=self._estimate):
+            candidates = self._eval_predicate(conjunct, candidates)
+            if not candidates:
+                return set()
+        return candidates
+
+    def _fuse_ranges(self, conjuncts: List[Predicate]) -> List:
+        """
+        Replace the range predicates on each indexed field with a FieldRange
+        spanning the intersection of their intervals.
+        """
+        fused = []
+        ranges = {}
+        for p in conjuncts:
+            if (
+                isinstance(p, ConditionalPredicate) and
+                p.op in RANGE_OP_CODES and
+                p.field.source in self.indexes and
+                self.indexes[p.field.source].ordered
+            ):
+                k = p.field.source
+                if k not in ranges:
+                    ranges[k] = FieldRange(k)
+                ranges[k].intersect(p.op, p.value)
+            else:
+                fused.append(p)
 
-        elif isinstance(predicate, BooleanPredicate):
-        # recursively compute and union child predicates,
-        # left-hand side (lhs) and right-hand side (rhs)
-            lhs = predicate.lhs
-            rhs = predicate.rhs
+        fused.extend(ranges.values())
+        return fused
 
-            if op == OP_CODE.AND:
-                lhs_result = self._eval_predicate(lhs)
-                if lhs_result:
-                    rhs_result = self._eval_predicate(rhs)
-                    computed_ids = set.intersection(lhs_result, rhs_result)
+    def _fuse_composite_keys(self, conjuncts: List[Predicate]) -> List:
+        """
+        Replace the equality predicates on the leading fields of each
+        composite index with a CompositeKey, when there are several of them
+        or the first field has no index of its own, starting with the indexes
+        on the most fields.
+        """
+        if not self.composite_indexes:
+            return conjuncts
+
+        equalities = {}
+        for p in conjuncts:
+            if isinstance(p, ConditionalPredicate) and p.op == OP_CODE.EQ:
+                equalities.setdefault(p.field.source, p)
+
+        fused = []
+        fused_ids = set()
+        indexes = sorted(
+            self.composite_indexes.values(), key=lambda x: -len(x.names)
+        )
+        for index in indexes:
+            prefix = []
+            for k in index.names:
+                p = equalities.get(k)
+                if p is None or id(p) in fused_ids:
+                    break
+                prefix.append(p)
+            is_useful = len(prefix) > 1 or (
+                prefix and index.names[0] not in self.indexes
+            )
+            if is_useful:
+                fused.append(CompositeKey(index, prefix))
+                fused_ids.update(id(p) for p in prefix)
+
+        fused.extend(p for p in conjuncts if id(p) not in fused_ids)
+        return fused
+
+    def _estimate(self, predicate) -> int:
+        """
+        Return the estimated number of records satisfying the predicate.
+        """
+        if isinstance(predicate, FieldRange):
+            return self.indexes[predicate.name].estimate_range(predicate)
 
-            elif op == OP_CODE.OR:
-                lhs_result = self._eval_predicate(lhs)
-                rhs_result = self._eval_predicate(rhs)
-                computed_ids = set.union(lhs_result, rhs_result)
+        if isinstance(predicate, CompositeKey):
+            if predicate.is_complete:
+                return predicate.count()
+            return min(self._estimate(p) for p in predicate.predicates)
 
+        if isinstance(predicate, ConditionalPredicate):
+            index = self.indexes.get(predicate.field.source)
+            if index is None or not index.supports(predicate.op):
+                return len(self.records)
+            return index.estimate(predicate.op, predicate.value)
+
+        if isinstance(predicate, BooleanPredicate):
+            operands = self._flatten(predicate, predicate.op)
+            estimates = [self._estimate(x) for x in operands]
+            if predicate.op == OP_CODE.AND:
+                return min(estimates)
+            return min(sum(estimates), len(self.records))
+
+        return len(self.records)
+
+    @staticmethod
+    def _flatten(predicate, op) -> List[Predicate]:
+        """
+        Return the operands of a chain of BooleanPredicates with the same op,
+        as in `a & b & c`.
+        """
+        operands = []
+        stack = [predicate]
+        while stack:
+            p = stack.pop()
+            if isinstance(p, BooleanPredicate) and p.op == op:
+                stack.extend(x for x in (p.rhs, p.lhs) if x is not None)
             else:
-                # XXX: raise StoreError
-                raise Exception(f'unrecognized predicate operator: {op}')
+                operands.append(p)
+        return operands
 
-        return computed_ids
+    def _filter(self, candidates: Set, predicate) -> Set:
+        """
+        Return the candidate _ids whose records satisfy the predicate, checking
+        each record in turn instead of searching indexes.
+        """
+        records = self.records
+        if candidates is None:
+            candidates = records.keys()
+        return {
+            _id for _id in candidates
+            if self._matches(records[_id], predicate)
+        }
+
+    def _matches(self, record: Dict, predicate) -> bool:
+        if isinstance(predicate, FieldRange):
+            k = predicate.name
+            return k in record and predicate.contains(record[k])
+
+        if isinstance(predicate, CompositeKey):
+            return all(self._matches(record, p) for p in predicate.predicates)
+
+        if isinstance(predicate, ConditionalPredicate):
+            k = predicate.field.source
+            return k in record and match(
+                predicate.op, record[k], predicate.value
+            )
+
+        operands = [x for x in (predicate.lhs, predicate.rhs) if x is not None]
+        if predicate.op == OP_CODE.AND:
+            return all(self._matches(record, x) for x in operands)
+        return any(self._matches(record, x) for x in operands)
@@ -0,0 +1,354 @@
+"""
+A throughput benchmark harness, companion to ResourceCrudTestSuite, which
+runs the same CRUD operations against each Store at increasing scales and
+reports ops/sec and latency percentiles as JSON, so that results can be
+diffed between commits:
+
+```sh
+python -m ravel.test.benchmark --scales 1 1000 100000 --output bench.json
+```
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from datetime import datetime
+from typing import Text, List, Dict, Type, Callable
+
+from ravel.test.domains.things import Thing as BaseThing
+from ravel.store import (
+    Store,
+    SimulationStore,
+    FilesystemStore,
+    CacheStore,
+)
+from ravel.util.misc_functions import get_class_name
+from ravel import Application, Resource
+
+DEFAULT_SCALES = (1, 1000, 100000)
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_MAX_SINGLE_OPS = 1000
+DEFAULT_QUERY_REPEAT = 10
+PERCENTILES = (50, 90, 99)
+
+
+class StoreBenchmark(object):
+    """
+    Builds and binds the Store under benchmark, in the same way as
+    ResourceCrudTestSuite.build_store and bind_store.
+    """
+
+    name = None
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    def build_store(self, app: Application) -> Store:
+        raise NotImplementedError('override in subclass')
+
+    def bind_store(self, resource_type: Type[Resource], store: Store):
+        store.bind(resource_type)
+
+    def teardown(self):
+        pass
+
+
+class SimulationStoreBenchmark(StoreBenchmark):
+    name = 'simulation'
+
+    def build_store(self, app):
+        SimulationStore.bootstrap(app)
+        return SimulationStore()
+
+
+class FilesystemStoreBenchmark(StoreBenchmark):
+    name = 'filesystem'
+
+    def __init__(self):
+        self.root_dir = None
+
+    def build_store(self, app):
+        self.root_dir = tempfile.mkdtemp(prefix='ravel-benchmark-')
+        FilesystemStore.bootstrap(app, root=self.root_dir)
+        return FilesystemStore()
+
+    def teardown(self):
+        if self.root_dir is not None:
+            shutil.rmtree(self.root_dir, ignore_errors=True)
+            self.root_dir = None
+
+
+class CacheStoreBenchmark(StoreBenchmark):
+    name = 'cache'
+
+    def build_store(self, app):
+        SimulationStore.bootstrap(app)
+        CacheStore.bootstrap(
+            app,
+            front={'store': 'SimulationStore'},
+            back={'store': 'SimulationStore'},
+        )
+        return CacheStore()
+
+
+class SqlalchemyStoreBenchmark(StoreBenchmark):
+    name = 'sqlite'
+
+    @classmethod
+    def is_available(cls) -> bool:
+        try:
+            import sqlalchemy
+        except ImportError:
+            return False
+        return True
+
+    def build_store(self, app):
+        from ravel.ext.sqlalchemy import SqlalchemyStore
+
+        SqlalchemyStore.bootstrap(app, url='sqlite://', dialect='sqlite')
+        return SqlalchemyStore()
+
+    def bind_store(self, resource_type, store):
+        store.bind(resource_type)
+        store.create_tables(overwrite=True)
+
+
+BENCHMARKS = {
+    benchmark_type.name: benchmark_type for benchmark_type in (
+        SimulationStoreBenchmark,
+        FilesystemStoreBenchmark,
+        CacheStoreBenchmark,
+        SqlalchemyStoreBenchmark,
+    )
+}
+
+
+class OperationTimer(object):
+    """
+    Collects the latency of each call to an operation, along with the number
+    of records processed, and summarizes them.
+    """
+
+    def __init__(self, name: Text):
+        self.name = name
+        self.latencies = []
+        self.record_count = 0
+
+    def time(self, func: Callable, *args, record_count: int = 1, **kwargs):
+        t1 = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.latencies.append(time.perf_counter() - t1)
+        self.record_count += record_count
+        return result
+
+    def to_dict(self) -> Dict:
+        total_secs = sum(self.latencies)
+        latencies_ms = sorted(secs * 1000 for secs in self.latencies)
+        return {
+            'operation': self.name,
+            'calls': len(latencies_ms),
+            'records': self.record_count,
+            'total_secs': round(total_secs, 6),
+            'ops_per_sec': round(
+                (self.record_count / total_secs) if total_secs else 0.0, 3
+            ),
+            'latency_ms': dict(
+                {
+                    f'p{p}': round(percentile(latencies_ms, p), 6)
+                    for p in PERCENTILES
+                },
+                max=round(latencies_ms[-1], 6) if latencies_ms else 0.0,
+            ),
+        }
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """
+    Return the p-th percentile of a sorted list, by nearest rank.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def chunks(sequence: List, size: int):
+    for i in range(0, len(sequence), size):
+        yield sequence[i:i + size]
+
+
+def run_benchmark(
+    benchmark: StoreBenchmark,
+    scale: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_single_ops: int = DEFAULT_MAX_SINGLE_OPS,
+    query_repeat: int = DEFAULT_QUERY_REPEAT,
+) -> Dict:
+    """
+    Run each CRUD operation exercised by ResourceCrudTestSuite against a
+    fresh store holding `scale` records. Batch operations are timed per
+    chunk of `batch_size` records, while single-record operations are timed
+    on at most `max_single_ops` records.
+    """
+    app = Application().bootstrap()
+
+    class Thing(BaseThing):
+        pass
+
+    Thing.bootstrap(app)
+
+    store = benchmark.build_store(app)
+    benchmark.bind_store(Thing, store)
+    Thing.bind(store)
+
+    timers = {}
+
+    def timer(name):
+        if name not in timers:
+            timers[name] = OperationTimer(name)
+        return timers[name]
+
+    try:
+        single_count = min(scale, max_single_ops)
+        things = Thing.Batch.generate(count=scale).merge(anything=1)
+        singles = Thing.Batch.generate(count=single_count).merge(anything=1)
+
+        for chunk in chunks(things, batch_size):
+            timer('create_many').time(
+                Thing.create_many, chunk, record_count=len(chunk)
+            )
+        for thing in singles:
+            timer('create').time(thing.create)
+
+        for thing in things[:single_count]:
+            timer('get').time(Thing.get, thing._id)
+        for chunk in chunks(things, batch_size):
+            timer('get_many').time(
+                Thing.get_many, chunk._id, record_count=len(chunk)
+            )
+
+        for thing in singles:
+            thing.name = 'updated'
+            timer('update').time(thing.update)
+        for chunk in chunks(things, batch_size):
+            chunk.merge(name='updated')
+            timer('update_many').time(
+                Thing.update_many, chunk, record_count=len(chunk)
+            )
+
+        for _ in range(query_repeat):
+            query = Thing.select(Thing._id).where(Thing.name == 'updated')
+            timer('query').time(query.execute)
+
+        for thing in singles:
+            timer('delete').time(thing.delete)
+        for chunk in chunks(things, batch_size):
+            timer('delete_many').time(
+                Thing.delete_many, chunk, record_count=len(chunk)
+            )
+    finally:
+        benchmark.teardown()
+
+    return {
+        'store': benchmark.name,
+        'store_type': get_class_name(store),
+        'scale': scale,
+        'operations': [timer.to_dict() for timer in timers.values()],
+    }
+
+
+def get_git_commit() -> Text:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    stores: List[Text] = None,
+    scales: List[int] = DEFAULT_SCALES,
+    **kwargs
+) -> Dict:
+    """
+    Run the benchmark for each store and scale, returning a JSON-serializable
+    report. Stores whose dependencies aren't installed are skipped.
+    """
+    results = []
+    skipped = []
+
+    for name in (stores or list(BENCHMARKS)):
+        benchmark_type = BENCHMARKS[name]
+        if not benchmark_type.is_available():
+            skipped.append(name)
+            continue
+        for scale in scales:
+            results.append(run_benchmark(benchmark_type(), scale, **kwargs))
+
+    return {
+        'meta': {
+            'commit': get_git_commit(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'skipped': skipped,
+        },
+        'results': results,
+    }
+
+
+def main(argv: List[Text] = None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark CRUD throughput across ravel stores.'
+    )
+    parser.add_argument(
+        '--stores', nargs='+', choices=sorted(BENCHMARKS),
+        default=list(BENCHMARKS),
+    )
+    parser.add_argument(
+        '--scales', nargs='+', type=int, default=list(DEFAULT_SCALES)
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=DEFAULT_BATCH_SIZE
+    )
+    parser.add_argument(
+        '--max-single-ops', type=int, default=DEFAULT_MAX_SINGLE_OPS
+    )
+    parser.add_argument(
+        '--query-repeat', type=int, default=DEFAULT_QUERY_REPEAT
+    )
+    parser.add_argument(
+        '--output', help='path of JSON file to write, instead of stdout'
+    )
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        stores=args.stores,
+        scales=args.scales,
+        batch_size=args.batch_size,
+        max_single_ops=args.max_single_ops,
+        query_repeat=args.query_repeat,
+    )
+
+    if args.output:
+        with open(args.output, 'w') as json_file:
+            json.dump(report, json_file, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -418,3 +418,33 @@ class ResourceCrudTestSuite:
             assert len(results) == len(random_things)
             for thing_1, thing_2 in zip(results, results[1:]):
                 assert thing_1._rev <= thing_2._rev
+
+    def test_lazy_load_siblings_in_queried_batch(self, Thing, random_things):
+        self.bind(Thing)
+
+        Thing.create_many(random_things)
+
+        # queries are eager by default, loading every field up front
+        query = Thing.select(Thing._id)
+        query.eager = False
+        results = query.execute()
+
+        self.store.history.clear()
+        self.store.history.start()
+        results[0].name
+
+        # one fetch_many loads the field for every resource in the batch
+        self.store.history.stop()
+        methods = [event.method for event in self.store.history]
+        assert methods == ['fetch_many']
+
+        expected = {thing._id: thing.name for thing in random_things}
+        for thing in results:
+            assert 'name' in thing.internal.state
+            assert thing.internal.state['name'] == expected[thing._id]
+            assert not thing.dirty
+
+        # resources don't keep the batch they were queried in alive
+        thing = results[0]
+        del results
+        assert thing.internal.batch() is None
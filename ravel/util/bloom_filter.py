@@ -0,0 +1,69 @@
+import math
+
+from hashlib import blake2b
+
+
+class BloomFilter(object):
+    """
+    A set of _ids that can answer whether one is definitely absent, in a
+    fixed number of bits, with false positives at about `error_rate` while
+    it holds no more than `capacity` _ids. _ids can't be removed.
+
+    _ids are hashed by their string representation, so that an int and a
+    string with the same digits collide, which only adds false positives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(
+            int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8
+        )
+        self.hash_count = max(
+            int(round(self.size / capacity * math.log(2))), 1
+        )
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __repr__(self):
+        return (
+            f'BloomFilter(count={self.count}, capacity={self.capacity}, '
+            f'hashes={self.hash_count})'
+        )
+
+    def __len__(self):
+        """
+        Return the number of _ids added, counting repeats.
+        """
+        return self.count
+
+    def __contains__(self, _id) -> bool:
+        bits = self.bits
+        for i in self._iter_offsets(_id):
+            if not bits[i >> 3] & (1 << (i & 7)):
+                return False
+        return True
+
+    def add(self, _id):
+        bits = self.bits
+        for i in self._iter_offsets(_id):
+            bits[i >> 3] |= 1 << (i & 7)
+        self.count += 1
+
+    def update(self, _ids):
+        for _id in _ids:
+            self.add(_id)
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+        self.count = 0
+
+    def _iter_offsets(self, _id):
+        # derive all offsets from two hashes, by double hashing
+        digest = blake2b(str(_id).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % size
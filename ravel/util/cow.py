@@ -0,0 +1,133 @@
+from copy import deepcopy
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from uuid import UUID
+
+
+# values of these types can be shared freely between dicts, as they can't be
+# modified in place by whoever ends up holding a reference to them.
+IMMUTABLE_TYPES = frozenset({
+    type(None), bool, int, float, complex, str, bytes,
+    date, datetime, time, timedelta, Decimal, UUID,
+})
+
+
+def copy_value(value):
+    """
+    Return a deep copy of a record value. This is a faster alternative to
+    deepcopy for the plain containers that records are made of.
+    """
+    value_type = type(value)
+    if value_type in IMMUTABLE_TYPES:
+        return value
+    if value_type is list:
+        return [copy_value(x) for x in value]
+    if value_type is dict:
+        # immutable values are checked inline, as most values in records are
+        return {
+            k: v if type(v) in IMMUTABLE_TYPES else copy_value(v)
+            for k, v in value.items()
+        }
+    if value_type is set:
+        return value.copy()
+    if value_type is tuple:
+        return tuple(copy_value(x) for x in value)
+    return deepcopy(value)
+
+
+class CopyOnWriteDict(dict):
+    """
+    A dict that shares its values with a source dict, usually a record owned by
+    a Store. Immutable values are shared outright, whereas mutable values, like
+    lists and nested dicts, are copied the first time they are accessed. This
+    way, reading a record costs nothing more than copying its top-level keys,
+    and nothing done to the dict can ever change the source.
+    """
+
+    def __init__(self, source=None, keys=None):
+        if keys is None:
+            dict.__init__(self, source or ())
+        else:
+            dict.__init__(self, (
+                (k, source[k]) for k in keys if k in source
+            ))
+        self._owned = set()
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if (type(value) not in IMMUTABLE_TYPES) and (key not in self._owned):
+            value = copy_value(value)
+            dict.__setitem__(self, key, value)
+            self._owned.add(key)
+        return value
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._owned.add(key)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._owned.discard(key)
+
+    def __iter__(self):
+        # overriding __iter__ prevents CPython from merging this dict into
+        # other dicts, as in `dict(x)` or `{**x}`, by reading its values
+        # directly, bypassing __getitem__.
+        return dict.__iter__(self)
+
+    def __or__(self, other):
+        return self.copy() | other
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            dict.__delitem__(self, key)
+            self._owned.discard(key)
+            return value
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        if key not in self._owned:
+            value = copy_value(value)
+        self._owned.discard(key)
+        return (key, value)
+
+    def update(self, *args, **kwargs):
+        other = dict(*args, **kwargs)
+        dict.update(self, other)
+        self._owned.update(other.keys())
+
+    def items(self):
+        self._own_all()
+        return dict.items(self)
+
+    def values(self):
+        self._own_all()
+        return dict.values(self)
+
+    def copy(self) -> dict:
+        """
+        Return a plain dict copy.
+        """
+        return dict(self.items())
+
+    def clear(self):
+        dict.clear(self)
+        self._owned.clear()
+
+    def _own_all(self):
+        for k in dict.keys(self):
+            if k not in self._owned:
+                self[k]
@@ -1,6 +1,9 @@
+import gc
 import inspect
 import socket
 
+from contextlib import contextmanager
+
 from uuid import UUID
 from importlib import import_module
 from types import GeneratorType
@@ -171,3 +174,17 @@ def is_port_in_use(addr: Text) -> bool:
         sock.close()
 
 
+@contextmanager
+def suspend_gc():
+    """
+    Disable cyclic garbage collection within the block, during which we expect
+    to allocate many containers, like records loaded in bulk, each of which
+    would otherwise count towards triggering needless collections.
+    """
+    is_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if is_enabled:
+            gc.enable()
@@ -0,0 +1,106 @@
+from threading import Condition, Lock, local, get_ident
+
+
+class ReadWriteLock(object):
+    """
+    A lock held either by any number of readers or by a single writer, used
+    as in `with lock.read:` and `with lock.write:`.
+
+    Both sides are reentrant, and the thread holding the write lock can also
+    acquire the read lock, but a reader can't upgrade to the write lock.
+    Writers take precedence, in that new readers wait while any writer is
+    waiting, so that a steady stream of reads can't starve writes.
+    """
+
+    def __init__(self):
+        self._cond = Condition(Lock())
+        self._local = local()
+        self._reader_count = 0
+        self._writer = None
+        self._write_depth = 0
+        self._waiting_writer_count = 0
+        self.read = _ReadLock(self)
+        self.write = _WriteLock(self)
+
+    def __repr__(self):
+        return (
+            f'ReadWriteLock(readers={self._reader_count}, '
+            f'writer={self._writer})'
+        )
+
+    def acquire_read(self):
+        depth = getattr(self._local, 'read_depth', 0)
+        if depth:
+            self._local.read_depth = depth + 1
+            return
+
+        with self._cond:
+            if self._writer != get_ident():
+                while self._writer is not None or self._waiting_writer_count:
+                    self._cond.wait()
+            self._reader_count += 1
+
+        self._local.read_depth = 1
+
+    def release_read(self):
+        depth = self._local.read_depth - 1
+        self._local.read_depth = depth
+        if not depth:
+            with self._cond:
+                self._reader_count -= 1
+                if not self._reader_count:
+                    self._cond.notify_all()
+
+    def acquire_write(self):
+        thread_id = get_ident()
+        if self._writer == thread_id:
+            self._write_depth += 1
+            return
+
+        if getattr(self._local, 'read_depth', 0):
+            raise RuntimeError('cannot upgrade a read lock to a write lock')
+
+        with self._cond:
+            self._waiting_writer_count += 1
+            try:
+                while self._writer is not None or self._reader_count:
+                    self._cond.wait()
+            finally:
+                self._waiting_writer_count -= 1
+            self._writer = thread_id
+            self._write_depth = 1
+
+    def release_write(self):
+        self._write_depth -= 1
+        if not self._write_depth:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+
+class _ReadLock(object):
+    __slots__ = ('rwlock', )
+
+    def __init__(self, rwlock: ReadWriteLock):
+        self.rwlock = rwlock
+
+    def __enter__(self):
+        self.rwlock.acquire_read()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.rwlock.release_read()
+
+
+class _WriteLock(object):
+    __slots__ = ('rwlock', )
+
+    def __init__(self, rwlock: ReadWriteLock):
+        self.rwlock = rwlock
+
+    def __enter__(self):
+        self.rwlock.acquire_write()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.rwlock.release_write()
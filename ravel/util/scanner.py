@@ -1,10 +1,14 @@
 import re
 import os
+import sys
+import json
 import inspect
 import importlib
+import tempfile
 
-from typing import Dict, Callable
+from typing import Dict, Callable, List, Text
 from os.path import splitext
+from threading import RLock
 
 from appyratus.files.json import Json
 from appyratus.utils.dict_utils import DictObject
@@ -33,7 +37,19 @@ class Scanner:
         if callback:
             self.on_match = callback
 
-    def scan(self, package_name, context: Dict = None, verbose=False):
+    def scan(
+        self,
+        package_name,
+        context: Dict = None,
+        verbose=False,
+        index: 'ScanIndex' = None,
+    ):
+        """
+        Scan a package or module. If a ScanIndex is given and none of the
+        package's files have changed since they were indexed, only the modules
+        known to contain matches are imported and scanned. Otherwise, every
+        module is, and the index is updated.
+        """
         context = dict(self.context.to_dict(), **(context or {}))
         context = DictObject(context)
 
@@ -43,50 +59,85 @@ class Scanner:
         if root_filename != '__init__.py':
             self.scan_module(root_module, context)
         else:
-            package_dir = os.path.split(root_module.__file__)[0]
-            if re.match(f'\./', package_dir):
-                # ensure we use an absolute path for the package dir
-                # to prevent strange string truncation results below
-                package_dir = os.path.realpath(package_dir)
-            package_path_len = package_name.count('.') + 1
-            package_parent_dir = '/' + '/'.join(
-                package_dir.strip('/').split('/')[:-package_path_len]
-            )
-
-            for dir_name, sub_dirs, file_names in os.walk(package_dir):
-                file_names = set(file_names)
-
-                if '.ravel' in file_names:
-                    dot_file_path = os.path.join(dir_name, '.ravel')
-                    dot_data = Json.read(dot_file_path) or {}
-                    ignore = dot_data.get('scanner', {}).get('ignore', False)
-
-                    if ignore:
-                        self.log.debug(f'scanner ignoring {dir_name}')
-                        sub_dirs.clear()
-                        continue
-
-                if '__init__.py' in file_names:
-                    dir_name_offset = len(package_parent_dir)
-                    pkg_path = dir_name[dir_name_offset + 1:].replace("/", ".")
-                    for file_name in file_names:
-                        if file_name.endswith('.py'):
-                            mod_path = f'{pkg_path}.{splitext(file_name)[0]}'
-                            try:
-                                module = importlib.import_module(mod_path)
-                            except Exception as exc:
-                                self.on_import_error(exc, mod_path, context)
-                                continue
-                            self.scan_module(module, context)
+            module_paths = self._walk_package(root_module, package_name)
+
+            indexed_module_paths = None
+            if index is not None:
+                file_stats = ScanIndex.stat_files(module_paths.values())
+                indexed_module_paths = index.get(package_name, file_stats)
+
+            if indexed_module_paths is not None:
+                self.log.debug(f'scanner using index for {package_name}')
+                module_paths = indexed_module_paths
+
+            required_module_paths = []
+            for mod_path in module_paths:
+                try:
+                    module = importlib.import_module(mod_path)
+                except Exception as exc:
+                    self.on_import_error(exc, mod_path, context)
+                    continue
+                match_count = self.scan_module(module, context)
+                if match_count or self.is_required_module(module):
+                    required_module_paths.append(mod_path)
+
+            if index is not None and indexed_module_paths is None:
+                index.put(package_name, file_stats, required_module_paths)
 
         self.context = context
         return context
 
-    def scan_module(self, module, context):
+    def _walk_package(self, root_module, package_name) -> Dict:
+        """
+        Return a mapping from the dotted path of each module in the package to
+        its file path, skipping directories ignored through .ravel files.
+        """
+        module_paths = {}
+
+        package_dir = os.path.split(root_module.__file__)[0]
+        if re.match(f'\./', package_dir):
+            # ensure we use an absolute path for the package dir
+            # to prevent strange string truncation results below
+            package_dir = os.path.realpath(package_dir)
+        package_path_len = package_name.count('.') + 1
+        package_parent_dir = '/' + '/'.join(
+            package_dir.strip('/').split('/')[:-package_path_len]
+        )
+
+        for dir_name, sub_dirs, file_names in os.walk(package_dir):
+            file_names = set(file_names)
+
+            if '.ravel' in file_names:
+                dot_file_path = os.path.join(dir_name, '.ravel')
+                dot_data = Json.read(dot_file_path) or {}
+                ignore = dot_data.get('scanner', {}).get('ignore', False)
+
+                if ignore:
+                    self.log.debug(f'scanner ignoring {dir_name}')
+                    sub_dirs.clear()
+                    continue
+
+            if '__init__.py' in file_names:
+                dir_name_offset = len(package_parent_dir)
+                pkg_path = dir_name[dir_name_offset + 1:].replace("/", ".")
+                for file_name in file_names:
+                    if file_name.endswith('.py'):
+                        mod_path = f'{pkg_path}.{splitext(file_name)[0]}'
+                        file_path = os.path.join(dir_name, file_name)
+                        module_paths[mod_path] = file_path
+
+        return module_paths
+
+    def scan_module(self, module, context) -> int:
+        """
+        Pass each object in the module that satisfies the predicate to
+        on_match, returning the number of matches.
+        """
         if None in module.__dict__:
             # XXX: why is this happenings?
             del module.__dict__[None]
-        for k, v in inspect.getmembers(module, predicate=self.predicate):
+        members = inspect.getmembers(module, predicate=self.predicate)
+        for k, v in members:
             # if verbose:
             #     console.debug(
             #         f'scanner matched "{k}" '
@@ -96,10 +147,19 @@ class Scanner:
                 self.on_match(k, v, context)
             except Exception as exc:
                 self.on_match_error(exc, module, context, k, v)
+        return len(members)
 
     def predicate(self, value) -> bool:
         return True
 
+    def is_required_module(self, module) -> bool:
+        """
+        Should the module be imported when scanning with an up-to-date
+        ScanIndex even though it contains no matches, for instance because
+        importing it has side effects that the host app depends on?
+        """
+        return False
+
     def on_match(self, name, value, context):
         context[name] = value
 
@@ -120,3 +180,80 @@ class Scanner:
                 'type': type(value),
             }
         )
+
+
+class ScanIndex:
+    """
+    A persisted index of the modules in which a Scanner found matches, per
+    scanned package. Each entry is only valid so long as the package's set of
+    files and their modification times and sizes are unchanged; otherwise,
+    the package must be fully rescanned. The index is stored as JSON.
+    """
+
+    def __init__(self, path: Text):
+        self.path = path
+        self.lock = RLock()
+        self.packages = {}
+        self.is_dirty = False
+        self.load()
+
+    @staticmethod
+    def stat_files(file_paths) -> Dict[Text, List[int]]:
+        """
+        Return the modification time and size of each file.
+        """
+        file_stats = {}
+        for file_path in file_paths:
+            stat = os.stat(file_path)
+            file_stats[file_path] = [stat.st_mtime_ns, stat.st_size]
+        return file_stats
+
+    def get(self, package_name: Text, file_stats: Dict) -> List[Text]:
+        """
+        Return the indexed module paths for the package, or None if the index
+        is missing or stale.
+        """
+        with self.lock:
+            entry = self.packages.get(package_name)
+        if entry is None or entry['files'] != file_stats:
+            return None
+        return entry['modules']
+
+    def put(self, package_name: Text, file_stats: Dict, module_paths: List):
+        with self.lock:
+            self.packages[package_name] = {
+                'files': file_stats,
+                'modules': list(module_paths),
+            }
+            self.is_dirty = True
+
+    def load(self):
+        try:
+            with open(self.path) as index_file:
+                data = json.load(index_file)
+        except (OSError, ValueError):
+            return
+        if data.get('python') == sys.version:
+            self.packages = data.get('packages') or {}
+
+    def save(self):
+        """
+        Write the index if it has changed, replacing the existing file
+        atomically so that concurrent processes never read a partial file.
+        """
+        with self.lock:
+            if not self.is_dirty:
+                return
+            data = {'python': sys.version, 'packages': self.packages}
+            dir_path = os.path.dirname(self.path) or '.'
+            os.makedirs(dir_path, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=dir_path, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as temp_file:
+                    json.dump(data, temp_file)
+                os.replace(temp_path, self.path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self.is_dirty = False
@@ -0,0 +1,30 @@
+import json
+
+from ravel.test.benchmark import run_benchmarks, percentile
+
+
+def test_percentile():
+    values = [float(x) for x in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([3.0], 90) == 3.0
+    assert percentile([], 50) == 0.0
+
+
+def test_benchmark_report_is_json():
+    report = run_benchmarks(
+        stores=['simulation', 'cache'],
+        scales=[1, 10],
+        batch_size=4,
+        query_repeat=2,
+    )
+    report = json.loads(json.dumps(report))
+
+    assert len(report['results']) == 4
+    for result in report['results']:
+        operations = {x['operation']: x for x in result['operations']}
+        assert operations['create_many']['records'] == result['scale']
+        assert operations['query']['calls'] == 2
+        for stats in operations.values():
+            assert stats['ops_per_sec'] >= 0
+            assert set(stats['latency_ms']) == {'p50', 'p90', 'p99', 'max'}
@@ -0,0 +1,384 @@
+import time
+
+from collections import Counter
+
+import pytest
+
+from ravel.test.crud import *
+from ravel.store import CacheStore, SimulationStore
+from ravel.store.cache_eviction import LruQueue, LfuQueue, CacheBudget
+from ravel.store.cache_invalidation import LocalInvalidationBus
+from ravel.constants import ID
+
+
+@pytest.fixture(scope='function')
+def build_store(app, Thing):
+    def build_store(**kwargs):
+        SimulationStore.bootstrap(app)
+        CacheStore.bootstrap(
+            app,
+            front={'store': 'SimulationStore'},
+            back={'store': 'SimulationStore'},
+        )
+        store = CacheStore()
+        store.bind(Thing, **kwargs)
+        Thing.ravel.local.store = store
+        return store
+
+    return build_store
+
+
+@pytest.fixture(scope='function')
+def count_be_calls():
+    def count_be_calls(store, *methods):
+        calls = Counter()
+        for name in methods:
+            def counted(*args, method=getattr(store.be, name), name=name,
+                        **kwargs):
+                calls[name] += 1
+                return method(*args, **kwargs)
+            setattr(store.be, name, counted)
+        return calls
+
+    return count_be_calls
+
+
+class TestEvictionQueues:
+    def test_lru_evicts_least_recently_used(self):
+        queue = LruQueue()
+        for _id in 'abc':
+            queue.insert(_id)
+        queue.touch('a')
+        assert [queue.pop(), queue.pop(), queue.pop()] == ['b', 'c', 'a']
+
+    def test_lfu_evicts_least_frequently_used(self):
+        queue = LfuQueue()
+        for _id in 'abc':
+            queue.insert(_id)
+        queue.touch('a')
+        queue.touch('a')
+        queue.touch('c')
+        queue.remove('b')
+        queue.insert('d')
+        assert [queue.pop(), queue.pop(), queue.pop()] == ['d', 'c', 'a']
+        assert not len(queue)
+
+    def test_budget_evicts_over_max_bytes(self):
+        budget = CacheBudget(max_bytes=10000)
+        for i in range(100):
+            budget.insert(i, {'value': 'x' * 500})
+        victims = budget.pop_victims()
+        assert victims == list(range(len(victims)))
+        assert budget.total_bytes <= 10000
+        assert len(budget) + len(victims) == 100
+
+
+class TestBoundedCacheStore:
+    def test_max_records_evicts_from_front_end(self, build_store):
+        store = build_store(max_records=10)
+        records = store.create_many([{'name': str(i)} for i in range(25)])
+
+        assert store.fe.count() == 10
+        assert store.be.count() == 25
+        assert store.stats.evictions == 15
+
+        # evicted records are read back through the back-end
+        _ids = [rec[ID] for rec in records]
+        fetched = store.fetch_many(_ids[:5])
+        assert {rec['name'] for rec in fetched.values()} == {
+            '0', '1', '2', '3', '4'
+        }
+        assert store.stats.misses == 5
+        assert store.fe.count() == 10
+
+        store.fetch_many(_ids[:5])
+        assert store.stats.hits == 5
+
+    def test_update_evicted_record(self, build_store):
+        store = build_store(max_records=1)
+        first, second = store.create_many([
+            {'name': 'first', 'age': 1},
+            {'name': 'second', 'age': 2},
+        ])
+        assert not store.fe.exists(first[ID])
+
+        updated = store.update(first[ID], {'age': 10})
+        assert updated['name'] == 'first'
+        assert store.be.fetch(first[ID])['name'] == 'first'
+        assert store.be.fetch(first[ID])['age'] == 10
+
+    def test_ttl_expires_records(self, build_store):
+        store = build_store(ttl=0.05)
+        record = store.create({'name': 'x'})
+
+        time.sleep(0.1)
+        assert store.fetch(record[ID])['name'] == 'x'
+        assert store.stats.expirations == 1
+        assert store.stats.misses == 1
+
+
+class TestWriteBehind:
+    def test_writes_to_record_are_coalesced(self, build_store):
+        store = build_store(mode='writeback', flush_interval=60)
+        record = store.create({'name': 'x', 'age': 0})
+        for age in range(1, 11):
+            store.update(record[ID], {'age': age})
+
+        # queued writes are visible before they reach the back-end
+        assert store.fetch(record[ID])['age'] == 10
+        assert store.exists(record[ID])
+        assert store.get_writeback_stats()['depth'] == 1
+
+        store.flush()
+        assert store.be.fetch(record[ID])['age'] == 10
+
+        stats = store.get_writeback_stats()
+        assert stats['depth'] == 0
+        assert stats['writes'] == 11
+        assert stats['coalesced'] == 10
+        assert stats['flushes'] == 1
+        assert stats['records_flushed'] == 1
+        assert stats['latency']['count'] == 1
+
+    def test_create_then_delete_never_reaches_back_end(self, build_store):
+        store = build_store(mode='writeback', flush_interval=60)
+        kept, deleted = store.create_many([{'name': 'a'}, {'name': 'b'}])
+        store.delete(deleted[ID])
+
+        assert store.fetch(deleted[ID]) is None
+        assert not store.exists(deleted[ID])
+
+        store.flush()
+        assert store.be.exists(kept[ID])
+        assert not store.be.exists(deleted[ID])
+        assert store.get_writeback_stats()['records_flushed'] == 1
+
+    def test_batch_size_triggers_flush(self, build_store):
+        store = build_store(mode='writeback', batch_size=10, flush_interval=60)
+        store.create_many([{'name': str(i)} for i in range(10)])
+
+        deadline = time.monotonic() + 5
+        while store.be.count() < 10 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert store.be.count() == 10
+
+    def test_failed_batch_retries_only_unapplied_writes(self, build_store):
+        store = build_store(mode='writeback', flush_interval=60)
+        updated = store.create({'name': 'a', 'age': 0})
+        store.flush()
+
+        calls = []
+        be_create_many = store.be.create_many
+        be_update_many = store.be.update_many
+
+        def create_many(records):
+            calls.append('create_many')
+            return be_create_many(records)
+
+        def update_many(_ids, data):
+            calls.append('update_many')
+            if calls.count('update_many') == 1:
+                raise ValueError('update failed')
+            return be_update_many(_ids, data)
+
+        store.be.create_many = create_many
+        store.be.update_many = update_many
+
+        created = store.create({'name': 'b'})
+        store.update(updated[ID], {'age': 1})
+        with pytest.raises(ValueError):
+            store.flush()
+        store.flush()
+
+        # the create isn't applied again when the batch is retried
+        assert calls == ['create_many', 'update_many', 'update_many']
+        assert store.be.fetch(created[ID])['name'] == 'b'
+        assert store.be.fetch(updated[ID])['age'] == 1
+        assert store.get_writeback_stats()['failures'] == 1
+
+
+class TestConsistency:
+    def test_bounded_hits_skip_back_end_during_lease(
+        self, build_store, count_be_calls
+    ):
+        store = build_store(consistency='bounded', lease=0.1)
+        record = store.create({'name': 'x'})
+        be_calls = count_be_calls(store, 'fetch_many')
+
+        for _ in range(3):
+            assert store.fetch(record[ID])['name'] == 'x'
+        assert not be_calls
+
+        # a write made by another process is seen once the lease runs out
+        store.be.update(record[ID], {'name': 'y'})
+        assert store.fetch(record[ID])['name'] == 'x'
+        time.sleep(0.15)
+        assert store.fetch(record[ID])['name'] == 'y'
+        assert be_calls['fetch_many'] == 2
+
+    def test_invalidate_never_checks_back_end(
+        self, build_store, count_be_calls
+    ):
+        store = build_store(consistency='invalidate')
+        record = store.create({'name': 'x'})
+        be_calls = count_be_calls(store, 'fetch_many')
+
+        store.be.update(record[ID], {'name': 'y'})
+        assert store.fetch(record[ID])['name'] == 'x'
+        assert not be_calls
+
+        # strict consistency can still be asked for per read
+        assert store.fetch(record[ID], consistency='strict')['name'] == 'y'
+
+    def test_strict_sees_back_end_deletes(self, build_store):
+        store = build_store()
+        record = store.create({'name': 'x'})
+        store.be.delete(record[ID])
+
+        assert store.fetch(record[ID]) is None
+        assert not store.fe.exists(record[ID])
+
+
+class TestQueryCache:
+    @pytest.fixture(scope='function')
+    def store(self, build_store):
+        store = build_store(consistency='invalidate', max_queries=10)
+        store.create_many([
+            {'name': 'odd' if i % 2 else 'even', 'age': i, 'real': 0.0}
+            for i in range(10)
+        ])
+        return store
+
+    def test_cached_query_skips_back_end(self, store, count_be_calls, Thing):
+        be_calls = count_be_calls(store, 'query')
+
+        first = store.query((Thing.name == 'odd') & (Thing.age > 2))
+        second = store.query((Thing.age > 2) & (Thing.name == 'odd'))
+
+        assert [rec[ID] for rec in first] == [rec[ID] for rec in second]
+        assert be_calls['query'] == 1
+        assert store.stats.query_hits == 1
+        assert store.stats.query_misses == 1
+
+    def test_invalidated_by_writes_to_referenced_fields(self, store, Thing):
+        predicate = Thing.age > 5
+        records = store.query(predicate)
+        assert len(records) == 4
+
+        store.update(records[0][ID], {'real': 1.0})
+        store.query(predicate)
+        assert store.stats.query_hits == 1
+
+        store.update(records[0][ID], {'age': 0})
+        assert len(store.query(predicate)) == 3
+        assert store.stats.query_hits == 1
+
+        store.create({'name': 'new', 'age': 10})
+        assert len(store.query(predicate)) == 4
+        assert store.stats.query_hits == 1
+
+    def test_invalidated_by_deleting_results(self, store, Thing):
+        records = store.query(Thing.name == 'odd')
+        store.delete(records[0][ID])
+        assert len(store.query(Thing.name == 'odd')) == 4
+        assert store.stats.query_hits == 0
+
+    def test_strict_queries_see_back_end_creates(self, store, Thing):
+        predicate = Thing.age > 5
+        assert len(store.query(predicate, consistency='strict')) == 4
+
+        # written by another process, so the query cache isn't invalidated
+        store.be.create({'name': 'new', 'age': 10})
+        assert len(store.query(predicate, consistency='strict')) == 5
+        assert store.stats.query_hits == 0
+
+    def test_bounded_hit_reruns_on_back_end_writes(self, build_store, Thing):
+        store = build_store(consistency='bounded', lease=0, max_queries=10)
+        store.create_many([{'name': 'x', 'age': i} for i in range(10)])
+        predicate = Thing.age > 5
+        records = store.query(predicate)
+        assert len(records) == 4
+
+        store.be.update(records[0][ID], {'age': 0})
+        assert len(store.query(predicate)) == 3
+        assert store.stats.query_hits == 0
+
+        assert len(store.query(predicate)) == 3
+        assert store.stats.query_hits == 1
+
+
+class TestNegativeCache:
+    def test_missing_ids_skip_back_end(self, build_store, count_be_calls):
+        store = build_store(negative_cache_size=10)
+        be_calls = count_be_calls(store, 'fetch_many', 'exists_many')
+
+        assert store.fetch('missing') is None
+        assert store.fetch('missing') is None
+        assert store.exists('missing') is False
+        assert sum(be_calls.values()) == 1
+
+    def test_created_ids_are_no_longer_missing(self, build_store):
+        store = build_store(negative_cache_size=10)
+        assert store.fetch('missing') is None
+
+        store.create({ID: 'missing', 'name': 'x'})
+        assert store.fetch('missing')['name'] == 'x'
+
+        store.delete('missing')
+        assert store.fetch('missing') is None
+
+    def test_bloom_filter_answers_for_unseen_ids(
+        self, build_store, count_be_calls
+    ):
+        store = build_store(negative_cache_size=10, bloom_capacity=100)
+        record = store.create({'name': 'x'})
+        be_calls = count_be_calls(store, 'fetch_many', 'exists_many')
+
+        assert store.exists_many(['a', 'b', 'c']) == {
+            'a': False, 'b': False, 'c': False
+        }
+        assert store.exists(record[ID])
+        assert sum(be_calls.values()) == 1
+
+
+class TestInvalidationBus:
+    @pytest.fixture(scope='function')
+    def peers(self, build_store):
+        buses = [LocalInvalidationBus('test'), LocalInvalidationBus('test')]
+        a = build_store(consistency='invalidate', invalidation_bus=buses[0])
+        b = build_store(consistency='invalidate', invalidation_bus=buses[1])
+        b.be = a.be
+        yield a, b
+        for bus in buses:
+            bus.close()
+
+    def test_peer_evicts_records_written_elsewhere(self, peers):
+        a, b = peers
+        record = a.create({'name': 'x'})
+        assert b.fetch(record[ID])['name'] == 'x'
+
+        a.update(record[ID], {'name': 'y'})
+        assert b.fetch(record[ID])['name'] == 'y'
+        assert b.stats.invalidations == 1
+
+        a.delete(record[ID])
+        assert b.fetch(record[ID]) is None
+
+    def test_own_writes_are_not_delivered(self, peers):
+        a, b = peers
+        record = a.create({'name': 'x'})
+        a.update(record[ID], {'name': 'y'})
+        assert not a.invalidations
+        assert a.stats.invalidations == 0
+
+    def test_writes_evict_regardless_of_rev_order(self, peers):
+        a, b = peers
+        record = a.create({'name': 'x'})
+        assert b.fetch(record[ID])['name'] == 'x'
+
+        # as written by a peer whose clock is behind
+        a.invalidation_bus.publish(
+            a.resource_type.__name__, revs={record[ID]: '0-0'}
+        )
+        b.fetch(record[ID])
+        assert b.stats.invalidations == 1
@@ -0,0 +1,53 @@
+import pytest
+import numpy as np
+
+from ravel.test.crud import *
+from ravel.store import SimulationStore
+from ravel.columnar_batch import ColumnarBatch
+from ravel.util import is_resource
+
+
+@pytest.fixture(scope='function')
+def things(app, Thing):
+    SimulationStore.bootstrap(app)
+    store = SimulationStore()
+    store.bind(Thing)
+    Thing.ravel.local.store = store
+    return Thing.Batch([
+        Thing(name='a', age=3, real=1.5),
+        Thing(name='b', age=1, real=None),
+        Thing(name='c', age=2, real=0.5),
+        Thing(name='d', age=1, real=2.0),
+    ]).create()
+
+
+class TestColumnarBatch:
+    def test_scalar_fields_use_typed_columns(self, Thing, things):
+        batch = things.to_columnar({'name', 'age', 'real'})
+        assert batch.age.dtype == np.int64
+        assert batch.real.dtype == object
+        assert len(batch) == 4
+
+    def test_where_and_sort(self, Thing, things):
+        batch = things.to_columnar({'name', 'age'})
+        result = batch.where(Thing.age < 3).sort([Thing.age.asc, Thing.name.desc])
+        assert list(result.name) == ['d', 'b', 'c']
+        assert len(batch) == 4
+
+    def test_aggregates(self, Thing, things):
+        batch = things.to_columnar({'name', 'age', 'real'})
+        assert batch.sum(Thing.age) == 7
+        assert batch.mean('real') == pytest.approx(4.0 / 3)
+        assert batch.count('real') == 3
+        assert batch.min('name') == 'a'
+        assert batch.max(Thing.age) == 3
+
+    def test_columnar_query(self, Thing, things):
+        batch = Thing.select(Thing.name, Thing.age).execute(columnar=True)
+        assert isinstance(batch, ColumnarBatch)
+        assert sorted(batch.name) == ['a', 'b', 'c', 'd']
+
+        thing = batch.sort(Thing.name.asc)[0]
+        assert is_resource(thing)
+        assert thing.name == 'a'
+        assert not thing.dirty
@@ -0,0 +1,38 @@
+import pytest
+
+from ravel.test.crud import *
+from ravel.store import SimulationStore
+from ravel.dumper import Dumper, NestedDumper
+from ravel.constants import ID, REV
+
+
+@pytest.fixture(scope='function')
+def things(app, Thing):
+    SimulationStore.bootstrap(app)
+    store = SimulationStore()
+    store.bind(Thing)
+    Thing.ravel.local.store = store
+    return Thing.Batch.generate(count=8).create()
+
+
+class TestNestedDumper:
+    def test_dump_selected_resolvers(self, Thing, things):
+        records = things.dump(resolvers={Thing._id, Thing._rev, 'name'})
+        assert len(records) == len(things)
+        for thing, record in zip(things, records):
+            assert record == {
+                'id': thing._id,
+                'rev': thing._rev,
+                'name': thing.name,
+            }
+
+    def test_dump_plan_is_compiled_once(self, Thing, things):
+        keys = frozenset({ID, REV, 'name', 'age'})
+        things.dump(resolvers=keys)
+
+        plan = NestedDumper.get_plan(Thing, keys)
+        assert NestedDumper.get_plan(Thing, keys) is plan
+        assert sorted(k for _, k in plan.plain_fields) == sorted(keys)
+
+        Dumper.clear_plans()
+        assert NestedDumper.get_plan(Thing, keys) is not plan
@@ -1,7 +1,10 @@
 import shutil
 
+import pytest
+
 from ravel.test.crud import *
 from ravel.store import SimulationStore, FilesystemStore
+from ravel.constants import ID
 
 
 class TestResourceCrudWithSimulationStore(ResourceCrudTestSuite):
@@ -30,11 +33,206 @@ class TestResourceCrudWithFilesystemStore(ResourceCrudTestSuite):
 
 #class TestResourceCrudWithCacheStore(ResourceCrudTestSuite):
 #    pass
-#
-#
-#class TestResourceCrudWithRedisStore(ResourceCrudTestSuite):
-#    pass
-#
-#
-#class TestResourceCrudWithSqlalchemyStore(ResourceCrudTestSuite):
-#    pass
+
+
+class TestResourceCrudWithRedisStore(ResourceCrudTestSuite):
+    @classmethod
+    def build_store(cls, app):
+        fakeredis = pytest.importorskip('fakeredis')
+        from ravel.ext.redis import RedisStore
+
+        RedisStore.bootstrap(
+            app, redis=fakeredis.FakeStrictRedis(), transactional=True
+        )
+        return RedisStore()
+
+    def test_batch_writes_are_pipelined(self, Thing, random_things):
+        self.bind(Thing)
+
+        redis = self.store.redis
+        pipelines = []
+
+        def pipeline(*args, **kwargs):
+            pipe = type(redis).pipeline(redis, *args, **kwargs)
+            pipelines.append(pipe)
+            return pipe
+
+        redis.pipeline = pipeline
+        try:
+            # one pipeline, watching the keys read before MULTI/EXEC
+            Thing.create_many(random_things)
+            assert len(pipelines) == 1
+            assert pipelines[-1].transaction
+
+            pipelines.clear()
+            Thing.update_many(random_things.merge(name='updated'))
+            assert len(pipelines) == 1
+
+            # delete_many clears the _ids of the resources it deletes
+            _ids = list(random_things._id)
+
+            pipelines.clear()
+            Thing.delete_many(random_things)
+            assert len(pipelines) == 1
+        finally:
+            del redis.pipeline
+
+        assert not any(Thing.get_many(_ids))
+
+        # without transactions, one pipeline reads and another writes
+        self.store.transactional = False
+        redis.pipeline = pipeline
+        try:
+            pipelines.clear()
+            Thing.create_many(random_things)
+            assert len(pipelines) == 2
+            assert not pipelines[-1].transaction
+        finally:
+            del redis.pipeline
+            self.store.transactional = True
+
+    def test_transactional_writes_retry_on_conflict(self, Thing):
+        self.bind(Thing)
+
+        thing = Thing(name='a').create()
+        records = self.store.records
+        get_many = records.get_many
+        reads = []
+
+        def concurrent_get_many(*args, **kwargs):
+            # another client renames the thing after it's read
+            result = get_many(*args, **kwargs)
+            if not reads:
+                self.store.redis.hset(
+                    records.name, thing._id,
+                    self.store.encoder.encode({ID: thing._id, 'name': 'b'})
+                )
+            reads.append(args)
+            return result
+
+        records.get_many = concurrent_get_many
+        try:
+            Thing.update_many([thing.merge(age=1)])
+        finally:
+            del records.get_many
+
+        assert len(reads) == 2
+        fetched = Thing.get(thing._id)
+        assert fetched.name == 'b'
+        assert fetched.age == 1
+
+    def test_transactional_writes_give_up_on_repeated_conflicts(
+        self, Thing, monkeypatch
+    ):
+        self.bind(Thing)
+
+        thing = Thing(name='a').create()
+        records = self.store.records
+        get_many = records.get_many
+        reads = []
+
+        def concurrent_get_many(*args, **kwargs):
+            # another client writes to the records after every read
+            result = get_many(*args, **kwargs)
+            self.store.redis.hset(records.name, 'other', '{}')
+            reads.append(args)
+            return result
+
+        monkeypatch.setattr(records, 'get_many', concurrent_get_many)
+        monkeypatch.setattr(self.store, 'max_watch_retries', 3)
+        monkeypatch.setattr(self.store, 'watch_backoff', 0)
+        with pytest.raises(Exception, match='conflicted 4 times'):
+            Thing.update_many([thing.merge(age=1)])
+        assert len(reads) == 4
+
+
+class PostgresCompilingConnection:
+    """
+    Runs statements compiled for postgres on a sqlite connection, which
+    understands the RETURNING and UPDATE ... FROM clauses that SqlalchemyStore
+    only uses with postgres.
+    """
+
+    def __init__(self, conn):
+        from sqlalchemy.dialects import postgresql
+
+        self.conn = conn
+        self.dialect = postgresql.dialect(paramstyle='named')
+        # set on connecting to a server that supports it
+        self.dialect.implicit_returning = True
+
+    def execute(self, statement, *args):
+        import sqlalchemy as sa
+
+        # sqlite can't commit before the rows returned are read
+        compiled = statement.compile(dialect=self.dialect)
+        text = sa.text(str(compiled)).execution_options(autocommit=False)
+        return self.conn.execute(text, compiled.params)
+
+
+class TestResourceCrudWithSqlalchemyStore(ResourceCrudTestSuite):
+    @classmethod
+    def build_store(cls, app):
+        pytest.importorskip('sqlalchemy')
+        from ravel.ext.sqlalchemy import SqlalchemyStore
+
+        SqlalchemyStore.bootstrap(app, url='sqlite://', dialect='sqlite')
+        return SqlalchemyStore()
+
+    @classmethod
+    def bind_store(cls, resource_type, store):
+        store.bind(resource_type)
+        store.create_tables(overwrite=True)
+
+    @pytest.mark.parametrize('returning', [False, True])
+    def test_bulk_writes_keep_record_order(
+        self, Thing, returning, monkeypatch
+    ):
+        import sqlalchemy as sa
+
+        self.bind(Thing)
+        if returning:
+            monkeypatch.setattr(
+                self.store.ravel.local, 'sqla_conn',
+                PostgresCompilingConnection(self.store.conn)
+            )
+
+        statements = []
+        sa.event.listen(
+            self.store.get_engine(), 'before_cursor_execute',
+            lambda conn, cursor, statement, *args: statements.append(
+                statement.split()[0].upper()
+            )
+        )
+
+        # records setting different fields are written in separate groups,
+        # then read back with a SELECT unless it's through RETURNING
+        things = Thing.Batch([
+            Thing(name=f'thing-{i}', age=i, integers={i}) if i % 2 else
+            Thing(name=f'thing-{i}', integers={i})
+            for i in range(8)
+        ])
+        Thing.create_many(things)
+        assert statements == ['INSERT'] * 2 + ([] if returning else ['SELECT'])
+
+        for i, thing in enumerate(things):
+            assert thing.name == f'thing-{i}'
+            assert Thing.get(thing._id).name == f'thing-{i}'
+
+        for i, thing in enumerate(things):
+            if i % 2:
+                thing.name = f'renamed-{i}'
+            else:
+                thing.age = 10 * i
+        # Resource.update_many makes a store call per group
+        statements.clear()
+        Thing.update_many(things)
+        fetches = [] if returning else ['SELECT']
+        assert statements == (['UPDATE'] + fetches) * 2
+
+        for i, thing in enumerate(things):
+            fetched = Thing.get(thing._id)
+            if i % 2:
+                assert (fetched.name, fetched.age) == (f'renamed-{i}', i)
+            else:
+                assert (fetched.name, fetched.age) == (f'thing-{i}', 10 * i)
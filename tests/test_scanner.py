@@ -0,0 +1,83 @@
+import os
+import sys
+
+import pytest
+
+from ravel.util.scanner import Scanner, ScanIndex
+
+
+class Marker:
+    pass
+
+
+@pytest.fixture(scope='function')
+def package(tmp_path):
+    package_dir = tmp_path / 'scanned_pkg'
+    package_dir.mkdir()
+    (package_dir / '__init__.py').write_text('')
+    (package_dir / 'matched.py').write_text(
+        'from test_scanner import Marker\n'
+        'class Thing(Marker):\n'
+        '    pass\n'
+    )
+    (package_dir / 'unmatched.py').write_text('x = 1\n')
+
+    sys.path.insert(0, str(tmp_path))
+    sys.path.insert(0, os.path.dirname(__file__))
+    yield package_dir
+    sys.path.remove(str(tmp_path))
+    sys.path.remove(os.path.dirname(__file__))
+    for name in list(sys.modules):
+        if name.startswith('scanned_pkg'):
+            del sys.modules[name]
+
+
+def build_scanner():
+    return Scanner(
+        predicate=lambda x: (
+            isinstance(x, type) and issubclass(x, Marker) and x is not Marker
+        )
+    )
+
+
+def forget_modules():
+    for name in ('scanned_pkg.matched', 'scanned_pkg.unmatched'):
+        sys.modules.pop(name, None)
+
+
+class TestScanIndex:
+    def test_indexed_scan_skips_unmatched_modules(self, package, tmp_path):
+        index_path = str(tmp_path / 'index.json')
+
+        index = ScanIndex(index_path)
+        context = build_scanner().scan('scanned_pkg', index=index)
+        index.save()
+        assert 'Thing' in context.to_dict()
+        assert 'scanned_pkg.unmatched' in sys.modules
+
+        forget_modules()
+
+        context = build_scanner().scan(
+            'scanned_pkg', index=ScanIndex(index_path)
+        )
+        assert 'Thing' in context.to_dict()
+        assert 'scanned_pkg.unmatched' not in sys.modules
+
+    def test_changed_files_trigger_full_scan(self, package, tmp_path):
+        index_path = str(tmp_path / 'index.json')
+
+        index = ScanIndex(index_path)
+        build_scanner().scan('scanned_pkg', index=index)
+        index.save()
+
+        forget_modules()
+        (package / 'unmatched.py').write_text(
+            'from test_scanner import Marker\n'
+            'class Other(Marker):\n'
+            '    pass\n'
+        )
+
+        index = ScanIndex(index_path)
+        context = build_scanner().scan('scanned_pkg', index=index)
+        assert {'Thing', 'Other'} <= context.to_dict().keys()
+        assert index.is_dirty
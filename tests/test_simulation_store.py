@@ -0,0 +1,516 @@
+import time
+import threading
+
+import pytest
+
+from ravel import Resource, fields
+from ravel.test.crud import *
+from ravel.store import SimulationStore
+from ravel.constants import ID, REV
+from ravel.query.order_by import OrderBy
+from ravel.util.cow import CopyOnWriteDict
+
+
+@pytest.fixture(scope='function')
+def store(app, Thing):
+    SimulationStore.bootstrap(app)
+    store = SimulationStore()
+    store.bind(Thing)
+    Thing.ravel.local.store = store
+    return store
+
+
+@pytest.fixture(scope='function')
+def things(store, Thing):
+    return store.create_many([
+        {'name': f'thing-{i}', 'age': i % 10} for i in range(200)
+    ])
+
+
+class TestCopyOnWriteReads:
+    def test_mutating_fetched_record_does_not_corrupt_store(self, store):
+        created = store.create({'colors': ['red'], 'blob': {'a': [1]}})
+        _id = created[ID]
+
+        record = store.fetch(_id)
+        record['colors'].append('blue')
+        record['blob']['a'].append(2)
+        record['name'] = 'mutated'
+
+        record = store.fetch_many([_id])[_id]
+        record.get('colors').append('green')
+        for value in record.values():
+            if isinstance(value, dict):
+                value.clear()
+
+        fresh = store.fetch(_id)
+        assert fresh['colors'] == ['red']
+        assert fresh['blob'] == {'a': [1]}
+        assert 'name' not in fresh
+
+    def test_deleting_keys_does_not_share_other_values(self):
+        source = {'a': [1], 'b': [2], 'c': [3]}
+        record = CopyOnWriteDict(source)
+        record['a']
+        record['b']
+        record['x'] = 1
+        del record['a']
+        for value in record.values():
+            if isinstance(value, list):
+                value.append(0)
+        for key, value in record.items():
+            if isinstance(value, list):
+                value.append(0)
+
+        record.clear()
+        record['y'] = [4]
+        record.update(z=[5])
+        assert dict(record.items()) == {'y': [4], 'z': [5]}
+        assert source == {'a': [1], 'b': [2], 'c': [3]}
+
+    def test_mutating_created_input_does_not_corrupt_store(self, store):
+        data = {'colors': ['red']}
+        created = store.create(data)
+        data['colors'].append('blue')
+        created['colors'].append('green')
+        assert store.fetch(created[ID])['colors'] == ['red']
+
+    def test_fetch_many_selects_fields(self, store):
+        created = store.create({'name': 'x', 'colors': ['red']})
+        record = store.fetch(created[ID], fields={ID, REV, 'name'})
+        assert set(record.keys()) == {ID, REV, 'name'}
+
+    def test_read_throughput_does_not_grow_with_record_width(self, store):
+        def create_records(width, count=500):
+            return [
+                store.create({
+                    'colors': [str(i) for i in range(width)],
+                    'blob': {str(i): [i] for i in range(width)},
+                })[ID]
+                for _ in range(count)
+            ]
+
+        def time_fetch_many(_ids, repeat=5):
+            t1 = time.perf_counter()
+            for _ in range(repeat):
+                store.fetch_many(_ids)
+            return time.perf_counter() - t1
+
+        narrow_ids = create_records(width=1)
+        wide_ids = create_records(width=1000)
+
+        narrow_secs = time_fetch_many(narrow_ids)
+        wide_secs = time_fetch_many(wide_ids)
+
+        # with deep copies, wide reads are hundreds of times slower
+        assert wide_secs < 5 * narrow_secs
+
+
+class TestSelectivityAwarePredicates:
+    def test_index_stats(self, store, things):
+        stats = store.get_index_stats()
+        assert stats['age'] == {'type': 'btree', 'size': 200, 'cardinality': 10}
+        assert stats['name'] == {
+            'type': 'btree', 'size': 200, 'cardinality': 200
+        }
+
+        store.delete(things[0][ID])
+        assert store.get_index_stats()['age'] == {
+            'type': 'btree', 'size': 199, 'cardinality': 10
+        }
+
+    def test_selective_conjunct_filters_the_rest(self, store, Thing, things):
+        searched = []
+        age_index = store.indexes['age']
+        search = age_index.search
+        age_index.search = lambda *args: searched.append(args) or search(*args)
+
+        predicate = (Thing.age > 2) & (Thing.name == 'thing-15')
+        records = store.query(predicate)
+
+        assert [rec['name'] for rec in records] == ['thing-15']
+        assert not searched
+
+    def test_empty_conjunct_short_circuits(self, store, Thing, things):
+        predicate = (Thing.name == 'unknown') & (Thing.age >= 0)
+        assert store.query(predicate) == []
+
+    def test_conjunction_matches_full_evaluation(self, store, Thing, things):
+        predicate = (
+            ((Thing.age >= 2) & (Thing.age < 5) & (Thing.name != 'thing-2')) |
+            (Thing.age == 9)
+        )
+        names = {rec['name'] for rec in store.query(predicate)}
+        assert names == {
+            rec['name'] for rec in things
+            if (2 <= rec['age'] < 5 and rec['name'] != 'thing-2')
+            or rec['age'] == 9
+        }
+
+
+class TestRangeScans:
+    def test_ranges_on_same_field_are_fused(self, store, Thing, things):
+        scanned = []
+        age_index = store.indexes['age']
+        scan = age_index.scan
+        age_index.scan = lambda bounds: scanned.append(bounds) or scan(bounds)
+
+        predicate = (Thing.age > 2) & (Thing.age <= 5) & (Thing.age < 9)
+        ages = sorted({rec['age'] for rec in store.query(predicate)})
+
+        assert ages == [3, 4, 5]
+        assert len(scanned) == 1
+        assert (scanned[0].lower, scanned[0].upper) == (2, 5)
+
+    def test_range_excludes_null_values(self, store, Thing, things):
+        store.create({'name': 'ageless', 'age': None})
+        records = store.query(Thing.age < 1)
+        assert len(records) == 20
+        assert all(rec['age'] == 0 for rec in records)
+
+    def test_empty_range(self, store, Thing, things):
+        assert store.query((Thing.age > 5) & (Thing.age < 5)) == []
+
+
+class TestComplementPredicates:
+    def test_neq_subtracts_excluded_ids(self, store, Thing, things):
+        name_index = store.indexes['name']
+        name_index.search = None  # NEQ must not search the index
+
+        records = store.query(Thing.name != 'thing-3')
+        assert len(records) == 199
+        assert 'thing-3' not in {rec['name'] for rec in records}
+
+    def test_excluding_as_anti_filter(self, store, Thing, things):
+        predicate = (Thing.age == 1) & Thing.name.excluding(
+            ['thing-1', 'thing-11', 'unknown']
+        )
+        names = {rec['name'] for rec in store.query(predicate)}
+        assert len(names) == 18
+        assert not names & {'thing-1', 'thing-11'}
+
+    def test_records_without_field_do_not_match(self, store, Thing, things):
+        store.create({'name': 'ageless'})
+        records = store.query(Thing.age != 0)
+        assert len(records) == 180
+        assert 'ageless' not in {rec['name'] for rec in records}
+
+
+class TestTopK:
+    def test_order_by_indexed_field_walks_index(self, store, Thing, things):
+        walked = []
+        age_index = store.indexes['age']
+        walk = age_index.walk
+        age_index.walk = lambda *args, **kwargs: (
+            walked.append(kwargs) or walk(*args, **kwargs)
+        )
+
+        records = store.query(
+            Thing.age >= 0, order_by=OrderBy('age', desc=True),
+            limit=5, offset=18,
+        )
+        assert [rec['age'] for rec in records] == [9, 9, 8, 8, 8]
+        assert walked == [{'desc': True, 'limit': 23}]
+
+    def test_order_by_many_keys_with_limit(self, store, Thing, things):
+        records = store.query(
+            Thing.age <= 1,
+            order_by=(OrderBy('age', desc=True), OrderBy('name')),
+            limit=3,
+        )
+        assert [rec['name'] for rec in records] == [
+            'thing-1', 'thing-101', 'thing-11'
+        ]
+
+    def test_null_values_sort_first(self, store, Thing, things):
+        store.create({'name': 'ageless', 'age': None})
+        records = store.query(Thing.name != None, order_by=OrderBy('age'))
+        assert records[0]['name'] == 'ageless'
+        assert [rec['age'] for rec in records[1:]] == sorted(
+            rec['age'] for rec in things
+        )
+
+
+class TestJournal:
+    @pytest.fixture(scope='function')
+    def build_store(self, app, Thing, tmpdir):
+        def build_store(**kwargs):
+            store = SimulationStore()
+            store.bind(Thing, journal_root=str(tmpdir), **kwargs)
+            return store
+
+        SimulationStore.bootstrap(app)
+        return build_store
+
+    def test_replay_journal(self, build_store, Thing):
+        store = build_store()
+        records = store.create_many([
+            {'name': f'thing-{i}', 'age': i} for i in range(10)
+        ])
+        store.update(records[0][ID], {'age': 100})
+        store.delete(records[1][ID])
+        store.journal.close()
+
+        store = build_store()
+        assert store.count() == 9
+        assert store.fetch(records[0][ID])['age'] == 100
+        assert not store.exists(records[1][ID])
+        assert store.query(Thing.age == 9) == [store.fetch(records[9][ID])]
+
+    def test_snapshot_truncates_journal(self, build_store, Thing):
+        store = build_store(snapshot_interval=5)
+        store.create_many([{'name': f'thing-{i}', 'age': i} for i in range(7)])
+        # the batch is journaled as a whole before the snapshot is taken
+        assert store.journal.entry_count == 0
+        store.create({'name': 'thing-7', 'age': 7})
+        assert store.journal.entry_count == 1
+        store.journal.close()
+
+        store = build_store(snapshot_interval=5)
+        assert store.count() == 8
+        assert len(store.query(Thing.age < 3)) == 3
+
+    def test_partial_journal_entry_is_discarded(self, build_store, Thing):
+        store = build_store()
+        created = store.create({'name': 'thing', 'age': 1})
+        store.journal.close()
+        with open(store.journal.journal_path, 'ab') as journal_file:
+            journal_file.write(b'\x80\x05partial')
+
+        store = build_store()
+        store.create({'name': 'other', 'age': 2})
+        store.journal.close()
+
+        store = build_store()
+        assert store.count() == 2
+        assert store.fetch(created[ID])['name'] == 'thing'
+
+
+class TestConcurrency:
+    def test_readers_hold_lock_concurrently(self, store):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def read():
+            with store.lock.read:
+                barrier.wait()
+
+        threads = [threading.Thread(target=read) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert not barrier.broken
+
+    def test_lock_is_reentrant_but_not_upgradable(self, store):
+        with store.lock.write:
+            with store.lock.read:
+                with store.lock.write:
+                    pass
+
+        with pytest.raises(RuntimeError):
+            with store.lock.read:
+                with store.lock.write:
+                    pass
+
+    def test_concurrent_reads_and_writes(self, store, Thing, things):
+        ids = [rec[ID] for rec in things]
+        stop = threading.Event()
+        errors = []
+
+        def write(offset):
+            i = offset
+            while not stop.is_set():
+                store.update(ids[i % len(ids)], {'age': i % 10})
+                i += 1
+
+        def read():
+            while not stop.is_set():
+                count = len(store.query(Thing.age >= 0))
+                if count != len(ids):
+                    errors.append(count)
+
+        threads = [threading.Thread(target=write, args=(i, )) for i in range(2)]
+        threads += [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        assert not errors
+        assert store.count() == len(ids)
+
+
+class TestIndexDeclarations:
+    @pytest.fixture(scope='function')
+    def Pet(self, app):
+        class Pet(Resource):
+            kind = fields.String(index='hash', composite_index=['age'])
+            age = fields.Int()
+            name = fields.String(index=False)
+
+        app.register_resource(Pet)
+        return Pet
+
+    @pytest.fixture(scope='function')
+    def pet_store(self, app, Pet):
+        SimulationStore.bootstrap(app)
+        store = SimulationStore()
+        store.bind(Pet)
+        Pet.ravel.local.store = store
+        store.create_many([
+            {'kind': kind, 'age': i % 5, 'name': f'pet-{i}'}
+            for i in range(60) for kind in ('cat', 'dog', None)
+        ])
+        return store
+
+    def test_declared_index_types(self, pet_store):
+        stats = pet_store.get_index_stats()
+        assert stats['kind']['type'] == 'hash'
+        assert stats['age']['type'] == 'btree'
+        assert 'name' not in stats
+        assert stats['kind_age']['fields'] == ['kind', 'age']
+
+    def test_hash_index_predicates(self, pet_store, Pet):
+        assert len(pet_store.query(Pet.kind == 'cat')) == 60
+        assert len(pet_store.query(Pet.kind != 'cat')) == 120
+        assert len(pet_store.query(Pet.kind.including(['cat', None]))) == 120
+        # range predicates on hash indexed fields scan the records
+        assert len(pet_store.query(Pet.kind > 'cat')) == 60
+
+    def test_composite_index_search(self, pet_store, Pet):
+        searched = []
+        index = pet_store.composite_indexes['kind_age']
+        search_prefix = index.search_prefix
+        index.search_prefix = lambda values: (
+            searched.append(values) or search_prefix(values)
+        )
+
+        records = pet_store.query(
+            (Pet.kind == 'dog') & (Pet.age == 3) & (Pet.name != 'x')
+        )
+        assert len(records) == 12
+        assert all(rec['kind'] == 'dog' for rec in records)
+        assert searched == [('dog', 3)]
+
+        records = pet_store.query((Pet.kind == None) & (Pet.age == 0))
+        assert len(records) == 12
+
+    def test_composite_index_is_updated(self, pet_store, Pet):
+        record = pet_store.query((Pet.kind == 'cat') & (Pet.age == 1))[0]
+        pet_store.update(record[ID], {'age': 2})
+        assert len(pet_store.query((Pet.kind == 'cat') & (Pet.age == 1))) == 11
+        assert len(pet_store.query((Pet.kind == 'cat') & (Pet.age == 2))) == 13
+
+        pet_store.delete(record[ID])
+        assert len(pet_store.query((Pet.kind == 'cat') & (Pet.age == 2))) == 12
+
+
+class TestBulkCreate:
+    def test_bulk_indexes_match_single_creates(self, app, Thing, store):
+        records = [{'name': f'thing-{i}', 'age': i % 7} for i in range(100)]
+        store.create_many([dict(rec) for rec in records])
+
+        other_store = SimulationStore()
+        other_store.bind(Thing)
+        for rec in records:
+            other_store.create(dict(rec))
+
+        # records created in bulk share a single revision
+        stats = store.get_index_stats()
+        other_stats = other_store.get_index_stats()
+        assert stats.pop(REV)['cardinality'] == 1
+        other_stats.pop(REV)
+        assert stats == other_stats
+        assert stats['age'] == {'type': 'btree', 'size': 100, 'cardinality': 7}
+        assert len(store.query(Thing.age == 3)) == 14
+
+    def test_bulk_create_into_existing_records(self, store, Thing, things):
+        _id = things[0][ID]
+        created = store.create_many([
+            {ID: _id, 'name': 'replaced', 'age': 100},
+            {'name': 'new', 'age': 100},
+        ])
+
+        assert created[0][ID] == _id
+        assert store.count() == len(things) + 1
+        assert len(store.query(Thing.age == 100)) == 2
+        assert store.query(Thing.name == 'thing-0') == []
+        assert store.indexes['name'].size == store.count()
+
+
+class TestInPlaceUpdates:
+    def test_update_only_touches_changed_indexes(self, store, Thing, things):
+        touched = []
+        for k, index in store.indexes.items():
+            insert = index.insert
+            index.insert = lambda value, _id, k=k, insert=insert: (
+                touched.append(k) or insert(value, _id)
+            )
+
+        _id = things[0][ID]
+        store.update(_id, {'age': 100, 'name': things[0]['name']})
+
+        assert sorted(touched) == [REV, 'age']
+        assert store.query(Thing.age == 100)[0][ID] == _id
+        assert store.indexes[REV].size == store.count()
+
+    def test_update_many(self, store, Thing, things):
+        _ids = [rec[ID] for rec in things[:3]]
+        updated = store.update_many(_ids, [
+            {'age': 100}, {'age': 100}, {'name': 'renamed'}
+        ])
+
+        assert set(updated) == set(_ids)
+        assert updated[_ids[2]]['name'] == 'renamed'
+        assert len(store.query(Thing.age == 100)) == 2
+        assert store.query(Thing.name == 'renamed')[0][ID] == _ids[2]
+        assert store.indexes[REV].size == store.count()
+        assert store.indexes['age'].size == store.count()
+
+
+class TestCollectionPredicates:
+    @pytest.fixture(scope='function')
+    def tagged(self, store):
+        return store.create_many([
+            {'colors': ['red', 'blue'], 'integers': {1, 2}},
+            {'colors': ['red'], 'integers': {2, 3}},
+            {'colors': ['green'], 'integers': set()},
+            {'colors': None},
+        ])
+
+    def test_list_and_set_fields_have_inverted_indexes(self, store, tagged):
+        stats = store.get_index_stats()
+        assert stats['colors'] == {
+            'type': 'inverted', 'size': 4, 'cardinality': 3
+        }
+        assert stats['integers']['type'] == 'inverted'
+
+    def test_contains(self, store, Thing, tagged):
+        _ids = [rec[ID] for rec in tagged]
+
+        def names(predicate):
+            return {_ids.index(rec[ID]) for rec in store.query(predicate)}
+
+        assert names(Thing.colors.contains('red')) == {0, 1}
+        assert names(Thing.colors.contains('red', 'blue')) == {0}
+        assert names(Thing.colors.contains('red', 'pink')) == set()
+        assert names(Thing.colors.contains_any('blue', 'green')) == {0, 2}
+        assert names(Thing.integers.contains(2)) == {0, 1}
+        assert names(
+            Thing.colors.contains('red') & Thing.integers.contains_any(3)
+        ) == {1}
+
+    def test_inverted_index_is_updated(self, store, Thing, tagged):
+        store.update(tagged[1][ID], {'colors': ['green']})
+        store.delete(tagged[2][ID])
+
+        records = store.query(Thing.colors.contains('green'))
+        assert [rec[ID] for rec in records] == [tagged[1][ID]]
+        assert len(store.query(Thing.colors.contains('red'))) == 1
+
+    def test_contains_requires_collection_field(self, Thing):
+        with pytest.raises(ValueError):
+            Thing.name.contains('x')
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from ravel.test.crud import *
+from ravel.store import (
+    SimulationStore,
+    StoreInterceptor,
+    MetricsInterceptor,
+    RetryInterceptor,
+    SlowCallInterceptor,
+)
+
+
+@pytest.fixture(scope='function')
+def build_store(app, Thing):
+    def build_store(interceptors=None):
+        SimulationStore.bootstrap(app, interceptors=interceptors)
+        store = SimulationStore()
+        store.bind(Thing)
+        Thing.ravel.local.store = store
+        return store
+
+    return build_store
+
+
+class TestStoreInterceptors:
+    def test_no_interceptors_calls_store_directly(self, build_store, Thing):
+        store = build_store()
+        assert store._dispatch_chain is None
+        thing = Thing(name='x').create()
+        assert Thing.get(thing._id).name == 'x'
+
+    def test_chain_order(self, build_store, Thing):
+        calls = []
+
+        class Recorder(StoreInterceptor):
+            def __init__(self, name):
+                self.name = name
+
+            def intercept(self, call, proceed):
+                calls.append((self.name, call.method))
+                return proceed(call)
+
+        store = build_store(interceptors=[Recorder('outer')])
+        store.add_interceptor(Recorder('inner'))
+        Thing(name='x').create()
+
+        assert calls == [('outer', 'create'), ('inner', 'create')]
+
+    def test_metrics(self, build_store, Thing):
+        metrics = MetricsInterceptor()
+        build_store(interceptors=[metrics])
+
+        things = Thing.Batch.generate(count=10).merge(anything=1)
+        Thing.create_many(things)
+        Thing.get_many(things._id)
+        Thing.select(Thing._id).execute()
+
+        create_many = metrics.get(Thing, 'create_many')
+        assert create_many.calls == 1
+        assert create_many.records_in == 10
+        assert create_many.records_out == 10
+        assert create_many.latency.count == 1
+
+        assert metrics.get(Thing, 'fetch_many').records_out == 10
+        assert metrics.get(Thing, 'query').records_out == 10
+
+        report = metrics.to_dict()['Thing']['create_many']
+        assert report['latency']['p99_ms'] <= report['latency']['max_ms']
+
+    def test_retry(self, build_store, Thing):
+        store = build_store(interceptors=[RetryInterceptor(backoff=0)])
+        thing = Thing(name='x').create()
+
+        fetch = store.fetch
+        failures = []
+
+        def flaky_fetch(*args, **kwargs):
+            if len(failures) < 2:
+                failures.append(1)
+                raise IOError('flaky')
+            return fetch(*args, **kwargs)
+
+        store.fetch = flaky_fetch
+        assert Thing.get(thing._id).name == 'x'
+        assert len(failures) == 2
+
+    def test_slow_call(self, build_store, Thing):
+        slow_calls = SlowCallInterceptor(threshold=0.01)
+        store = build_store(interceptors=[slow_calls])
+        thing = Thing(name='x').create()
+
+        fetch = store.fetch
+
+        def slow_fetch(*args, **kwargs):
+            time.sleep(0.02)
+            return fetch(*args, **kwargs)
+
+        store.fetch = slow_fetch
+        assert Thing.get(thing._id).name == 'x'
+        assert slow_calls.slow_calls == 1